@@ -0,0 +1,116 @@
+# advisory_pipeline.py
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from batch_prediction import RESULT_COLUMN, ERROR_COLUMN, get_artifacts, recommend_batch
+from fertilizer_prediction import clean_and_validate, fetch_soil_data
+from geocoding import get_coordinates
+from http_utils import POOL_SIZE
+from metrics import PROFILE_REQUESTS, profile_request, profile_summary, span
+from rainfall_scheduler import advice_for_point
+from recommendation_index import lookup_recommendation
+
+
+@span("recommend")
+def _recommend(record):
+    result = recommend_batch([record], get_artifacts()).iloc[0]
+    recommendation, error = result[RESULT_COLUMN], result[ERROR_COLUMN]
+    return (recommendation if isinstance(recommendation, str) else None), (error if isinstance(error, str) else None)
+
+
+async def _in_thread(executor, fn, *args):
+    # asyncio.to_thread on `executor` instead of the loop's default one, context (profile, priority) included
+    if executor is None:
+        return await asyncio.to_thread(fn, *args)
+    call = functools.partial(contextvars.copy_context().run, fn, *args)
+    return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+
+async def advise(location, answers=None, profile=None, executor=None):
+    """
+    Build the full advisory for one farmer. Once the location is geocoded, the soil and
+    rainfall lookups run concurrently, so the total wait is roughly the slowest upstream
+    rather than the sum of all of them. `answers` holds the farmer's previous_yield,
+    soil_texture, previous_crop and fertilizer_used; without them only the rainfall advice
+    and soil data are returned. With `profile` the advisory also carries the milliseconds
+    spent in each stage. The blocking lookups run on `executor`, or the loop's default one.
+    """
+    profile = PROFILE_REQUESTS if profile is None else profile
+    with profile_request(profile) as spans:
+        with span("advisory"):
+            advisory = await _advise(location, answers, executor)
+    if spans is not None:
+        advisory["profile"] = profile_summary(spans)
+    return advisory
+
+
+async def _advise(location, answers, executor):
+    advisory = {"location": location, "soil": None, "rainfall_advice": None, "recommended_fertilizer": None, "error": None}
+
+    lat, lon = await _in_thread(executor, get_coordinates, location)
+    if lat is None or lon is None:
+        advisory["error"] = "Invalid location. Please try again."
+        return advisory
+    advisory.update(lat=lat, lon=lon)
+
+    soil_data, advisory["rainfall_advice"] = await asyncio.gather(
+        _in_thread(executor, fetch_soil_data, lat, lon),
+        _in_thread(executor, advice_for_point, lat, lon),
+    )
+
+    soil_data = clean_and_validate(soil_data) if soil_data is not None else None
+    if soil_data is None:
+        advisory["error"] = "Could not fetch soil data. Please check your location and try again."
+        return advisory
+    advisory["soil"] = soil_data
+
+    if answers:
+        # Known admin units are answered from the precomputed index; everything else is scored live
+        recommendation = await _in_thread(executor, lookup_recommendation, location, answers)
+        error = None
+        if recommendation is None:
+            recommendation, error = await _in_thread(executor, _recommend, {**soil_data, **answers})
+        advisory["recommended_fertilizer"] = recommendation
+        advisory["error"] = error
+    return advisory
+
+
+async def advise_many(farmers, concurrency=POOL_SIZE, profile=None):
+    """
+    Run advise() for many (location, answers) pairs, keeping at most `concurrency` farmers in flight.
+    Their lookups get a thread pool of their own (two threads per farmer, for the concurrent soil
+    and rainfall calls), shut down when the batch is done; the loop's default executor is left alone.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    with ThreadPoolExecutor(max_workers=concurrency * 2) as executor:
+        async def bounded(location, answers):
+            async with semaphore:
+                return await advise(location, answers, profile, executor)
+
+        return await asyncio.gather(*(bounded(location, answers) for location, answers in farmers))
+
+
+def main():
+    location = input("Enter your County and Sub-county(e.g., Nakuru, Bahati): ")
+    answers = {
+        "previous_yield": float(input("Enter your previous maize yield (bags per acre): ")),
+        "soil_texture": input("Add a little water to your soil and rub it between your fingers. How does it feel? (e.g. gritty, sticky, soft, smooth): "),
+        "previous_crop": input("Enter the previous crop grown (e.g., maize, beans): "),
+        "fertilizer_used": input("Enter the type of fertilizer you used (e.g., DAP, CAN, Urea, Compost): "),
+    }
+
+    advisory = asyncio.run(advise(location, answers))
+    if advisory["rainfall_advice"]:
+        print(f"\n🌱 **Planting Advice for {location}:**\n")
+        print(advisory["rainfall_advice"])
+    if advisory["recommended_fertilizer"]:
+        print(f"\n🌱 Recommended Fertilizer: {advisory['recommended_fertilizer']}")
+    if advisory["error"]:
+        print(advisory["error"])
+
+
+if __name__ == "__main__":
+    main()
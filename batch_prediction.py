@@ -0,0 +1,191 @@
+# batch_prediction.py
+import argparse
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from metrics import span
+from preprocessing import PREPROCESSING_PATH, load_preprocessing
+
+MODEL_PATH = os.path.join("models", "fertilizer_model.joblib")
+FOREST_DIR = os.getenv("FOREST_DIR", os.path.join("models", "forest"))
+# "compact" serves the array export from forest_export.py, memory-mapped and shared between processes:
+# near-instant loads and little memory per worker, but a few times fewer rows/s than joblib in bulk
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "joblib")
+
+RESULT_COLUMN = "recommended_fertilizer"
+ERROR_COLUMN = "error"
+
+CHUNK_SIZE = 50000
+
+_artifacts = None
+_artifacts_lock = threading.Lock()
+
+
+def load_artifacts():
+    """
+    Load the model and the preprocessing it was trained with once for a whole batch run
+    """
+    if MODEL_FORMAT == "compact":
+        from forest_export import load_forest
+
+        model = load_forest(FOREST_DIR)
+    else:
+        import joblib  # pulls in sklearn's pickled classes, so only paid when a model is loaded
+
+        model = joblib.load(MODEL_PATH)
+        model.n_jobs = None  # models trained before n_jobs was reset still carry the training -1
+    return {
+        "model": model,
+        "preprocessor": load_preprocessing(PREPROCESSING_PATH),
+    }
+
+
+def get_artifacts():
+    """
+    Load the artifacts on first use and share them for the life of the process.
+    Concurrent first callers wait for a single load instead of each reading the model.
+    """
+    global _artifacts
+    if _artifacts is None:
+        with _artifacts_lock:
+            if _artifacts is None:
+                with span("load_artifacts"):
+                    _artifacts = load_artifacts()
+    return _artifacts
+
+
+def warm_up(artifacts=None):
+    """
+    Load the artifacts and run one prediction through them so the first farmer request
+    does not pay for loading or for lazy initialisation inside sklearn
+    """
+    if artifacts is None:
+        artifacts = get_artifacts()
+    preprocessor = artifacts["preprocessor"]
+    record = {col: preprocessor.categories[col][0] for col in preprocessor.categorical_columns}
+    record.update({col: 0.0 for col in preprocessor.numerical_columns})
+    recommend_batch(pd.DataFrame.from_records([record]), artifacts)
+    return artifacts
+
+
+def _file_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    if ext in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    raise ValueError(f"Unsupported file type '{ext}'. Use .csv, .parquet or .jsonl")
+
+
+def read_records(path, chunk_size=CHUNK_SIZE):
+    """
+    Stream farmer records from a CSV, Parquet or JSON-lines file as DataFrame chunks
+    """
+    fmt = _file_format(path)
+    if fmt == "csv":
+        yield from pd.read_csv(path, chunksize=chunk_size)
+    elif fmt == "jsonl":
+        yield from pd.read_json(path, lines=True, chunksize=chunk_size)
+    else:
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+
+def validate_batch(frame, preprocessor):
+    """
+    Check the batch has every column the model needs and build its feature matrix.
+    Returns the matrix and a per-row error message (None when the row is usable).
+    """
+    missing = [col for col in preprocessor.columns if col not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    X, unknown, invalid = preprocessor.transform(frame)
+    errors = np.full(len(frame), None, dtype=object)
+    errors[unknown] = "Unknown input category"
+    errors[invalid] = "Missing or invalid numeric input"
+    errors[frame[preprocessor.categorical_columns].isna().any(axis=1).to_numpy()] = "Missing categorical input"
+    return X, errors
+
+
+def recommend_batch(records, artifacts=None):
+    """
+    Predict the best fertilizer for many farmers with a single model.predict call.
+    Accepts a DataFrame or a list of dicts and returns a DataFrame with the recommendation
+    and, for rows that could not be scored, the reason.
+    """
+    if artifacts is None:
+        artifacts = load_artifacts()
+    frame = records if isinstance(records, pd.DataFrame) else pd.DataFrame.from_records(records)
+
+    X, errors = validate_batch(frame, artifacts["preprocessor"])
+    usable = pd.isna(errors)
+
+    result = frame.copy()
+    result[RESULT_COLUMN] = None
+    if usable.any():
+        with span("predict"):
+            predictions = artifacts["model"].predict(X[usable])
+        result.loc[usable, RESULT_COLUMN] = artifacts["preprocessor"].decode_target(predictions)
+    result[ERROR_COLUMN] = pd.Series(errors, index=result.index, dtype=object)
+    return result
+
+
+def write_results(chunks, path):
+    """
+    Stream result chunks to a CSV, Parquet or JSON-lines file without holding them all in memory
+    """
+    fmt = _file_format(path)
+    writer = None
+    rows = 0
+    try:
+        for i, chunk in enumerate(chunks):
+            if fmt == "csv":
+                chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+            elif fmt == "jsonl":
+                with open(path, "w" if i == 0 else "a") as fh:
+                    chunk.to_json(fh, orient="records", lines=True)
+            else:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                table = pa.Table.from_pandas(chunk.astype({RESULT_COLUMN: "string", ERROR_COLUMN: "string"}), preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def recommend_file(input_path, output_path, chunk_size=CHUNK_SIZE):
+    """
+    Score every farmer record in input_path chunk by chunk and stream the results to output_path
+    """
+    artifacts = load_artifacts()
+    chunks = (recommend_batch(chunk, artifacts) for chunk in read_records(input_path, chunk_size))
+    return write_results(chunks, output_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recommend fertilizer for a file of farmer records")
+    parser.add_argument("input", help="farmer records (.csv, .parquet or .jsonl)")
+    parser.add_argument("output", help="where to write recommendations (.csv, .parquet or .jsonl)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows scored per predict call")
+    args = parser.parse_args()
+
+    rows = recommend_file(args.input, args.output, args.chunk_size)
+    print(f"🌱 Wrote {rows} recommendations to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
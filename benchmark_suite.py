@@ -0,0 +1,364 @@
+# benchmark_suite.py
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Application modules are imported inside the benchmarks, after each child process has been
+# pointed at its working directory, cache and the local stand-in servers.
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "kenya_gazetteer.csv")
+
+DEFAULTS = {
+    "train_rows": 200000,
+    "n_estimators": 100,
+    "single_requests": 500,
+    "batch_rows": 100000,
+    "rainfall_locations": 20000,
+    "farmers": 200,
+    "concurrency": 32,
+    "latency_ms": 50,
+    "jitter_ms": 10,
+    "error_rate": 0.02,
+}
+# The stand-ins have no rate limits of their own, and upstream.RATE_LIMITS (OpenCage's 1/s above
+# all) would make the advisory numbers measure the throttle rather than the code: turn them off
+STAND_IN_RATES = {"OPENCAGE_RATE": "0", "OPEN_METEO_RATE": "0", "ISDA_RATE": "0", "SOILGRIDS_RATE": "0"}
+QUICK = dict(DEFAULTS, train_rows=20000, n_estimators=30, single_requests=100, batch_rows=20000,
+             rainfall_locations=2000, farmers=40, latency_ms=20)
+
+
+def _percentiles(samples_s):
+    samples = sorted(samples_s)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return {"p50_ms": round(pick(0.5), 2), "p95_ms": round(pick(0.95), 2), "max_ms": round(samples[-1] * 1000, 2)}
+
+
+def _child(workdir, env, name, kwargs):
+    # Runs in a fresh spawned process so import costs, caches and peak memory are per benchmark
+    os.environ.update(env)
+    os.chdir(workdir)
+    result = BENCHMARKS[name](**kwargs)
+    result["peak_memory_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+def bench_training(train_rows, n_estimators, seed=0):
+    """Ingest a synthetic OFRA CSV, fit the forest, save it, and export the compact format"""
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+
+    from data_ingestion import DATA_PATH, FEATURE_STORE_PATH, ingest_csv
+    from forest_export import FOREST_DIR, export_forest
+    from preprocessing import PREPROCESSING_PATH, save_preprocessing
+    from synthetic_data import write_ofra
+    from training_script import MODEL_PATH, build_training_matrix, load_training_table
+
+    write_ofra(DATA_PATH, rows=train_rows, seed=seed)
+
+    start = time.perf_counter()
+    ingest_csv(DATA_PATH, FEATURE_STORE_PATH)
+    ingest_s = time.perf_counter() - start
+
+    X, y, preprocessor = build_training_matrix(load_training_table())
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    start = time.perf_counter()
+    model = RandomForestClassifier(n_estimators=n_estimators, n_jobs=-1, random_state=42).fit(X_train, y_train)
+    train_s = time.perf_counter() - start
+
+    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+    model.set_params(n_jobs=None)  # as training_script saves it: serving never fans out per call
+    joblib.dump(model, MODEL_PATH)
+    save_preprocessing(preprocessor.artifact, PREPROCESSING_PATH)
+    export_forest(model, FOREST_DIR)
+    return {
+        "rows": train_rows,
+        "n_estimators": n_estimators,
+        "ingest_s": round(ingest_s, 3),
+        "train_s": round(train_s, 3),
+        "test_accuracy": round(float(model.score(X_test, y_test)), 4),
+    }
+
+
+def bench_model_load():
+    """Time to load the model and preprocessing artifact, and to serve the first prediction"""
+    import batch_prediction
+
+    start = time.perf_counter()
+    artifacts = batch_prediction.load_artifacts()
+    load_s = time.perf_counter() - start
+    start = time.perf_counter()
+    batch_prediction.warm_up(artifacts)
+    return {
+        "model_format": batch_prediction.MODEL_FORMAT,
+        "load_s": round(load_s, 4),
+        "first_prediction_s": round(time.perf_counter() - start, 4),
+    }
+
+
+def bench_inference(single_requests, batch_rows, seed=1):
+    """Latency of one-row recommend_batch calls, and rows/sec of one large batch"""
+    from batch_prediction import get_artifacts, recommend_batch, warm_up
+    from synthetic_data import generate_farmers
+
+    artifacts = warm_up(get_artifacts())
+    farmers = generate_farmers(max(single_requests, batch_rows), artifacts["preprocessor"].categories, seed=seed)
+
+    records = farmers.head(single_requests).to_dict("records")
+    latencies = []
+    for record in records:
+        start = time.perf_counter()
+        recommend_batch([record], artifacts)
+        latencies.append(time.perf_counter() - start)
+
+    batch = farmers.head(batch_rows)
+    start = time.perf_counter()
+    result = recommend_batch(batch, artifacts)
+    batch_s = time.perf_counter() - start
+    return {
+        "single_row": dict(_percentiles(latencies), requests=len(records),
+                           rows_per_s=round(len(records) / sum(latencies))),
+        "batch": {"rows": len(batch), "seconds": round(batch_s, 3), "rows_per_s": round(len(batch) / batch_s),
+                  "errors": int(result["error"].notna().sum())},
+    }
+
+
+def _synthetic_forecasts(locations, seed=2):
+    import numpy as np
+
+    from rainfall_forecast import FORECAST_DAYS, PAST_DAYS
+
+    rng = np.random.default_rng(seed)
+    days = PAST_DAYS + FORECAST_DAYS
+    rain = np.maximum(0.0, rng.gamma(0.6, 9.0, (locations, days)) - 2).round(1)
+    dates = [f"2026-03-{d + 1:02d}" for d in range(days)]
+    return [[{"date": d, "rainfall_mm": float(r)} for d, r in zip(dates, row)] for row in rain]
+
+
+def bench_rainfall(rainfall_locations):
+    """Throughput of analyze_rainfall one forecast at a time, and of the vectorized engine on all of them"""
+    import importlib.util
+
+    from rainfall_engine import analyze_matrix, rainfall_matrix
+
+    spec = importlib.util.spec_from_file_location(
+        "rainfall_prediction", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rainfall-prediction.py"))
+    rainfall_prediction = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(rainfall_prediction)
+
+    forecasts = _synthetic_forecasts(rainfall_locations)
+    single = forecasts[:min(len(forecasts), 2000)]
+    start = time.perf_counter()
+    for forecast in single:
+        rainfall_prediction.analyze_rainfall(forecast)
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    analyze_matrix(rainfall_matrix(forecasts))
+    matrix_s = time.perf_counter() - start
+    return {
+        "analyze_rainfall": {"locations": len(single), "locations_per_s": round(len(single) / single_s)},
+        "analyze_matrix": {"locations": len(forecasts), "seconds": round(matrix_s, 4),
+                           "locations_per_s": round(len(forecasts) / matrix_s)},
+    }
+
+
+def _farmers(count, textures_and_crops, seed=3):
+    import csv
+    import random
+
+    rng = random.Random(seed)
+    with open(os.path.join("data", "kenya_gazetteer.csv"), newline="") as fh:
+        known = [f"{row['county']}, {row['sub_county']}" for row in csv.DictReader(fh) if row["sub_county"]]
+    crops = textures_and_crops["previous_crop"]
+    farmers = []
+    for i in range(count):
+        # Half resolve from the bundled gazetteer, half have to be geocoded upstream
+        location = rng.choice(known) if i % 2 else f"Benchmark Ward {i}, Shamba {rng.randrange(10 ** 6)}"
+        answers = {"previous_yield": rng.uniform(5, 25), "soil_texture": "gritty",
+                   "previous_crop": rng.choice(crops), "fertilizer_used": "DAP"}
+        farmers.append((location, answers))
+    return farmers
+
+
+def bench_advisory(farmers, concurrency, latency_ms, jitter_ms, error_rate):
+    """
+    End-to-end advisory latency against the local stand-ins, first with empty caches and then
+    again for the same farmers with warm caches
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from preprocessing import load_preprocessing
+    from stand_in_servers import ROUTES, start_stand_ins
+
+    providers = {provider for provider, _ in ROUTES.values()}
+    preprocessor = load_preprocessing()
+    textures = preprocessor.categories[preprocessor.categorical_columns[0]]
+    server = start_stand_ins({p: latency_ms for p in providers}, jitter_ms, {p: error_rate for p in providers},
+                             textures=textures)
+    os.environ.update(server.environment())
+
+    from advisory_pipeline import advise
+    from batch_prediction import warm_up
+    from http_utils import POOL_SIZE
+
+    warm_up()
+    population = _farmers(farmers, preprocessor.categories)
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def timed(location, answers):
+            async with semaphore:
+                start = time.perf_counter()
+                advisory = await advise(location, answers)
+                latencies.append(time.perf_counter() - start)
+                return advisory
+
+        start = time.perf_counter()
+        advisories = await asyncio.gather(*(timed(location, answers) for location, answers in population))
+        return advisories, latencies, time.perf_counter() - start
+
+    results = {}
+    for phase in ("cold_cache", "warm_cache"):
+        loop = asyncio.new_event_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=max(concurrency, POOL_SIZE) * 2))
+        before = {p: dict(c) for p, c in server.counts.items()}
+        advisories, latencies, total_s = loop.run_until_complete(run())
+        loop.close()
+        results[phase] = dict(
+            _percentiles(latencies),
+            farmers=len(population),
+            farmers_per_s=round(len(population) / total_s, 1),
+            recommended=sum(a["recommended_fertilizer"] is not None for a in advisories),
+            upstream_requests={p: server.counts[p]["requests"] - before[p]["requests"] for p in server.counts},
+            upstream_errors={p: server.counts[p]["errors"] - before[p]["errors"] for p in server.counts},
+        )
+    server.shutdown()
+    return dict(results, concurrency=concurrency, latency_ms=latency_ms, error_rate=error_rate)
+
+
+BENCHMARKS = {
+    "training": bench_training,
+    "model_load": bench_model_load,
+    "inference": bench_inference,
+    "rainfall": bench_rainfall,
+    "advisory": bench_advisory,
+}
+
+
+def run_suite(config=DEFAULTS, only=None, workdir=None):
+    """
+    Run every benchmark (or those in `only`) in its own spawned process inside a scratch
+    directory and return the machine-readable report. Nothing touches the network.
+    """
+    only = only or list(BENCHMARKS)
+    keep = workdir is not None
+    workdir = workdir or tempfile.mkdtemp(prefix="fertilizer-bench-")
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    shutil.copy(GAZETTEER_PATH, os.path.join(workdir, "data", "kenya_gazetteer.csv"))
+
+    plan = [
+        ("training", {"train_rows": config["train_rows"], "n_estimators": config["n_estimators"]}, {}),
+        ("model_load", {}, {"MODEL_FORMAT": "joblib"}),
+        ("model_load", {}, {"MODEL_FORMAT": "compact"}),
+        ("inference", {"single_requests": config["single_requests"], "batch_rows": config["batch_rows"]}, {}),
+        ("rainfall", {"rainfall_locations": config["rainfall_locations"]}, {}),
+        ("advisory", {k: config[k] for k in ("farmers", "concurrency", "latency_ms", "jitter_ms", "error_rate")}, {}),
+    ]
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    try:
+        for name, kwargs, env in plan:
+            if name not in only:
+                continue
+            cache_dir = tempfile.mkdtemp(prefix=f"cache-{name}-", dir=workdir)  # always start cold
+            env = dict(env, **STAND_IN_RATES, CACHE_DIR=cache_dir,
+                       RAINFALL_SCHEDULE_PATH=os.path.join(cache_dir, "rainfall_schedule.sqlite"))
+            with ctx.Pool(1) as pool:
+                result = pool.apply(_child, (workdir, env, name, kwargs))
+            key = name if name != "model_load" else f"model_load_{env['MODEL_FORMAT']}"
+            results[key] = result
+            print(f"  {key}: done")
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": config,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, tolerance=0.1):
+    """
+    Flag timing metrics in `current` that are more than `tolerance` worse than in `baseline`.
+    Keys ending in _s/_ms are lower-is-better, keys ending in _per_s are higher-is-better.
+    """
+    regressions = []
+
+    def walk(old, new, path):
+        for key, value in new.items():
+            if key not in old:
+                continue
+            if isinstance(value, dict):
+                walk(old[key], value, f"{path}{key}.")
+            elif isinstance(value, (int, float)) and old[key]:
+                change = (value - old[key]) / old[key]
+                if key.endswith("_per_s"):
+                    change = -change
+                elif not key.endswith(("_s", "_ms")):
+                    continue
+                if change > tolerance:
+                    regressions.append({"metric": path + key, "baseline": old[key], "current": value,
+                                        "change": round(change, 3)})
+
+    walk(baseline["results"], current["results"], "")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline performance benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="small sizes for a fast smoke run")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--out", help="write the JSON report to this path")
+    parser.add_argument("--baseline", help="compare against a previous JSON report and list regressions")
+    parser.add_argument("--workdir", help="keep artifacts in this directory instead of a temporary one")
+    for key, value in DEFAULTS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=None)
+    args = parser.parse_args()
+
+    config = dict(QUICK if args.quick else DEFAULTS)
+    config.update({k: getattr(args, k) for k in DEFAULTS if getattr(args, k) is not None})
+    only = args.only
+    if only and "training" not in only and not args.workdir:
+        parser.error("benchmarks other than training need a --workdir that already holds trained artifacts")
+
+    report = run_suite(config, only, args.workdir)
+    if args.baseline:
+        with open(args.baseline) as fh:
+            report["regressions"] = compare(json.load(fh), report)
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
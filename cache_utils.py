@@ -0,0 +1,115 @@
+# cache_utils.py
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import increment
+
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+EVICT_EVERY = 500  # writes between eviction sweeps
+
+
+class DiskCache:
+    """
+    Small persistent key/value store on SQLite with per-entry expiry and
+    least-recently-used eviction. Values are stored as JSON.
+    """
+
+    def __init__(self, filename, ttl=None, max_entries=None):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.path = os.path.join(CACHE_DIR, filename)
+        self.name = os.path.splitext(filename)[0]
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)")
+
+    def get(self, key):
+        """Return the cached value for key, or None if it is missing or expired"""
+        value = self._get(key)
+        increment("cache_requests_total", cache=self.name, result="miss" if value is None else "hit")
+        return value
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            if self.max_entries:
+                self._conn.execute("UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def get_many(self, keys):
+        """Return a dict of the unexpired cached values for the given keys"""
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        """
+        Store value under key. Expiry is taken from expires_at, then ttl, then the cache default.
+        """
+        now = time.time()
+        if expires_at is None:
+            ttl = self.ttl if ttl is None else ttl
+            expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now),
+            )
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict(now)
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def evict(self):
+        """Drop expired entries and, if the cache is bounded, the least recently used overflow"""
+        with self._lock:
+            self._evict(time.time())
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        if self.max_entries:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+def grid_cell(lat, lon, resolution):
+    """
+    Snap a point to the cell of a regular lat/lon grid with the given resolution in degrees.
+    Returns the integer (row, col) index of the cell and the (lat, lon) of its centre, so every
+    point inside the same pixel shares one cache key.
+    """
+    row = math.floor(lat / resolution)
+    col = math.floor(lon / resolution)
+    return (row, col), ((row + 0.5) * resolution, (col + 0.5) * resolution)
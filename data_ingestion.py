@@ -0,0 +1,95 @@
+# data_ingestion.py
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+DATA_PATH = os.path.join("data", "ofra_dataset.csv")
+FEATURE_STORE_PATH = os.path.join("data", "ofra_features.parquet")
+
+CATEGORICAL_COLUMNS = ['texture', 'previous_crop']
+NUMERICAL_COLUMNS = ['ph', 'nitrogen', 'phosphorus', 'potassium', 'organic_carbon']
+TARGET_COLUMN = 'fertilizer_used'
+
+CHUNK_ROWS = 100000
+
+
+def feature_schema(categorical_cols=CATEGORICAL_COLUMNS, numerical_cols=NUMERICAL_COLUMNS, target_col=TARGET_COLUMN):
+    """
+    Arrow schema of the feature store: dictionary-encoded strings for categories and the target,
+    float32 for measurements (soil lab values carry nowhere near 7 significant digits)
+    """
+    category = pa.dictionary(pa.int32(), pa.string())
+    fields = [pa.field(col, category) for col in categorical_cols]
+    fields += [pa.field(col, pa.float32()) for col in numerical_cols]
+    fields.append(pa.field(target_col, category))
+    return pa.schema(fields)
+
+
+def ingest_csv(csv_path=DATA_PATH, store_path=FEATURE_STORE_PATH, chunk_rows=CHUNK_ROWS,
+               categorical_cols=CATEGORICAL_COLUMNS, numerical_cols=NUMERICAL_COLUMNS, target_col=TARGET_COLUMN):
+    """
+    Stream the OFRA CSV chunk by chunk into a Parquet feature store, parsing only the columns
+    training uses with explicit compact dtypes. Returns the number of rows written.
+    """
+    schema = feature_schema(categorical_cols, numerical_cols, target_col)
+    dtypes = {col: "string" for col in categorical_cols + [target_col]}
+    dtypes.update({col: "float32" for col in numerical_cols})
+
+    tmp_path = store_path + ".tmp"
+    rows = 0
+    with pq.ParquetWriter(tmp_path, schema) as writer:
+        for chunk in pd.read_csv(csv_path, usecols=list(dtypes), dtype=dtypes, chunksize=chunk_rows):
+            chunk = chunk.astype({col: "category" for col in categorical_cols + [target_col]})
+            table = pa.Table.from_pandas(chunk[schema.names], preserve_index=False).cast(schema)
+            writer.write_table(table)
+            rows += len(chunk)
+    os.replace(tmp_path, store_path)  # never leave a half-written store behind
+    return rows
+
+
+def store_is_fresh(csv_path=DATA_PATH, store_path=FEATURE_STORE_PATH):
+    """True if the feature store exists and is newer than the CSV it was built from"""
+    if not os.path.exists(store_path):
+        return False
+    return not os.path.exists(csv_path) or os.path.getmtime(store_path) >= os.path.getmtime(csv_path)
+
+
+def load_feature_store(store_path=FEATURE_STORE_PATH, columns=None):
+    """
+    Memory-map the Parquet feature store as an Arrow table, dropping incomplete rows
+    """
+    table = pq.read_table(store_path, columns=columns, memory_map=True)
+    return table.drop_null()
+
+
+def category_codes(column):
+    """
+    Label-encode an Arrow string/dictionary column without going through pandas.
+    Codes follow sorted category order, exactly like sklearn's LabelEncoder.
+    Returns (codes as int32 array, sorted categories).
+    """
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(pa.string())
+    categories = pc.unique(column).sort()
+    codes = pc.index_in(column, value_set=categories)
+    return codes.to_numpy(zero_copy_only=False).astype(np.int32), np.asarray(categories.to_pylist(), dtype=object)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the OFRA CSV into a Parquet feature store")
+    parser.add_argument("--csv", default=DATA_PATH)
+    parser.add_argument("--store", default=FEATURE_STORE_PATH)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    rows = ingest_csv(args.csv, args.store, args.chunk_rows)
+    print(f"✅ Wrote {rows} rows to {args.store}")
+
+
+if __name__ == "__main__":
+    main()
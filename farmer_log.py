@@ -0,0 +1,169 @@
+# farmer_log.py
+import argparse
+import fcntl
+import gzip
+import json
+import os
+import time
+import uuid
+
+LOG_DIR = os.getenv("FARMER_LOG_DIR", os.path.join("data", "farmer_log"))
+SEGMENT_BYTES = 8 * 2 ** 20  # the active segment is sealed and gzipped once it grows past this
+# Only submissions whose reported yield reached this (bags per acre) teach the model their fertilizer
+MIN_TRAINING_YIELD = float(os.getenv("MIN_TRAINING_YIELD", 15))
+START = {"segment": 0, "line": 0}
+
+
+class FarmerLog:
+    """
+    Append-only log of validated farmer submissions and reported outcomes, one JSON object per
+    line in numbered segments. Sealed segments are gzipped; a (segment, line) cursor marks how far
+    a reader has got, and stays valid when a segment is sealed.
+    """
+
+    def __init__(self, log_dir=LOG_DIR):
+        self.log_dir = log_dir
+        os.makedirs(log_dir, exist_ok=True)
+
+    def _segments(self):
+        """[(number, path)] in order, sealed and active alike"""
+        segments = []
+        for name in os.listdir(self.log_dir):
+            if name.startswith("segment-") and name.endswith((".jsonl", ".jsonl.gz")):
+                segments.append((int(name.split("-")[1].split(".")[0]), os.path.join(self.log_dir, name)))
+        return sorted(segments)
+
+    def append(self, record):
+        """Add one record; appends from several processes are serialised with a file lock"""
+        line = (json.dumps(record, separators=(",", ":"), default=str) + "\n").encode()
+        with open(os.path.join(self.log_dir, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            segments = self._segments()
+            number, path = segments[-1] if segments else (1, None)
+            if path is None or path.endswith(".gz") or os.path.getsize(path) >= SEGMENT_BYTES:
+                if path is not None and not path.endswith(".gz"):
+                    self._seal(path)
+                number += path is not None
+                path = os.path.join(self.log_dir, f"segment-{number:06d}.jsonl")
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    def _seal(self, path):
+        with open(path, "rb") as src, gzip.open(path + ".gz.tmp", "wb") as dst:
+            dst.writelines(src)
+        os.replace(path + ".gz.tmp", path + ".gz")
+        os.remove(path)
+
+    def _lines(self, path):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt") as fh:
+            for line in fh:
+                if not line.endswith("\n"):
+                    return  # an append still in flight; picked up next time
+                yield line
+
+    def read_since(self, cursor=START):
+        """Every record after `cursor`, and the cursor just past the last one"""
+        records = []
+        for number, path in self._segments():
+            if number < cursor["segment"]:
+                continue
+            skip = cursor["line"] if number == cursor["segment"] else 0
+            count = 0
+            for count, line in enumerate(self._lines(path), 1):
+                if count > skip:
+                    records.append(json.loads(line))
+            cursor = {"segment": number, "line": max(count, skip)}
+        return records, cursor
+
+    def find(self, ids):
+        """{id: record} for the given record ids, scanning the whole log"""
+        ids, found = set(ids), {}
+        for _, path in self._segments():
+            for line in self._lines(path):
+                record = json.loads(line)
+                if record.get("id") in ids:
+                    found[record["id"]] = record
+        return found
+
+
+_log = None
+
+
+def get_log():
+    global _log
+    if _log is None:
+        _log = FarmerLog()
+    return _log
+
+
+def log_submission(location, lat, lon, data):
+    """Record a validated submission (soil data plus the farmer's answers). Returns its id."""
+    record = {"type": "submission", "id": uuid.uuid4().hex[:16], "ts": round(time.time(), 3),
+              "location": location, "lat": lat, "lon": lon, "data": data}
+    get_log().append(record)
+    return record["id"]
+
+
+def log_outcome(submission_id, fertilizer_used, yield_bags):
+    """Record what a farmer applied after a submission and the yield it gave (bags per acre)"""
+    record = {"type": "outcome", "id": uuid.uuid4().hex[:16], "ts": round(time.time(), 3),
+              "submission": submission_id, "fertilizer_used": fertilizer_used, "yield": yield_bags}
+    get_log().append(record)
+    return record["id"]
+
+
+def training_rows(records, log=None, min_yield=MIN_TRAINING_YIELD):
+    """
+    Turn log records into training rows: a submission teaches the fertilizer the farmer used last
+    season, an outcome the fertilizer applied after the submission, on that submission's soil.
+    Rows whose yield fell short of `min_yield` are left out. Returns a list of dicts.
+    """
+    submissions = {r["id"]: r for r in records if r["type"] == "submission"}
+    new = list(submissions.values())
+    outcomes = [r for r in records if r["type"] == "outcome"]
+    older = {r["submission"] for r in outcomes} - set(submissions)
+    if older:
+        submissions.update((log or get_log()).find(older))
+
+    rows = [dict(record["data"]) for record in new]
+    for outcome in outcomes:
+        submission = submissions.get(outcome["submission"])
+        if submission is not None:
+            rows.append(dict(submission["data"], fertilizer_used=outcome["fertilizer_used"],
+                             previous_yield=outcome["yield"]))
+
+    def good(row):
+        try:
+            return float(row.get("previous_yield")) >= min_yield
+        except (TypeError, ValueError):
+            return False
+
+    return [row for row in rows if good(row)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append-only log of farmer submissions and outcomes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    outcome = sub.add_parser("outcome", help="record the fertilizer applied after a submission and its yield")
+    outcome.add_argument("submission")
+    outcome.add_argument("fertilizer_used")
+    outcome.add_argument("yield_bags", type=float)
+    sub.add_parser("stats", help="count the records and the training rows they give")
+    args = parser.parse_args()
+
+    if args.command == "outcome":
+        print(log_outcome(args.submission, args.fertilizer_used, args.yield_bags))
+    else:
+        records, cursor = get_log().read_since()
+        kinds = {}
+        for record in records:
+            kinds[record["type"]] = kinds.get(record["type"], 0) + 1
+        print(json.dumps({"records": kinds, "training_rows": len(training_rows(records)), "end": cursor}))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,46 @@
-import joblib
-import requests
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import json 
-from encoder_utils import load_encoders
-from scaler_utils import load_scaler
-
-categorical_columns = ['soil_texture', 'previous_crop', 'fertilizer_used']
-encoder = load_encoders(categorical_columns)
-scaler = load_scaler() 
+from farmer_log import log_submission
+from geocoding import get_coordinates
+from http_utils import get_json
+from metrics import span
+from soil_cache import cached_soil_data
 
 load_dotenv()
 
-def get_coordinates(location):
-    """
-    Convert County and Sub-county(will add ward for more precisions) to GPS coordinates using OpenCage API.
-    This is because the NASA
-    """
+# Overridable so benchmarks and tests can point at local stand-ins
+ISDA_SOIL_URL = os.getenv("ISDA_SOIL_URL", "https://rest.isda-africa.com/soilproperty")
+ISDA_LAYERS_URL = os.getenv("ISDA_LAYERS_URL", "https://api.isda-africa.com/v1/layers")
+# "isda" queries the API (through the soil cache); "raster" reads the local store built by soil_raster.py
+SOIL_BACKEND = os.getenv("SOIL_BACKEND", "isda")
+_isda_layers = None
 
-    OPENCAGE_API = os.getenv('OPENCAGE_API_KEY')
-    print('First')
 
-    url = "https://api.opencagedata.com/geocode/v1/json"
-    payload = {'q': location, 'key': OPENCAGE_API, 'countrycode': 'ke'}
-    
-    try:
-        r = requests.get(url, params=payload)
-        r.raise_for_status()
-    except requests.exceptions.RequestException as err:
-        print(f"Request failed during processing: {err}")
-        return None
+def get_isda_layers():
+    """
+    Query the iSDA layers endpoint on first use and keep the metadata for the life of the process.
+    Failures are not remembered so the next call tries again.
+    """
+    global _isda_layers
+    if _isda_layers is None:
+        _isda_layers = get_json("isda", ISDA_LAYERS_URL, { 'key': os.getenv('ISDA_API_KEY') })
+    return _isda_layers
 
-    try:    
-        data = r.json() # only proceeds to here if the request is succesful thanks to the raise-for-status function. However No content 204 might pass here
-    except json.JSONDecodeError:
-        print("Empty or invalid JSON in response")
-        return None
-    
-    if data['results']:
-        lat = data['results'][0]['geometry']['lat']
-        lon = data['results'][0]['geometry']['lng']
-        return lat, lon
-    else:
-        return None, None
-    
 
-# Function to fetch soil data from SoilGrids API (example)
-def fetch_soil_data(lat, lon):
+def fetch_isda_soil_data(lat, lon):
     """
-    Fetch existing soil data from soilgrids api. 
-    This fetches the nitrogen, soil ph, organic carbon density, and phosphorus content
+    Fetch existing soil data for one point from the iSDA soil property api.
+    This fetches the nitrogen, soil ph, organic carbon, phosphorus, potassium and texture class
     """
-    ISDA_API = os.getenv('ISDA_API_KEY')
-    payload = { 'key': ISDA_API, 'lon': lon, 'lat': lat, 'property': [ 'Carbon, organic', 'Nitrogen, total', 'Phosphorus, extractable', 'Potassium, extractable', 'pH' , 'USDA Texture Class' ], 'depth': 0-20 }
+    payload = { 'key': os.getenv('ISDA_API_KEY'), 'lon': lon, 'lat': lat, 'property': [ 'Carbon, organic', 'Nitrogen, total', 'Phosphorus, extractable', 'Potassium, extractable', 'pH' , 'USDA Texture Class' ], 'depth': '0-20' }
 
-    # Query layers endpoint for first time use, then now to our endpoint. Its: https://api.isda-africa.com/v1/layers?key=mykeynostring
-    url = "https://rest.isda-africa.com/soilproperty"
+    get_isda_layers()  # the layers endpoint has to be queried before the first soil property call
 
-    first_payload = { 'key': ISDA_API }
-    first_url = 'https://api.isda-africa.com/v1/layers'
-    res = requests.get(first_url, params=first_payload)
-    print(res)
-    # Only for first API call
-
-    try:
-        r = requests.get(url, params=payload, timeout=10)
-        print(r.url) # test if url is alright and encoding okay
-        r.raise_for_status()
-    except requests.exceptions.RequestException as err:
-        print("Request failed during processing: {}", format(err))
+    data = get_json("isda", ISDA_SOIL_URL, payload)
+    if data is None:
         return None
 
-    try:
-        data = r.json()
-        print(data)
-    except json.JSONDecodeError:
-        print("Empty or invalid JSON in response")
-        return None
-    
     soil_data = {
         "ph": data.get("ph"),  #returns an array of dictionaries
         "nitrogen": data.get("nitrogen_total"),
@@ -89,6 +52,24 @@ def fetch_soil_data(lat, lon):
     return soil_data
 
 
+# Function to fetch soil data for a farm
+@span("soil")
+def fetch_soil_data(lat, lon):
+    """
+    Fetch existing soil data for a farm. Farms in the same raster pixel share one
+    cached iSDA response, so repeat lookups never leave the machine. With SOIL_BACKEND=raster
+    the local soil rasters answer instead, falling back to iSDA outside their coverage.
+    """
+    if lat is None or lon is None:
+        return None
+    if SOIL_BACKEND == "raster":
+        from soil_raster import soil_at
+        soil_data = soil_at(lat, lon)
+        if soil_data is not None:
+            return soil_data
+    return cached_soil_data(lat, lon, fetch_isda_soil_data, provider="isda")
+
+
 def clean_and_validate(soil_data):
     """
     Check for missing or invalid soil values in data pulled from the API. 
@@ -102,22 +83,14 @@ def clean_and_validate(soil_data):
     return soil_data
 
 
-def encode_categorical(inputs, encoder):
+def warm_up():
     """
-    Encode all categorical inputs using LabelEncoder
+    Load the model and preprocessing ahead of the first recommendation.
+    Importing this module stays cheap: pandas, numpy and sklearn are only pulled in here.
     """
-    encoded = []
-    for val in inputs:
-        try:
-            encoded.append(encoder.transform([val])[0])
-        except ValueError:
-            print(f"Unknown input category: '{val}'. Please use known categories.")
-            return None
-    return encoded
+    from batch_prediction import warm_up as warm_up_artifacts
 
-def normalize_numerical(inputs, scaler):
-    """Normalize numerical inputs using fitted scaler"""
-    return scaler.transform([inputs])[0].tolist()
+    return warm_up_artifacts()
 
 
 # Function to get farmer input and make predictions
@@ -127,14 +100,18 @@ def get_farmer_input():
 
     location = input("Enter your County and Sub-county(e.g., Nakuru, Bahati): ")
     lat, lon = get_coordinates(location)
-    # Collect  farming-specific inputs to be used to train model as well
-    previous_yield = float(input("Enter your previous maize yield (bags per acre): "))
-    soil_texture = input("Add a little water to your soil and rub it between your fingers. How does it feel? (e.g. gritty, sticky, soft, smooth): ")
-    previous_crop = input("Enter the previous crop grown (e.g., maize, beans): ")
-    fertilizer_used = input("Enter the type of fertilizer you used (e.g., DAP, CAN, Urea, Compost): ") # combined with yields, you can gauge their effectiveness. If implementing is hard, do it in v2
 
-    # Fetch soil data from SoilGrids API
-    soil_data = fetch_soil_data(lat, lon)
+    # Start the soil lookup now so it runs while the farmer answers the questions below
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        soil_future = pool.submit(fetch_soil_data, lat, lon)
+
+        # Collect  farming-specific inputs to be used to train model as well
+        previous_yield = float(input("Enter your previous maize yield (bags per acre): "))
+        soil_texture = input("Add a little water to your soil and rub it between your fingers. How does it feel? (e.g. gritty, sticky, soft, smooth): ")
+        previous_crop = input("Enter the previous crop grown (e.g., maize, beans): ")
+        fertilizer_used = input("Enter the type of fertilizer you used (e.g., DAP, CAN, Urea, Compost): ") # combined with yields, you can gauge their effectiveness. If implementing is hard, do it in v2
+
+        soil_data = soil_future.result()
 
     if soil_data is None:
         print("Could not fetch soil data. Please check your location and try again.")
@@ -151,6 +128,12 @@ def get_farmer_input():
         "previous_crop": previous_crop,
         "fertilizer_used": fertilizer_used
     })
+
+    # Keep the validated submission for the next incremental retrain; never fail the farmer over it
+    try:
+        log_submission(location, lat, lon, soil_data)
+    except OSError as e:
+        print(f"Could not log the submission: {e}")
     return soil_data
 
 
@@ -158,37 +141,22 @@ def recommend_fertilizer():
     """
     Use processed data to predict the best fertilizer
     """
-    cleaned_raw_data = get_farmer_input()
+    from batch_prediction import ERROR_COLUMN, RESULT_COLUMN, recommend_batch
+
+    # Load the model in the background while the farmer is still answering questions
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        artifacts_future = pool.submit(warm_up)
+        cleaned_raw_data = get_farmer_input()
+        artifacts = artifacts_future.result()
     if cleaned_raw_data is None:
         return
 
-    # Prepare input
-    categorical = [
-        cleaned_raw_data["soil_texture"],
-        cleaned_raw_data["previous_crop"],
-        cleaned_raw_data["fertilizer_used"]
-    ]
-    numeric = [
-        cleaned_raw_data["previous_yield"],
-        cleaned_raw_data["ph"],
-        cleaned_raw_data["nitrogen"],
-        cleaned_raw_data["phosphorus"],
-        cleaned_raw_data["potassium"],
-        cleaned_raw_data["organic_carbon"]
-    ]
-
-    encoded_cats = encode_categorical(categorical, encoder)
-    if encoded_cats is None:
+    # The preprocessing artifact saved with the model picks the columns it was trained on
+    result = recommend_batch([cleaned_raw_data], artifacts).iloc[0]
+    if result[ERROR_COLUMN] is not None:
+        print(f"Cannot recommend a fertilizer: {result[ERROR_COLUMN]}")
         return
-    normalized_nums = normalize_numerical(numeric, scaler)
-
-    # Combine and predict
-    model = joblib.load("models/fertilizer_model.joblib")
-    target_encoder = joblib.load("models/target_encoder.joblib")
-
-    final_input = encoded_cats + normalized_nums
-    prediction = model.predict([final_input])[0]
-    recommendation = target_encoder.inverse_transform([prediction])[0]
+    recommendation = result[RESULT_COLUMN]
 
     print(f"🌱 Recommended Fertilizer: {recommendation}")
 
@@ -0,0 +1,267 @@
+# forest_export.py
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+MODEL_PATH = os.path.join("models", "fertilizer_model.joblib")
+FOREST_DIR = os.path.join("models", "forest")
+FORMAT_VERSION = 2
+ARRAYS = ["feature", "threshold", "children", "missing_left", "value", "roots"]
+# (row, tree) pairs walked at once: bounds the working arrays whatever the number of trees
+CHUNK_PAIRS = 262144
+# Finished pairs are dropped every few levels; doing it every level costs more than it saves
+COMPACT_EVERY = 8
+
+
+def export_forest(model, out_dir=FOREST_DIR):
+    """
+    Flatten a fitted RandomForestClassifier into contiguous node arrays, one .npy file each,
+    so it can be memory-mapped instead of unpickled. Node ids are global across trees, a node's
+    (left, right) children sit side by side in `children` and leaves point to themselves, which
+    is how the predictor recognises them. A single fitted DecisionTreeClassifier exports as a
+    one-tree forest.
+    """
+    trees = [est.tree_ for est in getattr(model, "estimators_", [model])]
+    counts = np.array([t.node_count for t in trees])
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    total = int(counts.sum())
+
+    feature = np.zeros(total, dtype=np.int32)
+    threshold = np.zeros(total, dtype=np.float64)
+    children = np.zeros((total, 2), dtype=np.int32)
+    missing_left = np.zeros(total, dtype=bool)
+    value = np.zeros((total, model.n_classes_), dtype=np.float64)
+
+    for tree, offset in zip(trees, offsets):
+        nodes = slice(offset, offset + tree.node_count)
+        ids = np.arange(offset, offset + tree.node_count, dtype=np.int32)
+        leaf = tree.children_left == -1
+        feature[nodes] = np.where(leaf, 0, tree.feature)
+        threshold[nodes] = np.where(leaf, 0.0, tree.threshold)
+        children[nodes, 0] = np.where(leaf, ids, tree.children_left + offset)
+        children[nodes, 1] = np.where(leaf, ids, tree.children_right + offset)
+        if hasattr(tree, "missing_go_to_left"):
+            missing_left[nodes] = tree.missing_go_to_left.astype(bool)
+        # Same normalisation as DecisionTreeClassifier.predict_proba
+        proba = tree.value[:, 0, :model.n_classes_].astype(np.float64)
+        normalizer = proba.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0] = 1
+        value[nodes] = proba / normalizer
+
+    arrays = {"feature": feature, "threshold": threshold, "children": children,
+              "missing_left": missing_left, "value": value, "roots": offsets.astype(np.int32)}
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "classes": model.classes_.tolist(),
+        "n_features": int(model.n_features_in_),
+        "max_depth": int(max(t.max_depth for t in trees)),
+        "n_trees": len(trees),
+        "n_nodes": total,
+    }
+    save_forest(arrays, meta, out_dir)
+    return meta
+
+
+def save_forest(arrays, meta, out_dir=FOREST_DIR):
+    """
+    Write node arrays and their meta.json in the layout load_forest reads. The files go into a
+    fresh directory next to `out_dir`, which then becomes a symlink to it in one atomic rename:
+    processes that already memory-mapped the previous export keep reading its (now unlinked)
+    files unchanged, and a new load sees either the old forest or the new one, never a mix.
+    """
+    out_dir = os.path.normpath(out_dir)
+    parent, name = os.path.split(out_dir)
+    new_dir = tempfile.mkdtemp(prefix=f"{name}.", dir=parent or ".")
+    for array_name in ARRAYS:
+        np.save(os.path.join(new_dir, f"{array_name}.npy"), arrays[array_name])
+    with open(os.path.join(new_dir, "meta.json"), "w") as fh:
+        json.dump(meta, fh, indent=2)
+    os.chmod(new_dir, 0o755)  # mkdtemp makes it private to this user
+    _swap_dir(new_dir, out_dir)
+
+
+def _swap_dir(new_dir, target):
+    # Point the `target` symlink at new_dir and delete the directory it pointed at before
+    previous = os.path.realpath(target) if os.path.islink(target) else None
+    link = target + ".link.tmp"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(new_dir), link)
+    if os.path.isdir(target) and not os.path.islink(target):
+        # An export from before exports were swapped in: move it aside first. Only this one
+        # replacement leaves a moment with nothing at `target`.
+        aside = tempfile.mkdtemp(prefix=f"{os.path.basename(target)}.old.", dir=os.path.dirname(target) or ".")
+        os.rename(target, os.path.join(aside, "forest"))
+        os.replace(link, target)
+        shutil.rmtree(aside)
+        return
+    os.replace(link, target)
+    if previous and previous != os.path.realpath(new_dir) and os.path.isdir(previous):
+        shutil.rmtree(previous)
+
+
+class CompactForest:
+    """
+    Array-backed random forest with the same predict/predict_proba results as the sklearn model
+    it was exported from. Arrays are memory-mapped read-only, so worker processes share one copy
+    through the page cache.
+
+    It loads in milliseconds and costs next to no private memory, but walking the trees with
+    numpy gathers predicts a few times slower than sklearn's compiled trees (bench: ~55k vs
+    ~190k rows/s for a 30-tree forest). That suits the servers, which load once and score a few
+    rows per request; batch_prediction keeps MODEL_FORMAT=joblib as its default for throughput.
+    """
+
+    def __init__(self, arrays, meta):
+        self.__dict__.update(arrays)
+        self.left, self.right = self.children[:, 0], self.children[:, 1]
+        self.classes_ = np.asarray(meta["classes"])
+        self.n_features_in_ = meta["n_features"]
+
+    def apply(self, X):
+        """Leaf node id reached in every tree for every row, shape (rows, trees)"""
+        X = np.asarray(X, dtype=np.float32)  # sklearn trees compare float32 inputs as well
+        n_rows, n_trees = len(X), len(self.roots)
+        flat_X = X.ravel()
+        children = self.children.reshape(-1)  # node * 2 + go_right is the child taken
+        has_nan = bool(np.isnan(flat_X).any())
+        node = np.tile(self.roots.astype(np.intp), n_rows)
+        pair = np.arange(node.size)
+        row_start = np.repeat(np.arange(n_rows, dtype=np.intp) * X.shape[1], n_trees)
+        leaves = np.empty(node.size, dtype=np.intp)
+        # Leaves point to themselves, so pairs that reached one just stay put until dropped
+        level = 0
+        while pair.size:
+            x = flat_X[row_start + self.feature[node]]
+            go_right = x > self.threshold[node]
+            if has_nan:
+                go_right = ~((x <= self.threshold[node]) | (np.isnan(x) & self.missing_left[node]))
+            next_node = children[2 * node + go_right]
+            level += 1
+            if level % COMPACT_EVERY == 0:
+                done = next_node == node
+                leaves[pair[done]] = node[done]
+                keep = ~done
+                pair, next_node, row_start = pair[keep], next_node[keep], row_start[keep]
+            node = next_node
+        return leaves.reshape(n_rows, n_trees)
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        proba = np.empty((len(X), len(self.classes_)))
+        chunk_rows = max(1, CHUNK_PAIRS // len(self.roots))
+        for start in range(0, len(X), chunk_rows):
+            leaves = self.apply(X[start:start + chunk_rows])
+            proba[start:start + chunk_rows] = self.value[leaves].sum(axis=1)
+        proba /= len(self.roots)
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def load_forest(forest_dir=FOREST_DIR, mmap=True):
+    """Load an exported forest, memory-mapping its arrays unless mmap is False"""
+    forest_dir = os.path.realpath(forest_dir)  # one export throughout, even if a new one is swapped in
+    with open(os.path.join(forest_dir, "meta.json")) as fh:
+        meta = json.load(fh)
+    mode = "r" if mmap else None
+    if meta["format_version"] == 1:
+        # Separate left/right files: pair them up in memory until the forest is exported again
+        names = [name for name in ARRAYS if name != "children"] + ["left", "right"]
+        arrays = {name: np.load(os.path.join(forest_dir, f"{name}.npy"), mmap_mode=mode) for name in names}
+        arrays["children"] = np.stack([arrays.pop("left"), arrays.pop("right")], axis=1)
+        return CompactForest(arrays, meta)
+    if meta["format_version"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported forest format version {meta['format_version']}")
+    arrays = {name: np.load(os.path.join(forest_dir, f"{name}.npy"), mmap_mode=mode) for name in ARRAYS}
+    return CompactForest(arrays, meta)
+
+
+def _rss_mb():
+    with open("/proc/self/statm") as fh:
+        return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def _measure(kind, path, X):
+    # Runs in a fresh process so load time and memory are not skewed by the other format
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    if kind == "joblib":
+        import joblib
+        model = joblib.load(path)
+    else:
+        model = load_forest(path)
+    load_s = time.perf_counter() - start
+    rss_loaded = _rss_mb()
+
+    start = time.perf_counter()
+    predictions = model.predict(X)
+    predict_s = time.perf_counter() - start
+    return {
+        "format": kind,
+        "load_s": round(load_s, 4),
+        "rss_after_load_mb": round(rss_loaded - rss_before, 1),
+        "rss_after_predict_mb": round(_rss_mb() - rss_before, 1),
+        "rows_per_s": round(len(X) / predict_s),
+    }, predictions
+
+
+def _dir_size_mb(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 2 ** 20
+    path = os.path.realpath(path)
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 2 ** 20
+
+
+def benchmark(model_path=MODEL_PATH, forest_dir=FOREST_DIR, rows=100000, seed=0):
+    """
+    Compare the joblib pickle with the exported forest on load time, memory, throughput and
+    on-disk size, each in its own process, and check that both give identical predictions
+    """
+    with open(os.path.join(forest_dir, "meta.json")) as fh:
+        n_features = json.load(fh)["n_features"]
+    X = np.random.default_rng(seed).normal(size=(rows, n_features)).astype(np.float32)
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    predictions = {}
+    for kind, path in (("joblib", model_path), ("compact", forest_dir)):
+        with ctx.Pool(1) as pool:
+            result, predictions[kind] = pool.apply(_measure, (kind, path, X))
+        result["size_mb"] = round(_dir_size_mb(path), 2)
+        results.append(result)
+
+    identical = bool(np.array_equal(predictions["joblib"], predictions["compact"]))
+    return {"rows": rows, "identical_predictions": identical, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the RandomForest to compact arrays and benchmark it")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="flatten the joblib model into node arrays")
+    export.add_argument("--model", default=MODEL_PATH)
+    export.add_argument("--out", default=FOREST_DIR)
+    bench = sub.add_parser("bench", help="compare load time, memory and rows/sec against the joblib model")
+    bench.add_argument("--model", default=MODEL_PATH)
+    bench.add_argument("--forest", default=FOREST_DIR)
+    bench.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        import joblib
+
+        meta = export_forest(joblib.load(args.model), args.out)
+        print(f"✅ Exported {meta['n_trees']} trees ({meta['n_nodes']} nodes) to {args.out}")
+    else:
+        print(json.dumps(benchmark(args.model, args.forest, args.rows), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# geocoding.py
+import csv
+import difflib
+import os
+import re
+from functools import lru_cache
+
+from cache_utils import DiskCache
+from http_utils import get_json
+from metrics import increment, span
+
+OPENCAGE_URL = os.getenv("OPENCAGE_URL", "https://api.opencagedata.com/geocode/v1/json")
+GAZETTEER_PATH = os.path.join("data", "kenya_gazetteer.csv")
+GEOCODE_TTL = 90 * 24 * 3600  # admin unit centroids do not move; refresh quarterly anyway
+FUZZY_CUTOFF = 0.85
+# Words that tell sibling sub-counties apart ("Kajiado North" vs "Kajiado South"); never fuzzed
+QUALIFIERS = {"north", "south", "east", "west", "central", "town"}
+
+_cache = None
+
+
+def normalize_location(location):
+    """
+    Reduce free-text "County, Sub-county" input to a canonical key so that
+    "Nakuru,  Bahati", "nakuru bahati" and "Nakuru County, Bahati Sub-County" all match
+    """
+    key = location.lower().replace("'", "")
+    key = re.sub(r"\bsub[\s-]*county\b|\bcounty\b", " ", key)
+    key = re.sub(r"[^a-z0-9]+", " ", key)
+    return " ".join(key.split())
+
+
+@lru_cache(maxsize=1)
+def load_gazetteer(path=GAZETTEER_PATH):
+    """
+    Load the bundled Kenyan county/sub-county gazetteer into a {normalized key: (lat, lon)} dict
+    """
+    index = {}
+    sub_counties = {}
+    with open(path, newline="") as fh:
+        for row in csv.DictReader(fh):
+            coords = (float(row["latitude"]), float(row["longitude"]))
+            county = normalize_location(row["county"])
+            if not row["sub_county"]:
+                index[county] = coords
+                continue
+            sub_county = normalize_location(row["sub_county"])
+            index[f"{county} {sub_county}"] = coords
+            index[f"{sub_county} {county}"] = coords
+            sub_counties.setdefault(sub_county, []).append(coords)
+
+    # A bare sub-county name is only usable when it is not shared between counties
+    for sub_county, matches in sub_counties.items():
+        if len(matches) == 1:
+            index.setdefault(sub_county, matches[0])
+    return index
+
+
+@lru_cache(maxsize=4096)
+def lookup_gazetteer(key):
+    """
+    Resolve a normalized key against the gazetteer, falling back to the closest spelling. A
+    misspelling only matches a name with the same words in the same places and the same
+    qualifiers, so a sub-county missing from the gazetteer goes to OpenCage instead of
+    resolving to its sibling ("Mumias West" is not "Mumias East").
+    """
+    gazetteer = load_gazetteer()
+    if key in gazetteer:
+        return gazetteer[key]
+    for close in difflib.get_close_matches(key, gazetteer.keys(), n=5, cutoff=FUZZY_CUTOFF):
+        if _same_qualifiers(key, close):
+            return gazetteer[close]
+    return None
+
+
+def _same_qualifiers(key, candidate):
+    words, candidate_words = key.split(), candidate.split()
+    if len(words) != len(candidate_words):
+        return False
+    return not any(a != b and (a in QUALIFIERS or b in QUALIFIERS) for a, b in zip(words, candidate_words))
+
+
+def _geocode_cache():
+    global _cache
+    if _cache is None:
+        _cache = DiskCache("geocode.sqlite", ttl=GEOCODE_TTL)
+    return _cache
+
+
+def geocode_opencage(location):
+    """
+    Convert a location to GPS coordinates using the OpenCage API. Returns None when nothing was found.
+    """
+    payload = {'q': location, 'key': os.getenv('OPENCAGE_API_KEY'), 'countrycode': 'ke', 'limit': 1, 'no_annotations': 1}
+    data = get_json("opencage", OPENCAGE_URL, payload)
+    if not data or not data.get('results'):
+        return None
+    geometry = data['results'][0]['geometry']
+    return geometry['lat'], geometry['lng']
+
+
+@span("geocode")
+def get_coordinates(location):
+    """
+    Convert County and Sub-county(will add ward for more precisions) to GPS coordinates.
+    Known admin units resolve from the bundled gazetteer, previously geocoded strings from the
+    on-disk cache, and only the rest go to OpenCage. Returns (None, None) if it cannot be found.
+    """
+    key = normalize_location(location)
+    if not key:
+        return None, None
+
+    coords = lookup_gazetteer(key)
+    increment("cache_requests_total", cache="gazetteer", result="miss" if coords is None else "hit")
+    if coords is not None:
+        return coords
+
+    cache = _geocode_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        return tuple(cached)
+
+    coords = geocode_opencage(location)
+    if coords is None:
+        return None, None
+    cache.set(key, coords)
+    return coords
@@ -0,0 +1,108 @@
+# http_utils.py
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import increment, observe, record_upstream_call
+from upstream import coalesce, throttle
+
+# (connect, read) timeouts per upstream, in seconds
+TIMEOUTS = {
+    "opencage": (3.05, 10),
+    "isda": (3.05, 15),
+    "soilgrids": (3.05, 30),
+    "open-meteo": (3.05, 15),
+}
+DEFAULT_TIMEOUT = (3.05, 15)
+
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5  # seconds; attempt n waits a random time up to BACKOFF_BASE * 2**n
+BACKOFF_CAP = 8
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+POOL_SIZE = 32
+
+_session = None
+
+
+def get_session():
+    """
+    One shared requests.Session so every upstream call reuses pooled keep-alive connections
+    """
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(TIMEOUTS), pool_maxsize=POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, stretched to honour a server's Retry-After if it sent one"""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    if retry_after is not None:
+        try:
+            delay = max(delay, min(float(retry_after), BACKOFF_CAP))
+        except ValueError:
+            pass
+    return delay
+
+
+def get_json(provider, url, params=None, retries=MAX_RETRIES):
+    """
+    GET url and return the decoded JSON body, or None if the request keeps failing.
+    Timeouts, connection errors and 429/5xx responses are retried with jittered backoff;
+    other HTTP errors fail straight away. Every attempt waits for the provider's rate limit,
+    and identical requests already in flight share that one call's result.
+    """
+    return coalesce(provider, url, params, lambda: _fetch_json(provider, url, params, retries))
+
+
+def _fetch_json(provider, url, params, retries):
+    timeout = TIMEOUTS.get(provider, DEFAULT_TIMEOUT)
+    session = get_session()
+    for attempt in range(retries + 1):
+        retry_after = None
+        if attempt:
+            increment("upstream_retries_total", provider=provider)
+        throttle(provider)
+        record_upstream_call(provider)
+        start = time.perf_counter()
+        try:
+            try:
+                r = session.get(url, params=params, timeout=timeout)
+            finally:
+                observe("upstream_seconds", time.perf_counter() - start, provider=provider)
+            if r.status_code in RETRY_STATUSES and attempt < retries:
+                retry_after = r.headers.get("Retry-After")
+                raise requests.exceptions.HTTPError(f"{r.status_code} from {provider}", response=r)
+            r.raise_for_status()
+            data = r.json()
+            increment("upstream_requests_total", provider=provider, outcome="ok")
+            return data
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as err:
+            increment("upstream_requests_total", provider=provider, outcome="network_error")
+            error = err
+        except requests.exceptions.HTTPError as err:
+            increment("upstream_requests_total", provider=provider, outcome="http_error")
+            if err.response is None or err.response.status_code not in RETRY_STATUSES:
+                print(f"Request to {provider} failed: {err}")
+                return None
+            error = err
+        except ValueError:  # requests' JSONDecodeError is also a RequestException, so check it first
+            increment("upstream_requests_total", provider=provider, outcome="invalid_json")
+            print(f"Empty or invalid JSON in response from {provider}")
+            return None
+        except requests.exceptions.RequestException as err:
+            increment("upstream_requests_total", provider=provider, outcome="request_error")
+            print(f"Request to {provider} failed: {err}")
+            return None
+
+        if attempt < retries:
+            time.sleep(backoff_delay(attempt, retry_after))
+
+    print(f"Request to {provider} failed after {retries + 1} attempts: {error}")
+    return None
@@ -0,0 +1,249 @@
+# metrics.py
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Daily request allowances per upstream; 0 means untracked. Open-Meteo's free tier is 10k/day,
+# OpenCage's 2.5k/day.
+QUOTA_LIMITS = {
+    "open-meteo": int(os.getenv("OPEN_METEO_DAILY_QUOTA", 10000)),
+    "opencage": int(os.getenv("OPENCAGE_DAILY_QUOTA", 2500)),
+    "isda": int(os.getenv("ISDA_DAILY_QUOTA", 0)),
+    "soilgrids": int(os.getenv("SOILGRIDS_DAILY_QUOTA", 0)),
+}
+QUOTA_WARN_AT = 0.8
+QUOTA_DB = "quota.sqlite"  # in cache_utils.CACHE_DIR, shared by every process and kept across restarts
+QUOTA_KEEP_DAYS = 30
+
+# Attach a per-stage timing breakdown to every advisory/response unless the caller says otherwise
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "0") == "1"
+
+PREFIX = "fertilizer_"
+HELP = {
+    "stage_seconds": "Time spent in each stage of a recommendation or advisory",
+    "upstream_seconds": "Latency of individual upstream HTTP attempts",
+    "upstream_requests_total": "Upstream HTTP attempts by outcome",
+    "upstream_retries_total": "Upstream HTTP attempts that were retried",
+    "upstream_throttle_seconds": "Time spent waiting for a provider's rate limit",
+    "upstream_coalesced_total": "Upstream requests answered by an identical request already in flight",
+    "cache_requests_total": "Cache lookups by result",
+    "quota_used": "Upstream requests made today (UTC) by every process sharing the cache directory",
+    "quota_limit": "Daily upstream request allowance",
+}
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+_quota_lock = threading.Lock()
+_quota_conn = None
+_quota_pid = None
+_quota_warned = {}  # provider -> day warned
+_profile = contextvars.ContextVar("metrics_profile", default=None)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def increment(name, amount=1, **labels):
+    """Add to a counter, e.g. increment("cache_requests_total", cache="soil", result="hit")"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, seconds, **labels):
+    """Record one duration in a histogram"""
+    key = _key(name, labels)
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                series[i] += 1
+                break
+        series[-2] += seconds
+        series[-1] += 1
+
+
+@contextmanager
+def span(stage):
+    """
+    Time a block as one stage of the current request. Recorded in the stage histogram and,
+    when the request is being profiled, in its per-request breakdown as well.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("stage_seconds", elapsed, stage=stage)
+        profile = _profile.get()
+        if profile is not None:
+            profile.append((stage, elapsed))
+
+
+@contextmanager
+def profile_request(enabled=True):
+    """
+    Collect the spans of one request (including those run in threads started with
+    asyncio.to_thread) into a list of (stage, seconds). Costs nothing when disabled.
+    """
+    if not enabled:
+        yield None
+        return
+    spans = []
+    token = _profile.set(spans)
+    try:
+        yield spans
+    finally:
+        _profile.reset(token)
+
+
+def profile_summary(spans):
+    """Milliseconds per stage, summed over repeated stages, in first-seen order"""
+    summary = {}
+    for stage, seconds in spans:
+        summary[stage] = summary.get(stage, 0.0) + seconds * 1000
+    return {stage: round(ms, 2) for stage, ms in summary.items()}
+
+
+def _quota_db():
+    # One connection per process: a forked worker must not reuse its parent's
+    global _quota_conn, _quota_pid
+    if _quota_conn is None or _quota_pid != os.getpid():
+        from cache_utils import CACHE_DIR
+
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(CACHE_DIR, QUOTA_DB), check_same_thread=False,
+                               isolation_level=None, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS quota ("
+                     " day INTEGER NOT NULL, provider TEXT NOT NULL, used INTEGER NOT NULL,"
+                     " PRIMARY KEY (day, provider))")
+        _quota_conn, _quota_pid = conn, os.getpid()
+    return _quota_conn
+
+
+def record_upstream_call(provider):
+    """
+    Count one upstream request against the provider's daily quota (reset at UTC midnight)
+    and warn once a day when usage crosses QUOTA_WARN_AT of the limit. The count lives in
+    SQLite next to the caches, so restarts and forked workers all add to the same total.
+    """
+    today = int(time.time() // 86400)
+    with _quota_lock:
+        db = _quota_db()
+        db.execute("INSERT INTO quota (day, provider, used) VALUES (?, ?, 1)"
+                   " ON CONFLICT (day, provider) DO UPDATE SET used = used + 1", (today, provider))
+        used = db.execute("SELECT used FROM quota WHERE day = ? AND provider = ?", (today, provider)).fetchone()[0]
+        if used == 1:  # first call of the day: drop old days
+            db.execute("DELETE FROM quota WHERE day < ?", (today - QUOTA_KEEP_DAYS,))
+        limit = QUOTA_LIMITS.get(provider, 0)
+        warn = limit and used >= limit * QUOTA_WARN_AT and _quota_warned.get(provider) != today
+        if warn:
+            _quota_warned[provider] = today
+    if warn:
+        print(f"Warning: {used} of {limit} daily {provider} requests used")
+
+
+def quota_usage():
+    """{provider: (used today, daily limit)} for every provider seen or configured"""
+    today = int(time.time() // 86400)
+    with _quota_lock:
+        used = dict(_quota_db().execute("SELECT provider, used FROM quota WHERE day = ?", (today,)).fetchall())
+    return {p: (used.get(p, 0), QUOTA_LIMITS.get(p, 0)) for p in sorted(set(QUOTA_LIMITS) | set(used))}
+
+
+def snapshot():
+    """This process's counters and histograms as JSON-friendly data, for merge() in another process"""
+    with _lock:
+        return {
+            "counters": [[name, list(labels), value] for (name, labels), value in _counters.items()],
+            "histograms": [[name, list(labels), list(series)] for (name, labels), series in _histograms.items()],
+        }
+
+
+def _add_snapshot(counters, histograms, data):
+    for name, labels, value in data["counters"]:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, series in data["histograms"]:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        total = histograms.setdefault(key, [0] * (len(BUCKETS) + 2))
+        for i, count in enumerate(series):
+            total[i] += count
+
+
+def merge(data):
+    """Add a snapshot() taken elsewhere (e.g. by the worker a restarted one replaces) to this process's metrics"""
+    with _lock:
+        _add_snapshot(_counters, _histograms, data)
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render_prometheus(snapshots=None):
+    """
+    Every metric in the Prometheus text exposition format: this process's own, or the sum of
+    `snapshots` (e.g. one per worker) when given
+    """
+    if snapshots is None:
+        with _lock:
+            counters = sorted(_counters.items())
+            histograms = sorted(_histograms.items())
+    else:
+        counters, histograms = {}, {}
+        for data in snapshots:
+            _add_snapshot(counters, histograms, data)
+        counters, histograms = sorted(counters.items()), sorted(histograms.items())
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {PREFIX}{name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    for (name, labels), value in counters:
+        header(name, "counter")
+        lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+
+    for (name, labels), series in histograms:
+        header(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS, series):
+            cumulative += count
+            lines.append(f"{PREFIX}{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{PREFIX}{name}_bucket{_labels(labels, [('le', '+Inf')])} {series[-1]}")
+        lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {series[-2]:.6f}")
+        lines.append(f"{PREFIX}{name}_count{_labels(labels)} {series[-1]}")
+
+    for name, index in (("quota_used", 0), ("quota_limit", 1)):
+        header(name, "gauge")
+        for provider, usage in quota_usage().items():
+            lines.append(f'{PREFIX}{name}{{provider="{provider}"}} {usage[index]}')
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Forget everything this process recorded so far (the shared daily quota count stays)"""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+    with _quota_lock:
+        _quota_warned.clear()
@@ -0,0 +1,274 @@
+# model_distill.py
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from forest_export import ARRAYS, MODEL_PATH, CompactForest, export_forest, save_forest
+
+DISTILLED_DIR = os.path.join("models", "forest_small")
+TREE_COUNTS = [1, 5, 10, 25, 50]
+DEPTHS = [4, 6, 8, 12, None]
+SURROGATE_DEPTHS = [6, 8, 12, 16, None]
+AUGMENT_FACTOR = 4   # synthetic rows per training row labelled by the full forest for the surrogate
+SWAP_RATE = 0.3      # share of a synthetic row's values taken from other training rows
+LATENCY_ROWS = 200   # single-row predictions timed per candidate
+RANDOM_STATE = 42
+
+
+def to_compact(model):
+    """The fitted sklearn forest (or single tree) as an in-memory CompactForest"""
+    with tempfile.TemporaryDirectory() as tmp:
+        meta = export_forest(model, os.path.join(tmp, "forest"))
+        arrays = {name: np.load(os.path.join(tmp, "forest", f"{name}.npy")) for name in ARRAYS}
+    return CompactForest(arrays, meta), meta
+
+
+def prune(forest, meta, n_trees=None, max_depth=None):
+    """
+    Keep the first `n_trees` trees and cut every tree at `max_depth`: nodes at that depth become
+    leaves predicting the class mix of the samples that reached them (which the export already
+    stores for internal nodes). Unreachable nodes are dropped, so the artifact really shrinks.
+    Returns (CompactForest, meta).
+    """
+    roots = np.asarray(forest.roots[:n_trees])
+    left, right = np.array(forest.left), np.array(forest.right)
+    reachable = np.zeros(len(left), dtype=bool)
+    frontier, depth = roots, 0
+    while frontier.size:
+        reachable[frontier] = True
+        if max_depth is not None and depth == max_depth:
+            left[frontier] = right[frontier] = frontier
+            break
+        frontier = frontier[left[frontier] != frontier]
+        frontier = np.concatenate([left[frontier], right[frontier]])
+        depth += 1
+
+    nodes = np.flatnonzero(reachable)
+    new_id = np.full(len(left), -1, dtype=np.int32)
+    new_id[nodes] = np.arange(len(nodes), dtype=np.int32)
+    arrays = {
+        "feature": np.asarray(forest.feature)[nodes], "threshold": np.asarray(forest.threshold)[nodes],
+        "children": np.stack([new_id[left[nodes]], new_id[right[nodes]]], axis=1),
+        "missing_left": np.asarray(forest.missing_left)[nodes], "value": np.asarray(forest.value)[nodes],
+        "roots": new_id[roots],
+    }
+    meta = dict(meta, n_trees=len(roots), n_nodes=len(nodes),
+                max_depth=meta["max_depth"] if max_depth is None else min(max_depth, meta["max_depth"]))
+    return CompactForest(arrays, meta), meta
+
+
+def augment(X, factor=AUGMENT_FACTOR, swap_rate=SWAP_RATE, seed=RANDOM_STATE):
+    """
+    Synthetic rows for distillation: resampled training rows with a share of their values swapped
+    for the same column of other rows, so every value stays a valid category code or a realistic
+    number while the feature combinations go beyond the training set
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(X), len(X) * factor)
+    synthetic = X[rows].copy()
+    swap = rng.random(synthetic.shape) < swap_rate
+    donors = rng.integers(0, len(X), synthetic.shape)
+    synthetic[swap] = X[donors[swap], np.nonzero(swap)[1]]
+    return synthetic
+
+
+def fit_surrogate(teacher, X, max_depth=None, factor=AUGMENT_FACTOR, seed=RANDOM_STATE):
+    """
+    A single decision tree trained to mimic the full forest: on the training rows plus augmented
+    ones, labelled with the forest's own predictions rather than the original targets
+    """
+    from sklearn.tree import DecisionTreeClassifier
+
+    X_distill = np.concatenate([X, augment(X, factor, seed=seed)])
+    tree = DecisionTreeClassifier(max_depth=max_depth, random_state=seed)
+    return tree.fit(X_distill, teacher.predict(X_distill))
+
+
+def artifact_size_kb(forest, meta):
+    """Bytes on disk of the compact export, as served with MODEL_FORMAT=compact"""
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = os.path.join(tmp, "forest")
+        save_forest({name: np.asarray(getattr(forest, name)) for name in ARRAYS}, meta, out_dir)
+        size = sum(os.path.getsize(os.path.join(out_dir, f)) for f in os.listdir(out_dir))
+    return round(size / 1024, 1)
+
+
+def latency_us(model, X, rows=LATENCY_ROWS):
+    """Median wall time of one single-row predict call, in microseconds"""
+    times = []
+    for row in X[:rows]:
+        start = time.perf_counter()
+        model.predict(row[None, :])
+        times.append(time.perf_counter() - start)
+    return round(float(np.median(times)) * 1e6, 1)
+
+
+def evaluate(name, model, X_test, y_test, reference, size_kb, meta):
+    """Accuracy, agreement with the full model, size and latency of one candidate"""
+    start = time.perf_counter()
+    predictions = model.predict(X_test)
+    batch_s = time.perf_counter() - start
+    return {
+        "name": name,
+        "trees": meta["n_trees"],
+        "max_depth": meta["max_depth"],
+        "nodes": meta["n_nodes"],
+        "size_kb": size_kb,
+        "accuracy": round(float(np.mean(predictions == y_test)), 4),
+        "fidelity": round(float(np.mean(predictions == reference)), 4),
+        "latency_us": latency_us(model, X_test),
+        "rows_per_s": round(len(X_test) / batch_s),
+    }
+
+
+def mark_frontier(reports):
+    """Flag the candidates no other candidate beats on accuracy, size and latency at once"""
+    for r in reports:
+        r["frontier"] = not any(
+            o is not r and o["accuracy"] >= r["accuracy"] and o["size_kb"] <= r["size_kb"]
+            and o["latency_us"] <= r["latency_us"]
+            and (o["accuracy"], o["size_kb"], o["latency_us"]) != (r["accuracy"], r["size_kb"], r["latency_us"])
+            for o in reports
+        )
+    return reports
+
+
+def frontier_report(model, X_train, X_test, y_test, tree_counts=TREE_COUNTS, depths=DEPTHS,
+                    surrogate_depths=SURROGATE_DEPTHS, model_path=MODEL_PATH):
+    """
+    Evaluate the full forest against every pruned (first k trees x depth) and surrogate-tree
+    candidate on the held-out rows. Returns the reports, most accurate first.
+    """
+    full, meta = to_compact(model)
+    reference = full.predict(X_test)
+    reports = [evaluate("full (joblib)", model, X_test, y_test, reference,
+                        round(os.path.getsize(model_path) / 1024, 1), meta)]
+    reports.append(evaluate("full (compact)", full, X_test, y_test, reference, artifact_size_kb(full, meta), meta))
+
+    for n_trees in sorted({min(k, meta["n_trees"]) for k in tree_counts}):
+        for depth in depths:
+            if depth is not None and depth >= meta["max_depth"]:
+                depth = None
+            if n_trees == meta["n_trees"] and depth is None:
+                continue
+            forest, pruned = prune(full, meta, n_trees, depth)
+            reports.append(evaluate(f"pruned k={n_trees} depth={depth or 'full'}", forest, X_test, y_test,
+                                    reference, artifact_size_kb(forest, pruned), pruned))
+
+    for depth in surrogate_depths:
+        forest, tree_meta = to_compact(fit_surrogate(full, X_train, depth))
+        reports.append(evaluate(f"surrogate depth={depth or 'full'}", forest, X_test, y_test, reference,
+                                artifact_size_kb(forest, tree_meta), tree_meta))
+
+    # Drop exact duplicates (e.g. depths beyond what a small forest actually reaches)
+    unique = {}
+    for r in reports:
+        kind = r["name"] if r["name"].startswith("full") else r["name"].split()[0]
+        unique.setdefault((kind, r["trees"], r["nodes"]), r)
+    reports = list(unique.values())
+    return sorted(mark_frontier(reports), key=lambda r: (-r["accuracy"], r["size_kb"]))
+
+
+def print_frontier(reports):
+    print(f"{'accuracy':>9} {'fidelity':>9} {'size KB':>9} {'latency µs':>11} {'rows/s':>9} {'nodes':>8}  model")
+    for r in reports:
+        mark = " *" if r["frontier"] else ""
+        print(f"{r['accuracy']:9.4f} {r['fidelity']:9.4f} {r['size_kb']:9.1f} {r['latency_us']:11.1f} {r['rows_per_s']:9d} "
+              f"{r['nodes']:8d}  {r['name']}{mark}")
+    print("* on the accuracy/size/latency frontier")
+
+
+def trained_on(model_path=MODEL_PATH):
+    """
+    The training_data entry of the version `model_path` belongs to (a stored version's file, or
+    the served model), or None for a model no version manifest describes
+    """
+    from model_versions import current_version
+
+    manifest_path = os.path.join(os.path.dirname(model_path), "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as fh:
+            manifest = json.load(fh)
+    elif os.path.exists(MODEL_PATH) and os.path.samefile(model_path, MODEL_PATH):
+        manifest = current_version()
+    else:
+        manifest = None
+    return (manifest or {}).get("training_data")
+
+
+def held_out_split(model_path=MODEL_PATH):
+    """
+    The training matrix split exactly as the model's full retrain split it: the same table
+    (OFRA store or --features store, from the version manifest), test size and seed, so the test
+    rows are unseen. Raises ValueError if that table has changed size since.
+    """
+    from sklearn.model_selection import train_test_split
+
+    from training_script import SPLIT_SEED, TEST_SIZE, build_training_matrix, load_training_table
+
+    data = trained_on(model_path)
+    if data is None:
+        print(f"No version manifest records what {model_path} was trained on; assuming the OFRA store")
+        data = {"features": None, "rows": None, "test_size": TEST_SIZE, "random_state": SPLIT_SEED}
+    X, y, _ = build_training_matrix(load_training_table(data["features"]))
+    if data["rows"] is not None and len(y) != data["rows"]:
+        raise ValueError(f"{data['features'] or 'The OFRA store'} has {len(y)} rows, but the model was trained on "
+                         f"{data['rows']}; its held-out rows cannot be recovered")
+    return train_test_split(X, y, test_size=data["test_size"], random_state=data["random_state"])
+
+
+def _depth(value):
+    return None if value in ("none", "full") else int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill or prune the fertilizer forest for on-device inference")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report = sub.add_parser("report", help="accuracy/size/latency of pruned and surrogate models vs the full forest")
+    report.add_argument("--trees", default=",".join(map(str, TREE_COUNTS)), help="comma-separated tree counts")
+    report.add_argument("--depths", default=",".join(str(d or "full") for d in DEPTHS))
+    report.add_argument("--surrogate-depths", default=",".join(str(d or "full") for d in SURROGATE_DEPTHS))
+    report.add_argument("--json", help="also write the reports to this path")
+    export = sub.add_parser("export", help="write one smaller model as a compact forest")
+    export.add_argument("--trees", type=int, help="keep the first N trees")
+    export.add_argument("--max-depth", type=_depth, help="cut trees at this depth")
+    export.add_argument("--surrogate", action="store_true", help="distill into a single tree instead")
+    export.add_argument("--out", default=DISTILLED_DIR)
+    for command in (report, export):
+        command.add_argument("--model", default=MODEL_PATH)
+    args = parser.parse_args()
+
+    import joblib
+
+    model = joblib.load(args.model)
+    X_train, X_test, y_train, y_test = held_out_split(args.model)
+
+    if args.command == "report":
+        reports = frontier_report(model, X_train, X_test, y_test,
+                                  [int(k) for k in args.trees.split(",")],
+                                  [_depth(d) for d in args.depths.split(",")],
+                                  [_depth(d) for d in args.surrogate_depths.split(",")], args.model)
+        print_frontier(reports)
+        if args.json:
+            with open(args.json, "w") as fh:
+                json.dump(reports, fh, indent=2)
+        return
+
+    full, meta = to_compact(model)
+    if args.surrogate:
+        forest, meta = to_compact(fit_surrogate(full, X_train, args.max_depth))
+    else:
+        forest, meta = prune(full, meta, args.trees, args.max_depth)
+    # save_forest swaps the new export in atomically, so a server mapping args.out is unaffected
+    save_forest({name: np.asarray(getattr(forest, name)) for name in ARRAYS}, meta, args.out)
+    accuracy = float(np.mean(forest.predict(X_test) == y_test))
+    print(f"✅ Wrote {meta['n_trees']} tree(s), {meta['n_nodes']} nodes, test accuracy {accuracy:.4f} to {args.out}")
+    print(f"Serve it with MODEL_FORMAT=compact FOREST_DIR={args.out}")
+
+
+if __name__ == "__main__":
+    main()
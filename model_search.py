@@ -0,0 +1,107 @@
+# model_search.py
+import itertools
+import json
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import StratifiedKFold, cross_val_score
+
+PARAM_GRID = {
+    "n_estimators": [100, 200, 400],
+    "max_depth": [None, 12, 24],
+    "min_samples_leaf": [1, 2, 5],
+}
+CV_FOLDS = 5
+RANDOM_STATE = 42
+
+_X = None
+_y = None
+
+
+def param_combinations(grid=PARAM_GRID):
+    """Every combination of the grid as a list of parameter dicts"""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def _init_worker(X, y):
+    # Ship the training data once per worker process instead of once per task
+    global _X, _y
+    _X, _y = X, y
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far, in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def evaluate_config(params, cv=CV_FOLDS, random_state=RANDOM_STATE):
+    """
+    Cross-validate one RandomForest configuration on the worker's data and time it.
+    Runs single-threaded: the parallelism comes from evaluating configurations side by side.
+    """
+    start = time.perf_counter()
+    clf = RandomForestClassifier(n_jobs=1, random_state=random_state, **params)
+    folds = StratifiedKFold(n_splits=cv, shuffle=True, random_state=random_state)
+    scores = cross_val_score(clf, _X, _y, cv=folds, n_jobs=1)
+    return {
+        "params": params,
+        "accuracy": float(scores.mean()),
+        "accuracy_std": float(scores.std()),
+        "wall_clock_s": round(time.perf_counter() - start, 3),
+        "peak_memory_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def search(X, y, grid=PARAM_GRID, cv=CV_FOLDS, max_workers=None):
+    """
+    Cross-validated grid search with one configuration per worker process.
+    Each worker handles a single configuration so its peak memory is that configuration's own.
+    Returns the per-configuration reports, best accuracy first.
+    """
+    configs = param_combinations(grid)
+    max_workers = max_workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(X, y),
+                             max_tasks_per_child=1) as pool:
+        reports = list(pool.map(evaluate_config, configs, itertools.repeat(cv)))
+    return sorted(reports, key=lambda r: (-r["accuracy"], r["wall_clock_s"]))
+
+
+def grow_with_early_stopping(X, y, params=None, step=25, max_estimators=1000, patience=2, tol=1e-3,
+                             n_jobs=-1, random_state=RANDOM_STATE):
+    """
+    Grow a forest `step` trees at a time with warm_start and stop once the out-of-bag accuracy
+    has not improved by more than `tol` for `patience` rounds. Returns the fitted model and the
+    (n_estimators, oob accuracy) history.
+    """
+    params = {k: v for k, v in (params or {}).items() if k != "n_estimators"}
+    clf = RandomForestClassifier(n_estimators=0, warm_start=True, oob_score=True, n_jobs=n_jobs,
+                                 random_state=random_state, **params)
+    history = []
+    best, stale = -np.inf, 0
+    while clf.n_estimators < max_estimators:
+        clf.n_estimators += step
+        clf.fit(X, y)
+        history.append((clf.n_estimators, float(clf.oob_score_)))
+        if clf.oob_score_ > best + tol:
+            best, stale = clf.oob_score_, 0
+        else:
+            stale += 1
+            if stale >= patience:
+                break
+    return clf, history
+
+
+def print_report(reports):
+    print(f"{'accuracy':>9} {'± std':>7} {'time (s)':>9} {'peak MB':>8}  params")
+    for r in reports:
+        print(f"{r['accuracy']:9.4f} {r['accuracy_std']:7.4f} {r['wall_clock_s']:9.2f} {r['peak_memory_mb']:8.1f}  {r['params']}")
+
+
+def save_report(reports, path):
+    with open(path, "w") as fh:
+        json.dump(reports, fh, indent=2)
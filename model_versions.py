@@ -0,0 +1,127 @@
+# model_versions.py
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+from farmer_log import START
+from preprocessing import PREPROCESSING_PATH
+
+MODEL_PATH = os.path.join("models", "fertilizer_model.joblib")
+FOREST_DIR = os.path.join("models", "forest")
+VERSIONS_DIR = os.path.join("models", "versions")
+CURRENT_PATH = os.path.join("models", "CURRENT")
+KEEP_VERSIONS = 10
+
+
+def _copy_atomic(src, dst):
+    shutil.copy2(src, dst + ".tmp")
+    os.replace(dst + ".tmp", dst)
+
+
+def register_version(model_path=MODEL_PATH, preprocessing_path=PREPROCESSING_PATH, **manifest):
+    """
+    Copy a trained model and its preprocessing into models/versions/<version>/ with a manifest
+    (parent version, farmer log cursor, rows added, ...). Returns the manifest.
+    """
+    now = datetime.now(timezone.utc)
+    version = now.strftime("%Y%m%dT%H%M%S%fZ")
+    version_dir = os.path.join(VERSIONS_DIR, version)
+    os.makedirs(version_dir)
+    shutil.copy2(model_path, os.path.join(version_dir, os.path.basename(MODEL_PATH)))
+    shutil.copy2(preprocessing_path, os.path.join(version_dir, os.path.basename(PREPROCESSING_PATH)))
+    manifest = {"version": version, "created_at": now.isoformat(timespec="seconds"), "cursor": START, **manifest}
+    with open(os.path.join(version_dir, "manifest.json"), "w") as fh:
+        json.dump(manifest, fh, indent=2)
+    return manifest
+
+
+def version_paths(version):
+    """(model path, preprocessing path) of a stored version"""
+    version_dir = os.path.join(VERSIONS_DIR, version)
+    return (os.path.join(version_dir, os.path.basename(MODEL_PATH)),
+            os.path.join(version_dir, os.path.basename(PREPROCESSING_PATH)))
+
+
+def list_versions():
+    """Manifests of every stored version, oldest first"""
+    if not os.path.isdir(VERSIONS_DIR):
+        return []
+    manifests = []
+    for version in sorted(os.listdir(VERSIONS_DIR)):
+        path = os.path.join(VERSIONS_DIR, version, "manifest.json")
+        if os.path.exists(path):
+            with open(path) as fh:
+                manifests.append(json.load(fh))
+    return manifests
+
+
+def current_version():
+    """Manifest of the version being served, or None before any has been published"""
+    if not os.path.exists(CURRENT_PATH):
+        return None
+    with open(CURRENT_PATH) as fh:
+        version = fh.read().strip()
+    with open(os.path.join(VERSIONS_DIR, version, "manifest.json")) as fh:
+        return json.load(fh)
+
+
+def publish(version):
+    """
+    Serve a stored version: swap its files into MODEL_PATH and PREPROCESSING_PATH atomically,
+    refresh the compact export if one is in use, then move the CURRENT pointer. The compact export
+    is written to a new directory and swapped in (forest_export.save_forest), so processes that
+    have the old one memory-mapped keep predicting with it unchanged. Servers pick the new model
+    up on their next start; the recommendation index notices the new fingerprint.
+    """
+    model_path, preprocessing_path = version_paths(version)
+    _copy_atomic(model_path, MODEL_PATH)
+    _copy_atomic(preprocessing_path, PREPROCESSING_PATH)
+    if os.path.isdir(FOREST_DIR):
+        import joblib
+
+        from forest_export import export_forest
+
+        export_forest(joblib.load(model_path), FOREST_DIR)
+    set_current(version)
+    prune_versions()
+
+
+def set_current(version):
+    """Point CURRENT at a version whose files are already the ones being served"""
+    with open(CURRENT_PATH + ".tmp", "w") as fh:
+        fh.write(version + "\n")
+    os.replace(CURRENT_PATH + ".tmp", CURRENT_PATH)
+
+
+def prune_versions(keep=KEEP_VERSIONS):
+    """Delete all but the newest `keep` versions, never the current one"""
+    current = current_version()
+    versions = [m["version"] for m in list_versions()]
+    for version in versions[:-keep]:
+        if current is None or version != current["version"]:
+            shutil.rmtree(os.path.join(VERSIONS_DIR, version))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List, publish and roll back versioned model artifacts")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="stored versions, oldest first")
+    publish_cmd = sub.add_parser("publish", help="serve a stored version (also how to roll back)")
+    publish_cmd.add_argument("version")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        current = current_version()
+        for manifest in list_versions():
+            mark = "*" if current and manifest["version"] == current["version"] else " "
+            print(f"{mark} {manifest['version']}  {manifest.get('mode', '?'):<11} trees={manifest.get('n_estimators')}"
+                  f" rows_added={manifest.get('rows_added', 0)} parent={manifest.get('parent')}")
+    else:
+        publish(args.version)
+        print(f"✅ Now serving version {args.version}")
+
+
+if __name__ == "__main__":
+    main()
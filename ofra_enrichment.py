@@ -0,0 +1,240 @@
+# ofra_enrichment.py
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from data_ingestion import CATEGORICAL_COLUMNS, DATA_PATH, NUMERICAL_COLUMNS, TARGET_COLUMN, feature_schema
+from cache_utils import grid_cell
+from soil_cache import GRID_RESOLUTION, soil_cell_key
+
+ENRICHED_PATH = os.path.join("data", "ofra_enriched.parquet")
+CHECKPOINT_PATH = os.path.join("data", "ofra_soil_checkpoint.jsonl")
+LAT_COLUMN = "latitude"
+LON_COLUMN = "longitude"
+SOIL_COLUMNS = ["texture"] + NUMERICAL_COLUMNS  # what the soil provider answers for a site
+
+# Threads only overlap network waits; the provider's token bucket (upstream.RATE_LIMITS) sets the pace
+WORKERS = int(os.getenv("ENRICHMENT_WORKERS", 16))
+# This many failed sites in a row means the provider is down or the daily quota is spent: stop and resume later
+MAX_CONSECUTIVE_FAILURES = 20
+PROGRESS_EVERY = 500
+
+
+def read_trials(csv_path=DATA_PATH, lat_column=LAT_COLUMN, lon_column=LON_COLUMN):
+    """
+    Read the OFRA trial rows with their site coordinates and whichever training columns the CSV has
+    (soil measurements are often missing from trial records; that is what enrichment fills in)
+    """
+    header = pd.read_csv(csv_path, nrows=0).columns
+    for col in (lat_column, lon_column, CATEGORICAL_COLUMNS[1], TARGET_COLUMN):
+        if col not in header:
+            print(f"{csv_path} has no '{col}' column")
+            return None
+    wanted = [lat_column, lon_column] + CATEGORICAL_COLUMNS + NUMERICAL_COLUMNS + [TARGET_COLUMN]
+    dtypes = {col: "float64" for col in (lat_column, lon_column)}
+    dtypes.update({col: "string" for col in CATEGORICAL_COLUMNS + [TARGET_COLUMN]})
+    dtypes.update({col: "float32" for col in NUMERICAL_COLUMNS})
+    usecols = [col for col in wanted if col in header]
+    trials = pd.read_csv(csv_path, usecols=usecols, dtype={col: dtypes[col] for col in usecols})
+    trials = trials.reindex(columns=wanted)
+    return trials.rename(columns={lat_column: LAT_COLUMN, lon_column: LON_COLUMN})
+
+
+def site_cells(trials, provider="isda", resolution=GRID_RESOLUTION):
+    """
+    Snap every trial to its soil raster pixel, keyed exactly as soil_cache keys it, so plots of
+    one site (and neighbouring sites in one pixel) cost a single lookup and share the serving
+    path's cache entries. Returns (cell key per row, {cell key: (lat, lon) of the pixel centre});
+    rows without coordinates get no key.
+    """
+    located = trials[LAT_COLUMN].notna() & trials[LON_COLUMN].notna()
+    coords = list(zip(trials.loc[located, LAT_COLUMN], trials.loc[located, LON_COLUMN]))
+    key_of, cells = {}, {}
+    for lat, lon in set(coords):  # plots of one site repeat its coordinates
+        key = key_of[lat, lon] = soil_cell_key(lat, lon, provider, resolution)
+        if key not in cells:
+            _, (cell_lat, cell_lon) = grid_cell(lat, lon, resolution)
+            cells[key] = (round(cell_lat, 6), round(cell_lon, 6))
+    keys = pd.Series(None, index=trials.index, dtype=object)
+    keys[located] = [key_of[point] for point in coords]
+    return keys, cells
+
+
+def load_checkpoint(path=CHECKPOINT_PATH):
+    """{cell key: soil properties} of every site fetched by earlier runs"""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path) as fh:
+        for line in fh:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # the last line of a run that was killed mid-write
+            if _valid(entry["soil"]):  # anything else (from before validation) is fetched again
+                done[entry["cell"]] = entry["soil"]
+    return done
+
+
+def _valid(soil):
+    return soil is not None and all(soil.get(col) is not None for col in SOIL_COLUMNS)
+
+
+def _quota_spent(provider):
+    from metrics import quota_usage
+
+    used, limit = quota_usage().get(provider, (0, 0))
+    return bool(limit) and used >= limit
+
+
+def fetch_sites(cells, fetch=None, checkpoint_path=CHECKPOINT_PATH, workers=WORKERS,
+                provider="isda", max_failures=MAX_CONSECUTIVE_FAILURES):
+    """
+    Fetch soil properties for every cell not in the checkpoint yet, `workers` at a time at BATCH
+    priority, appending each complete answer to the checkpoint as it arrives. Lookups that fail
+    or come back incomplete (clean_and_validate) count as failures and stay out of the
+    checkpoint, so a later run retries them. Stops early once `max_failures` sites in a row fail
+    or the provider's daily quota is used up; running again picks up where it stopped.
+    Returns ({cell key: soil properties}, number of cells still missing).
+    """
+    from fertilizer_prediction import clean_and_validate
+    from upstream import BATCH, priority
+
+    if fetch is None:
+        from fertilizer_prediction import fetch_soil_data as fetch
+
+    soil = load_checkpoint(checkpoint_path)
+    pending = [key for key in cells if key not in soil]
+    if len(pending) < len(cells):
+        print(f"Resuming: {len(cells) - len(pending)} of {len(cells)} sites already fetched")
+
+    stop = threading.Event()
+    state = {"fetched": 0, "failed": 0, "in_a_row": 0}
+
+    def task(key):
+        if stop.is_set():
+            return key, None
+        with priority(BATCH):  # farmers waiting on an answer go first
+            try:
+                soil_data = fetch(*cells[key])
+            except Exception as err:
+                print(f"Soil lookup for {key} failed: {err}")
+                return key, None
+        soil_data = clean_and_validate(soil_data) if soil_data is not None else None
+        return key, {col: soil_data[col] for col in SOIL_COLUMNS} if soil_data is not None else None
+
+    os.makedirs(os.path.dirname(checkpoint_path) or ".", exist_ok=True)
+    start = time.perf_counter()
+    with open(checkpoint_path, "a") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(task, key) for key in pending]
+        for future in as_completed(futures):
+            key, result = future.result()
+            if result is None:
+                if not stop.is_set():
+                    state["failed"] += 1
+                    state["in_a_row"] += 1
+                    if state["in_a_row"] >= max_failures:
+                        print(f"{max_failures} soil lookups in a row failed; stopping (run again to resume)")
+                        stop.set()
+                continue
+            soil[key] = result
+            out.write(json.dumps({"cell": key, "soil": result}) + "\n")
+            out.flush()  # a crash loses at most the lookups still in flight
+            state["fetched"] += 1
+            state["in_a_row"] = 0
+            if state["fetched"] % PROGRESS_EVERY == 0:
+                elapsed = time.perf_counter() - start
+                print(f"{state['fetched']}/{len(pending)} sites in {elapsed:.0f}s ({state['fetched'] / elapsed:.1f}/s)")
+            if not stop.is_set() and _quota_spent(provider):
+                print(f"Daily {provider} quota used up; stopping (run again tomorrow to resume)")
+                stop.set()
+
+    missing = len(cells) - sum(key in soil for key in cells)
+    return soil, missing
+
+
+def join_soil(trials, keys, soil, overwrite=False):
+    """
+    Fill each trial's soil columns from its cell's soil properties. Values measured at the trial
+    win unless `overwrite`, which takes the provider's for every row it has them for.
+    """
+    fetched = pd.DataFrame.from_dict({key: soil[key] for key in set(keys.dropna()) if key in soil}, orient="index")
+    fetched = fetched.reindex(columns=SOIL_COLUMNS)
+    fetched["texture"] = fetched["texture"].astype("string")
+    for col in NUMERICAL_COLUMNS:
+        fetched[col] = pd.to_numeric(fetched[col], errors="coerce").astype("float32")
+
+    provided = fetched.reindex(keys.to_numpy())
+    provided.index = trials.index
+    joined = trials.drop(columns=[LAT_COLUMN, LON_COLUMN])
+    for col in SOIL_COLUMNS:
+        joined[col] = provided[col].combine_first(joined[col]) if overwrite else joined[col].combine_first(provided[col])
+    return joined
+
+
+def write_training_table(joined, path=ENRICHED_PATH):
+    """
+    Write the joined rows as a Parquet feature store with the schema data_ingestion uses, so
+    `training_script.py --features` trains on it directly. Returns the number of complete rows.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = feature_schema()
+    frame = joined[schema.names].astype({col: "category" for col in CATEGORICAL_COLUMNS + [TARGET_COLUMN]})
+    table = pa.Table.from_pandas(frame, preserve_index=False).cast(schema)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pq.write_table(table, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return int(frame.notna().all(axis=1).sum())
+
+
+def enrich(csv_path=DATA_PATH, out_path=ENRICHED_PATH, checkpoint_path=CHECKPOINT_PATH, workers=WORKERS,
+           lat_column=LAT_COLUMN, lon_column=LON_COLUMN, overwrite=False):
+    """
+    Deduplicate the OFRA trial sites, fetch their soil properties and write the joined training
+    table. Returns a summary, or None if the CSV lacks the columns needed.
+    """
+    trials = read_trials(csv_path, lat_column, lon_column)
+    if trials is None:
+        return None
+    keys, cells = site_cells(trials)
+    start = time.perf_counter()
+    soil, missing = fetch_sites(cells, checkpoint_path=checkpoint_path, workers=workers)
+    elapsed = time.perf_counter() - start
+    complete = write_training_table(join_soil(trials, keys, soil, overwrite), out_path)
+    return {"rows": len(trials), "sites": len(cells), "sites_missing": missing,
+            "rows_complete": complete, "fetch_seconds": round(elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Join the OFRA trial sites with their soil properties for training")
+    parser.add_argument("--csv", default=DATA_PATH)
+    parser.add_argument("--out", default=ENRICHED_PATH)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--lat-column", default=LAT_COLUMN)
+    parser.add_argument("--lon-column", default=LON_COLUMN)
+    parser.add_argument("--overwrite", action="store_true",
+                        help="use the provider's soil values even where the trial measured its own")
+    parser.add_argument("--restart", action="store_true", help="discard the checkpoint and fetch every site again")
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    summary = enrich(args.csv, args.out, args.checkpoint, args.workers, args.lat_column, args.lon_column, args.overwrite)
+    if summary is None:
+        return
+    print(f"{summary['sites']} distinct sites for {summary['rows']} trial rows, fetched in {summary['fetch_seconds']}s")
+    if summary["sites_missing"]:
+        print(f"{summary['sites_missing']} sites still have no soil data; run again to resume")
+    print(f"✅ Wrote {summary['rows_complete']} complete training rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
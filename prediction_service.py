@@ -0,0 +1,192 @@
+# prediction_service.py
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from batch_prediction import ERROR_COLUMN, RESULT_COLUMN, recommend_batch, warm_up
+from metrics import PROFILE_REQUESTS, observe, profile_request, profile_summary, render_prometheus
+
+HOST = "127.0.0.1"
+PORT = 8000
+BATCH_WINDOW_MS = 5  # how long the first request in a batch waits for others to join it
+MAX_BATCH_ROWS = 1024
+REQUEST_TIMEOUT = 30
+
+
+class MicroBatcher:
+    """
+    Collect requests that arrive within a few milliseconds of each other and score them
+    with a single predict call on a background thread.
+    """
+
+    def __init__(self, artifacts, window_ms=BATCH_WINDOW_MS, max_rows=MAX_BATCH_ROWS):
+        self.artifacts = artifacts
+        self.window = window_ms / 1000
+        self.max_rows = max_rows
+        self.pending = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, records):
+        """
+        Queue a list of farmer records and return a Future for (their results, a per-stage
+        timing breakdown of the batch they were scored in)
+        """
+        future = Future()
+        self.pending.put((records, future, time.perf_counter()))
+        return future
+
+    def _collect(self):
+        batch = [self.pending.get()]
+        rows = len(batch[0][0])
+        deadline = time.monotonic() + self.window
+        while rows < self.max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            self._score(self._collect())
+
+    def _score(self, batch):
+        started = time.perf_counter()
+        records = [record for recs, _, _ in batch for record in recs]
+        try:
+            with profile_request() as spans:
+                result = recommend_batch(pd.DataFrame.from_records(records), self.artifacts)
+        except Exception as err:
+            if len(batch) == 1:
+                batch[0][1].set_exception(err)
+            else:
+                # Score the requests one by one so a bad one cannot fail the others batched with it
+                for item in batch:
+                    self._score([item])
+            return
+        profile = dict(profile_summary(spans), batch_rows=len(records))
+
+        outputs = result[[RESULT_COLUMN, ERROR_COLUMN]].astype(object)
+        outputs = outputs.where(outputs.notna(), None).to_dict(orient="records")
+        start = 0
+        for recs, future, queued in batch:
+            observe("stage_seconds", started - queued, stage="queue_wait")
+            timings = dict(profile, queue_wait=round((started - queued) * 1000, 2))
+            future.set_result((outputs[start:start + len(recs)], timings))
+            start += len(recs)
+
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # the socketserver default of 5 drops connections under bursts
+
+
+def make_handler(batcher):
+    class PredictionHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok"})
+            elif self.path == "/metrics":
+                payload = render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            else:
+                self._send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != "/recommend":
+                self._send_json(404, {"error": "Not found"})
+                return
+            profile = parse_qs(url.query).get("profile", ["1" if PROFILE_REQUESTS else "0"])[0] == "1"
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length))
+            except (ValueError, json.JSONDecodeError):
+                self._send_json(400, {"error": "Empty or invalid JSON in request"})
+                return
+
+            records = body if isinstance(body, list) else [body]
+            if not records or not all(isinstance(r, dict) for r in records):
+                self._send_json(400, {"error": "Expected a farmer record or a list of them"})
+                return
+            # Reject incomplete requests here so they cannot fail the rest of their batch
+            columns = batcher.artifacts["preprocessor"].columns
+            missing = [col for col in columns if any(col not in r for r in records)]
+            if missing:
+                self._send_json(400, {"error": f"Missing required fields: {', '.join(missing)}"})
+                return
+
+            try:
+                results, timings = batcher.submit(records).result(timeout=REQUEST_TIMEOUT)
+            except Exception as err:
+                self._send_json(500, {"error": f"Prediction failed: {err}"})
+                return
+            response = results if isinstance(body, list) else results[0]
+            if profile and isinstance(body, list):
+                response = {"results": results, "profile": timings}
+            elif profile:
+                response = dict(response, profile=timings)
+            self._send_json(200, response)
+
+        def log_message(self, format, *args):
+            pass  # keep the hot path free of per-request stderr writes
+
+    return PredictionHandler
+
+
+def serve(host=HOST, port=PORT, window_ms=BATCH_WINDOW_MS, max_rows=MAX_BATCH_ROWS):
+    """
+    Load and warm up the model once, then serve recommendations over HTTP until interrupted
+    """
+    artifacts = warm_up()
+    batcher = MicroBatcher(artifacts, window_ms, max_rows)
+    server = PredictionServer((host, port), make_handler(batcher))
+    print(f"🌱 Fertilizer recommendation service listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fertilizer recommendations over HTTP")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW_MS,
+                        help="how long to wait for concurrent requests to join a batch")
+    parser.add_argument("--max-batch-rows", type=int, default=MAX_BATCH_ROWS)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.batch_window_ms, args.max_batch_rows)
+
+
+if __name__ == "__main__":
+    main()
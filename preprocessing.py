@@ -0,0 +1,122 @@
+# preprocessing.py
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from metrics import span
+
+PREPROCESSING_PATH = os.path.join("models", "preprocessing.json")
+FORMAT_VERSION = 1
+FLOAT32_MAX = float(np.finfo(np.float32).max)
+
+
+def build_preprocessing(categories, numerical_columns, offset, scale, target_classes):
+    """
+    Describe every preprocessing step training applied, as plain data.
+    categories maps each categorical column (in feature order) to its sorted categories; codes are
+    positions in that list and any unseen value gets the extra code len(categories).
+    Numbers are scaled as (x - offset) / scale.
+    """
+    artifact = {
+        "format_version": FORMAT_VERSION,
+        "categorical": [
+            {"name": col, "categories": [str(c) for c in cats], "unknown_code": len(cats)}
+            for col, cats in categories.items()
+        ],
+        "numerical": [
+            {"name": col, "offset": float(o), "scale": float(s)}
+            for col, o, s in zip(numerical_columns, offset, scale)
+        ],
+        "target_classes": [str(c) for c in target_classes],
+    }
+    content = json.dumps(artifact, sort_keys=True).encode()
+    artifact["version"] = hashlib.sha256(content).hexdigest()[:12]
+    artifact["created_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    return artifact
+
+
+def save_preprocessing(artifact, path=PREPROCESSING_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as fh:
+        json.dump(artifact, fh, indent=2)
+
+
+def load_preprocessing(path=PREPROCESSING_PATH):
+    with open(path) as fh:
+        artifact = json.load(fh)
+    if artifact.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported preprocessing format version {artifact.get('format_version')}")
+    return Preprocessor(artifact)
+
+
+class Preprocessor:
+    """
+    Applies a saved preprocessing artifact to whole batches with array operations:
+    hash-table category lookups with an explicit unknown bucket, then float32 scaling.
+    """
+
+    def __init__(self, artifact):
+        self.artifact = artifact
+        self.version = artifact["version"]
+        self.categorical_columns = [c["name"] for c in artifact["categorical"]]
+        self.numerical_columns = [n["name"] for n in artifact["numerical"]]
+        self.columns = self.categorical_columns + self.numerical_columns
+        self.categories = {c["name"]: c["categories"] for c in artifact["categorical"]}
+        self._lookup = {name: pd.Index(cats) for name, cats in self.categories.items()}
+        self.offset = np.array([n["offset"] for n in artifact["numerical"]], dtype=np.float32)
+        self.scale = np.array([n["scale"] for n in artifact["numerical"]], dtype=np.float32)
+        self.target_classes = np.asarray(artifact["target_classes"], dtype=object)
+
+    def encode(self, frame):
+        """
+        Category codes for every categorical column, shape (rows, columns), and a mask of rows
+        that hit the unknown bucket in any column
+        """
+        codes = np.empty((len(frame), len(self.categorical_columns)), dtype=np.int32)
+        unknown = np.zeros(len(frame), dtype=bool)
+        for i, col in enumerate(self.categorical_columns):
+            values = pd.Series(frame[col], copy=False).astype(str)
+            column = self._lookup[col].get_indexer(values)
+            missing = column < 0
+            column[missing] = len(self.categories[col])
+            codes[:, i] = column
+            unknown |= missing
+        return codes, unknown
+
+    def scale_numeric(self, values, out=None):
+        """Scale a (rows, numerical columns) array exactly the way training did, in float32"""
+        out = np.array(values, dtype=np.float32) if out is None else out
+        out -= self.offset
+        out /= self.scale
+        return out
+
+    def transform(self, frame):
+        """
+        Build the model's float32 feature matrix from a DataFrame (or dict of columns).
+        Returns the matrix, a mask of rows with an unknown category and a mask of rows with
+        missing, non-numeric or non-finite values (inf, or beyond float32's range), which the
+        model cannot score.
+        """
+        n_cat = len(self.categorical_columns)
+        X = np.empty((len(frame), len(self.columns)), dtype=np.float32)
+        with span("encode"):
+            codes, unknown = self.encode(frame)
+            X[:, :n_cat] = codes
+        with span("scale"):
+            invalid = np.zeros(len(frame), dtype=bool)
+            with np.errstate(over="ignore", invalid="ignore"):
+                for i, col in enumerate(self.numerical_columns):
+                    values = pd.to_numeric(pd.Series(frame[col], copy=False), errors="coerce").to_numpy(dtype=np.float64)
+                    invalid |= ~(np.abs(values) <= FLOAT32_MAX)  # NaN, inf and float32 overflow alike
+                    X[:, n_cat + i] = values
+                self.scale_numeric(X[:, n_cat:], out=X[:, n_cat:])
+                invalid |= ~np.isfinite(X[:, n_cat:]).all(axis=1)  # scaling can still overflow
+        return X, unknown, invalid
+
+    def decode_target(self, codes):
+        """Map predicted class codes back to fertilizer names"""
+        return self.target_classes[np.asarray(codes, dtype=np.int64)]
@@ -1,43 +1,13 @@
 import os
 from dotenv import load_dotenv, dotenv_values
 from datetime import datetime, timedelta
-import requests
 import json
+from rainfall_forecast import get_rainfall_forecasts
+from rainfall_engine import analyze_matrix, rainfall_matrix, render_report
+from rainfall_scheduler import get_advice
 
 load_dotenv()
 
-def get_coordinates(location):
-    """
-    Convert County and Sub-county(will add ward for more precisions) to GPS coordinates using OpenCage API.
-    This is because the NASA
-    """
-
-    OPENCAGE_API = os.getenv('OPENCAGE_API_KEY')
-
-    url = "https://api.opencagedata.com/geocode/v1/json"
-    payload = {'q': location, 'key': OPENCAGE_API, 'countrycode': 'ke'}
-    
-    try:
-        r = requests.get(url, params=payload)
-        r.raise_for_status()
-    except requests.exceptions.HTTPError as e:
-        print(e.response.text)
-    except requests.exceptions.ConnectionError as er:
-        print(er.response.text)
-    except requests.exceptions.Timeout as eg:
-        print(eg.response.text)
-    except requests.exceptions.RequestException as err:
-        print(err.response.text)
-        
-    data = r.json() # only proceeds to here if the request is succesful thanks to the raise-for-status function
-    if data['results']:
-        lat = data['results'][0]['geometry']['lat']
-        lon = data['results'][0]['geometry']['lng']
-        return lat, lon
-    else:
-        return None, None
-
-
 def get_rainfall_forecast(lat, lon):
     """
     Fetch rainfall data from Open-Meteo
@@ -46,33 +16,9 @@ def get_rainfall_forecast(lat, lon):
     # Testing the forecast now according to mmy current location. Need to determine how accurate the 7-day forecast is, and whether its better to use the 3-day forecast instead. 
     # Also, should be once in three days then another call once the three(or 7) elapses.
 
-    # Gets the rainfall forecast for the past 5 days, and the next 10 days
-    url = "https://api.open-meteo.com/v1/forecast"
-    payload = { 'latitude': lat, 'longitude': lon, 'daily': 'precipitation_sum', 'timezone': 'Africa/Nairobi', 'forecast_days': 10, 'past_days': 5 } # data is returned in localtime starting at 00.00 local time
-
-    try:
-        r = requests.get(url, params=payload)
-        r.raise_for_status()
-    except requests.exceptions.HTTPError as e:
-        print(e.response.text)
-    except requests.exceptions.ConnectionError as er:
-        print(er.response.text)
-    except requests.exceptions.Timeout as eg:
-        print(eg.response.text)
-    except requests.exceptions.RequestException as err:
-        print(err.response.text)
-    
-    data = r.json()
-
-    if "daily" in data and "precipitation_sum" in data["daily"]:
-        dates = data["daily"]["time"]
-        rainfall = data["daily"]["precipitation_sum"]
-
-        forecast = [{ "date": dates[i], "rainfall_mm": rainfall[i] } for i in range(len(dates))]
-        print(forecast)
-        return forecast
-
-    return None
+    # Gets the rainfall forecast for the past 5 days, and the next 10 days. Forecasts are cached per grid cell until
+    # the next model update, so repeat runs in the same area do not use up the daily quota.
+    return get_rainfall_forecasts([(lat, lon)])[0]
 
 
 def analyze_rainfall(forecast):
@@ -91,43 +37,19 @@ def analyze_rainfall(forecast):
     if not forecast:
         return "No rainfall data available. Cannot provide advice."
 
-    past_rain = sum(f["rainfall_mm"] for f in forecast[:5])  # Last 5 days total forecast is a list/array of dicts. Len of forecast is 15
-    last_3_days_rain = sum(f["rainfall_mm"] for f in forecast[:3])  # Last 3 days total
-    first_10_days_rain = sum(forecast[i]["rainfall_mm"] for i in range(5, len(forecast)))  # Next 10 days
-
-    report = f"📅 **Past 5 Days Rainfall:** {past_rain:.1f}mm\n"
-    report += f"📅 **Last 3 Days Rainfall:** {last_3_days_rain:.1f}mm\n"
-    report += f"🌧 **Next 10 Days Expected:** {first_10_days_rain:.1f}mm\n"
-
-    # 🌱 **Planting Conditions**
-    if past_rain < 23:
-        report += "\n⚠️ Too little rainfall in the past five days. Soil moisture might be too low. Wait for rains before planting"
-    elif past_rain > 80:
-        report += "\n⛔ Excessive rainfall in the past five days. Soil is likely waterlogged, and your seeds could rot and fail to germinate. Wait 2-3 dry days for the soil to drain before planting"
-    elif first_10_days_rain < 20:
-        report += "\n⚠️ Insufficient rainfall is expected in the next 10 days. Planting now may lead to poor germination, weak seedlings, and stunted root development. Consider waiting for more rainfall before planting"
-    elif first_10_days_rain > 100:
-        report += "\n⛔ Excessive rainfall expected in the next 10 days. This could drown your seeds, lead to poor germination, and wash away nutrients your crops need to thrive. Wait for at least 2-3 days after the rain subsides for the soil to dry out before planting."
-    elif past_rain > 80 and first_10_days_rain > 100:
-        report += "\n⛔ Both past and forecasted rainfall are excessive. This increases the risk of waterlogging, seed rot, and stunted growth. Wait for 2-3 dry days for the soil to drain before planting."
-    elif past_rain > 80 and first_10_days_rain < 20:
-        report += "\n⚠️ Excessive past rainfall followed by low expected rainfall can cause waterlogged soil now and drought stress later. Wait for the soil to drain and more rainfall to ensure proper moisture levels."
-    else:
-        report += "\n✅ **Ideal conditions! You can plant now. Past and forecasted rainfall are favorable for healthy seed germination and growth. Ensure soil is well-prepared and monitor weather for any changes. 🌱"
-
-    return report
+    # The window sums and planting rules live in rainfall_engine, which scores many locations at once
+    result = analyze_matrix(rainfall_matrix([forecast]))
+    return render_report(result, 0)
 
 
     
 
 def main():
     location = input("Enter your County and Sub-county(e.g., Nakuru, Bahati): ")
-    lat, lon = get_coordinates(location)
-    
-    if lat and lon:
-        forecast = get_rainfall_forecast(lat, lon)
-        advice = analyze_rainfall(forecast)
+    # Registers the farmer and reads the per-cell advice the rainfall scheduler keeps fresh
+    advice = get_advice(location)
 
+    if advice is not None:
         print(f"\n🌱 **Planting Advice for {location}:**\n")
         print(advice)
     else:
@@ -0,0 +1,341 @@
+# rainfall_climatology.py
+import argparse
+import json
+import os
+import warnings
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+
+from rainfall_engine import PAST_DAYS, POST_SOWING_DAYS, rolling_totals
+from rainfall_forecast import TIMEZONE, UTC_OFFSET_HOURS, forecast_cell
+
+CLIMATOLOGY_DIR = os.getenv("RAINFALL_CLIMATOLOGY_DIR", os.path.join("data", "rainfall_climatology"))
+OPEN_METEO_ARCHIVE_URL = os.getenv("OPEN_METEO_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive")
+FORMAT_VERSION = 1
+DAYS_PER_YEAR = 365  # Feb 29 is dropped so every year lines up day for day
+PERCENTILES = (20, 50, 80)  # a dry year, a normal year and a wet year
+ARCHIVE_LOCATIONS_PER_REQUEST = 10  # multi-year archives are large; keep responses manageable
+
+# Onset of rains: the first day of a 3-day spell with at least ONSET_RAIN_MM that is not followed
+# by a dry spell of DRY_SPELL_DAYS days (< DRY_DAY_MM each) within the next ONSET_CHECK_DAYS.
+ONSET_RAIN_MM = 20
+DRY_DAY_MM = 1
+DRY_SPELL_DAYS = 7
+ONSET_CHECK_DAYS = 30
+# Onset search windows (first and last day-of-year, 0-based, no leap day) of Kenya's two seasons
+SEASONS = {"long_rains": (59, 150), "short_rains": (273, 364)}  # 1 Mar - 31 May, 1 Oct - 31 Dec
+
+# Forecast days 1-3 are taken as they are; days 4-10 are blended with the climatological mean,
+# since forecasts that far out are doubtful, and the rest of the 5 weeks is climatology alone.
+TRUSTED_FORECAST_DAYS = 3
+FORECAST_WEIGHT = 0.5
+POST_SOWING_DRY_MM = 105  # about 3 mm a day over the first 5 weeks
+
+
+def day_of_year(day):
+    """0-based day of a 365-day year; Feb 29 shares Feb 28's slot"""
+    doy = day.timetuple().tm_yday - 1
+    leap = day.year % 4 == 0 and (day.year % 100 != 0 or day.year % 400 == 0)
+    return doy - 1 if leap and doy >= 59 else doy
+
+
+def to_year_cube(rain, start_date):
+    """
+    Cut a (cells x days) daily series starting at start_date down to whole calendar years without
+    leap days. Returns (cells x years x 365) and the first year.
+    """
+    days = [start_date + timedelta(days=i) for i in range(rain.shape[1])]
+    first_year = start_date.year if (start_date.month, start_date.day) == (1, 1) else start_date.year + 1
+    keep = [i for i, d in enumerate(days) if d.year >= first_year and (d.month, d.day) != (2, 29)]
+    keep = keep[:len(keep) // DAYS_PER_YEAR * DAYS_PER_YEAR]
+    if not keep:
+        raise ValueError("Need at least one whole calendar year of daily rainfall")
+    return rain[:, keep].reshape(rain.shape[0], -1, DAYS_PER_YEAR), first_year
+
+
+def _nan_reduce(func, array, *args, **kwargs):
+    # All-gap slices are expected (cells outside the archive, seasons the rains never came) and come back NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return func(array, *args, **kwargs)
+
+
+def percentiles_over_years(values):
+    """
+    PERCENTILES of a (cells x years x ...) array across years, ignoring NaN, as
+    (cells x ... x len(PERCENTILES)). Same linear interpolation as np.nanpercentile, but one sort
+    for every slice at once instead of a Python-level loop over the slices that contain NaN.
+    """
+    ordered = np.sort(values, axis=1)  # NaN sorts last
+    valid = (~np.isnan(ordered)).sum(axis=1, keepdims=True)
+    result = []
+    for q in PERCENTILES:
+        pos = np.maximum(valid - 1, 0) * (q / 100)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, np.maximum(valid - 1, 0))
+        low = np.take_along_axis(ordered, lo, axis=1)
+        high = np.take_along_axis(ordered, hi, axis=1)
+        result.append(np.where(valid > 0, low + (high - low) * (pos - lo), np.nan)[:, 0])
+    return np.stack(result, axis=-1)
+
+
+def _windows(series, window):
+    """rolling_totals padded with NaN at the end so column j is always the window starting at day j"""
+    totals = np.full(series.shape, np.nan)
+    totals[:, :series.shape[1] - window + 1] = rolling_totals(series, window)
+    return totals
+
+
+def post_sowing_percentiles(cube, days=POST_SOWING_DAYS):
+    """
+    Percentiles across years of the rainfall in the `days` days after sowing on each day of the
+    year, for every cell at once. Returns (cells x 365 x len(PERCENTILES)).
+    """
+    cells, years, _ = cube.shape
+    series = cube.reshape(cells, years * DAYS_PER_YEAR)
+    totals = _windows(series, days)
+    totals[_windows(np.isnan(series).astype(np.float64), days) > 0] = np.nan  # a gap spoils the whole window
+    totals = totals.reshape(cells, years, DAYS_PER_YEAR)
+    return percentiles_over_years(totals).astype(np.float32)
+
+
+def onset_days(cube):
+    """
+    Onset-of-rains day of year for every cell, year and season, -1 where the rains never
+    properly started inside the season's search window. Returns (cells x years x seasons) int16.
+    """
+    cells, years, _ = cube.shape
+    series = np.nan_to_num(cube.reshape(cells, years * DAYS_PER_YEAR))
+    n = series.shape[1]
+
+    wet_start = _windows(series, 3) >= ONSET_RAIN_MM
+    spell_start = np.zeros(series.shape)
+    spell_start[:, :n - DRY_SPELL_DAYS + 1] = rolling_totals((series < DRY_DAY_MM).astype(np.float64), DRY_SPELL_DAYS) == DRY_SPELL_DAYS
+    # A dry spell that starts after the 3 wet days and ends inside the check window
+    reach = ONSET_CHECK_DAYS - 3 - DRY_SPELL_DAYS + 1
+    spells_ahead = np.ones(series.shape, dtype=bool)  # unknown near the end of the record counts as failed
+    ahead = rolling_totals(spell_start[:, 3:], reach) > 0
+    spells_ahead[:, :ahead.shape[1]] = ahead
+    onset_ok = (wet_start & ~spells_ahead).reshape(cells, years, DAYS_PER_YEAR)
+
+    result = np.full((cells, years, len(SEASONS)), -1, dtype=np.int16)
+    for s, (first, last) in enumerate(SEASONS.values()):
+        window = onset_ok[:, :, first:last + 1]
+        found = window.any(axis=2)
+        result[:, :, s] = np.where(found, first + window.argmax(axis=2), -1)
+    return result
+
+
+def build_climatology(rain, start_date, points, out_dir=CLIMATOLOGY_DIR):
+    """
+    Store a multi-year daily rainfall archive (cells x days, mm, NaN for gaps) for the forecast
+    grid cells containing `points`, together with the products the advice needs, all as
+    memory-mappable .npy files: rainfall in 0.1 mm int16, the mean rainfall of each day of the
+    year, post-sowing rainfall percentiles and onset dates per year and season.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rain = np.asarray(rain, dtype=np.float64)
+    cube, first_year = to_year_cube(rain, start_date)
+
+    stored = np.where(np.isnan(cube), -1, np.round(cube * 10)).astype(np.int16)
+    onset = onset_days(cube)
+    arrays = {
+        "rain": stored,
+        "daily_mean": np.nan_to_num(_nan_reduce(np.nanmean, cube, axis=1)).astype(np.float32),
+        "post_sowing": post_sowing_percentiles(cube),
+        "onset": onset,
+        "onset_percentiles": percentiles_over_years(np.where(onset >= 0, onset, np.nan)).astype(np.float32),
+        "onset_share": (onset >= 0).mean(axis=1).astype(np.float32),  # share of years the rains started
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), array)
+
+    meta = {
+        "format_version": FORMAT_VERSION, "first_year": first_year, "years": cube.shape[1],
+        "cells": [forecast_cell(lat, lon)[0] for lat, lon in points], "points": [list(p) for p in points],
+        "seasons": list(SEASONS), "percentiles": list(PERCENTILES), "post_sowing_days": POST_SOWING_DAYS,
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w") as fh:
+        json.dump(meta, fh)
+    return meta
+
+
+class Climatology:
+    """Memory-mapped climatology products, looked up by forecast grid cell key"""
+
+    def __init__(self, climatology_dir=CLIMATOLOGY_DIR):
+        with open(os.path.join(climatology_dir, "meta.json")) as fh:
+            meta = json.load(fh)
+        if meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported climatology format version {meta['format_version']}")
+        self.meta = meta
+        self.rows = {cell: i for i, cell in enumerate(meta["cells"])}
+        for name in ("daily_mean", "post_sowing", "onset_percentiles", "onset_share"):
+            setattr(self, name, np.load(os.path.join(climatology_dir, f"{name}.npy"), mmap_mode="r"))
+
+    def outlook(self, cells, rain, today):
+        """
+        Blend the live forecast with climatology for many cells at once. `rain` is the
+        (cells x days) forecast matrix the rainfall engine scores (PAST_DAYS observed days, then
+        the forecast) and `today` the local date of its first forecast day. Returns a dict of
+        per-cell arrays; cells outside the store have known=False.
+        """
+        rows = np.array([self.rows.get(cell, -1) for cell in cells])
+        known = rows >= 0
+        rows = np.where(known, rows, 0)
+        doy = day_of_year(today)
+        days = (doy + np.arange(POST_SOWING_DAYS)) % DAYS_PER_YEAR
+        clim = np.asarray(self.daily_mean)[rows][:, days].astype(np.float64)
+
+        ahead = np.asarray(rain, dtype=np.float64)[:, PAST_DAYS:PAST_DAYS + POST_SOWING_DAYS]
+        forecast = np.full(clim.shape, np.nan)
+        forecast[:, :ahead.shape[1]] = ahead
+        weight = np.zeros(POST_SOWING_DAYS)
+        weight[:TRUSTED_FORECAST_DAYS] = 1.0
+        weight[TRUSTED_FORECAST_DAYS:ahead.shape[1]] = FORECAST_WEIGHT
+        weight = np.where(np.isnan(forecast), 0.0, weight)
+        expected = (weight * np.nan_to_num(forecast) + (1 - weight) * clim).sum(axis=1)
+
+        percentiles = np.asarray(self.post_sowing)[rows, doy]  # cells x (dry, normal, wet year)
+        season = next((s for s, (_, last) in enumerate(SEASONS.values()) if doy <= last), 0)
+        return {
+            "known": known,
+            "expected": expected,
+            "percentiles": percentiles,
+            "season": season,
+            "onset": np.asarray(self.onset_percentiles)[rows, season],
+            "onset_share": np.asarray(self.onset_share)[rows, season],
+        }
+
+
+_climatology = None
+
+
+def get_climatology():
+    """The climatology store, loaded once per process; None if it has not been built"""
+    global _climatology
+    if _climatology is None:
+        _climatology = False
+        if os.path.exists(os.path.join(CLIMATOLOGY_DIR, "meta.json")):
+            _climatology = Climatology(CLIMATOLOGY_DIR)
+    return _climatology or None
+
+
+def _date_of(doy, year):
+    return date(year, 1, 1) + timedelta(days=int(round(doy)))
+
+
+def render_outlook(outlook, i, today):
+    """The farmer-facing season outlook for cell i, or "" when there is no climatology for it"""
+    if not outlook["known"][i]:
+        return ""
+    dry, normal, wet = outlook["percentiles"][i]
+    expected = outlook["expected"][i]
+    text = f"📊 **Next 5 Weeks (forecast + past years):** about {expected:.0f}mm expected"
+    if not np.isnan(normal):
+        text += f" (a dry year brings {dry:.0f}mm, a normal year {normal:.0f}mm, a wet year {wet:.0f}mm)"
+    text += "\n"
+
+    early, typical, late = outlook["onset"][i]
+    season = list(SEASONS)[outlook["season"]].replace("_", " ")
+    if not np.isnan(typical):
+        share = outlook["onset_share"][i]
+        text += (f"🌦 **Onset of the {season}:** usually around {_date_of(typical, today.year):%d %b}, "
+                 f"between {_date_of(early, today.year):%d %b} and {_date_of(late, today.year):%d %b} "
+                 f"in most years (the rains properly started in {share:.0%} of past years)\n")
+
+    if expected < POST_SOWING_DRY_MM:
+        text += ("⚠️ The first 5 weeks after sowing look too dry for maize. Unless you can irrigate, "
+                 "wait for the rains to become established before planting.\n")
+    return text
+
+
+def local_today(now=None):
+    now = datetime.now(timezone.utc).timestamp() if now is None else now
+    return datetime.fromtimestamp(now, timezone(timedelta(hours=UTC_OFFSET_HOURS))).date()
+
+
+def read_csv_archive(path):
+    """
+    Daily rainfall in long format (lat, lon, date, rainfall_mm), e.g. point extracts of CHIRPS.
+    Returns (rain matrix, start date, points).
+    """
+    import pandas as pd
+
+    frame = pd.read_csv(path, parse_dates=["date"])
+    table = frame.pivot_table(index=["lat", "lon"], columns="date", values="rainfall_mm", aggfunc="mean")
+    table = table.reindex(columns=pd.date_range(table.columns.min(), table.columns.max(), freq="D"))
+    return table.to_numpy(dtype=np.float64), table.columns[0].date(), list(table.index)
+
+
+def fetch_archive(points, start, end):
+    """
+    Download daily rainfall for many points from the Open-Meteo historical archive, at batch
+    priority. Returns a (points x days) matrix with NaN where the archive has no data.
+    """
+    from http_utils import get_json
+    from upstream import BATCH, priority
+
+    days = (end - start).days + 1
+    rain = np.full((len(points), days), np.nan)
+    with priority(BATCH):
+        for chunk_start in range(0, len(points), ARCHIVE_LOCATIONS_PER_REQUEST):
+            chunk = points[chunk_start:chunk_start + ARCHIVE_LOCATIONS_PER_REQUEST]
+            payload = {
+                "latitude": ",".join(str(lat) for lat, _ in chunk),
+                "longitude": ",".join(str(lon) for _, lon in chunk),
+                "start_date": start.isoformat(), "end_date": end.isoformat(),
+                "daily": "precipitation_sum", "timezone": TIMEZONE,
+            }
+            data = get_json("open-meteo", OPEN_METEO_ARCHIVE_URL, payload)
+            if data is None:
+                continue
+            for i, result in enumerate(data if isinstance(data, list) else [data]):
+                values = result.get("daily", {}).get("precipitation_sum", [])[:days]
+                rain[chunk_start + i, :len(values)] = [np.nan if v is None else v for v in values]
+    return rain
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-year rainfall climatology per forecast grid cell")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="build the store from a long-format CSV (lat, lon, date, rainfall_mm)")
+    imp.add_argument("path")
+    fetch = sub.add_parser("fetch", help="build the store from the Open-Meteo archive for the scheduled cells")
+    fetch.add_argument("--start", default="2005-01-01")
+    fetch.add_argument("--end", default=f"{date.today().year - 1}-12-31")
+    outlook = sub.add_parser("outlook", help="print the blended outlook for a point")
+    outlook.add_argument("lat", type=float)
+    outlook.add_argument("lon", type=float)
+    args = parser.parse_args()
+
+    if args.command == "import":
+        rain, start, points = read_csv_archive(args.path)
+        meta = build_climatology(rain, start, points)
+    elif args.command == "fetch":
+        from rainfall_scheduler import get_store
+
+        points = [(lat, lon) for _, lat, lon in get_store().due_cells(0, force=True)]
+        start, end = date.fromisoformat(args.start), date.fromisoformat(args.end)
+        meta = build_climatology(fetch_archive(points, start, end), start, points)
+    else:
+        from rainfall_engine import rainfall_matrix
+        from rainfall_forecast import get_rainfall_forecasts
+
+        climatology = get_climatology()
+        if climatology is None:
+            print(f"No climatology in {CLIMATOLOGY_DIR}; run `import` or `fetch` first")
+            return
+        today = local_today()
+        cell, _ = forecast_cell(args.lat, args.lon)
+        rain = rainfall_matrix(get_rainfall_forecasts([(args.lat, args.lon)]))
+        if rain.shape[1] == 0:
+            rain = np.full((1, PAST_DAYS), np.nan)  # no forecast: climatology alone
+        print(render_outlook(climatology.outlook([cell], rain, today), 0, today) or "No climatology for this point")
+        return
+    print(f"✅ Stored {meta['years']} years of rainfall for {len(meta['cells'])} cells in {CLIMATOLOGY_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# rainfall_engine.py
+import numpy as np
+
+from metrics import span
+
+PAST_DAYS = 5
+POST_SOWING_DAYS = 35  # the critical first 5 weeks after sowing
+
+# Planting thresholds, see the notes in analyze_rainfall()
+PAST_DRY_MM = 23
+PAST_WET_MM = 80
+AHEAD_DRY_MM = 20
+AHEAD_WET_MM = 100
+
+# Advice codes, kept as small ints so whole grids of advice fit in a uint8 array
+IDEAL = 0
+PAST_TOO_DRY = 1
+PAST_TOO_WET = 2
+AHEAD_TOO_DRY = 3
+AHEAD_TOO_WET = 4
+BOTH_TOO_WET = 5
+WET_THEN_DRY = 6
+NO_DATA = 7
+
+ADVICE_TEXT = {
+    IDEAL: "✅ **Ideal conditions! You can plant now. Past and forecasted rainfall are favorable for healthy seed germination and growth. Ensure soil is well-prepared and monitor weather for any changes. 🌱",
+    PAST_TOO_DRY: "⚠️ Too little rainfall in the past five days. Soil moisture might be too low. Wait for rains before planting",
+    PAST_TOO_WET: "⛔ Excessive rainfall in the past five days. Soil is likely waterlogged, and your seeds could rot and fail to germinate. Wait 2-3 dry days for the soil to drain before planting",
+    AHEAD_TOO_DRY: "⚠️ Insufficient rainfall is expected in the next 10 days. Planting now may lead to poor germination, weak seedlings, and stunted root development. Consider waiting for more rainfall before planting",
+    AHEAD_TOO_WET: "⛔ Excessive rainfall expected in the next 10 days. This could drown your seeds, lead to poor germination, and wash away nutrients your crops need to thrive. Wait for at least 2-3 days after the rain subsides for the soil to dry out before planting.",
+    BOTH_TOO_WET: "⛔ Both past and forecasted rainfall are excessive. This increases the risk of waterlogging, seed rot, and stunted growth. Wait for 2-3 dry days for the soil to drain before planting.",
+    WET_THEN_DRY: "⚠️ Excessive past rainfall followed by low expected rainfall can cause waterlogged soil now and drought stress later. Wait for the soil to drain and more rainfall to ensure proper moisture levels.",
+    NO_DATA: "No rainfall data available. Cannot provide advice.",
+}
+
+
+def rainfall_matrix(forecasts):
+    """
+    Stack forecasts (lists of {"date", "rainfall_mm"} dicts) into a (locations x days) float32 matrix.
+    Missing forecasts and missing days become NaN.
+    """
+    days = max((len(f) for f in forecasts if f), default=0)
+    rain = np.full((len(forecasts), days), np.nan, dtype=np.float32)
+    for i, forecast in enumerate(forecasts):
+        if forecast:
+            rain[i, :len(forecast)] = [np.nan if f["rainfall_mm"] is None else f["rainfall_mm"] for f in forecast]
+    return rain
+
+
+def rolling_totals(rain, window):
+    """
+    Total rainfall of every `window`-day run for every location at once.
+    Returns a (locations x days - window + 1) matrix; column j is the total of days j..j+window-1.
+    """
+    rain = np.nan_to_num(np.asarray(rain, dtype=np.float64))
+    if rain.shape[1] < window:
+        return np.empty((rain.shape[0], 0))
+    csum = np.zeros((rain.shape[0], rain.shape[1] + 1))
+    np.cumsum(rain, axis=1, out=csum[:, 1:])
+    return csum[:, window:] - csum[:, :-window]
+
+
+def classify(past_rain, ahead_rain):
+    """
+    Map past and expected rainfall totals to advice codes for every location,
+    checking the conditions in the same order as analyze_rainfall()
+    """
+    conditions = [
+        past_rain < PAST_DRY_MM,
+        past_rain > PAST_WET_MM,
+        ahead_rain < AHEAD_DRY_MM,
+        ahead_rain > AHEAD_WET_MM,
+        (past_rain > PAST_WET_MM) & (ahead_rain > AHEAD_WET_MM),
+        (past_rain > PAST_WET_MM) & (ahead_rain < AHEAD_DRY_MM),
+    ]
+    choices = [PAST_TOO_DRY, PAST_TOO_WET, AHEAD_TOO_DRY, AHEAD_TOO_WET, BOTH_TOO_WET, WET_THEN_DRY]
+    return np.select(conditions, choices, default=IDEAL).astype(np.uint8)
+
+
+@span("rainfall_analysis")
+def analyze_matrix(rain, past_days=PAST_DAYS, post_sowing_days=POST_SOWING_DAYS):
+    """
+    Score a (locations x days) precipitation matrix whose first `past_days` columns are observed
+    rainfall and the rest forecast. Returns a dict of per-location arrays: past, last 3 days and
+    expected totals, advice codes, and the rolling totals of every `post_sowing_days` window in
+    the series (empty when the series is shorter than that).
+    """
+    rain = np.asarray(rain, dtype=np.float64)
+    no_data = np.isnan(rain).all(axis=1)
+    filled = np.nan_to_num(rain)
+
+    # Rainfall comes in 0.1 mm steps; rounding the totals keeps float noise from tipping a threshold
+    past_rain = filled[:, :past_days].sum(axis=1).round(2)
+    last_3_days_rain = filled[:, max(past_days - 3, 0):past_days].sum(axis=1).round(2)
+    ahead_rain = filled[:, past_days:].sum(axis=1).round(2)
+
+    codes = classify(past_rain, ahead_rain)
+    codes[no_data] = NO_DATA
+    return {
+        "past_rain": past_rain,
+        "last_3_days_rain": last_3_days_rain,
+        "ahead_rain": ahead_rain,
+        "advice": codes,
+        "post_sowing_rain": rolling_totals(filled, post_sowing_days),
+    }
+
+
+def render_report(result, i):
+    """Turn the analysis of location i into the farmer-facing report text"""
+    code = int(result["advice"][i])
+    if code == NO_DATA:
+        return ADVICE_TEXT[NO_DATA]
+    report = f"📅 **Past 5 Days Rainfall:** {result['past_rain'][i]:.1f}mm\n"
+    report += f"📅 **Last 3 Days Rainfall:** {result['last_3_days_rain'][i]:.1f}mm\n"
+    report += f"🌧 **Next 10 Days Expected:** {result['ahead_rain'][i]:.1f}mm\n"
+    report += "\n" + ADVICE_TEXT[code]
+    return report
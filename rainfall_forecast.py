@@ -0,0 +1,113 @@
+# rainfall_forecast.py
+import os
+import time
+
+from cache_utils import DiskCache, grid_cell
+from http_utils import get_json
+from metrics import span
+
+OPEN_METEO_URL = os.getenv("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+TIMEZONE = "Africa/Nairobi"
+UTC_OFFSET_HOURS = 3  # Nairobi has no daylight saving
+PAST_DAYS = 5
+FORECAST_DAYS = 10
+
+# The global models behind Open-Meteo's best match are ~0.1-0.25 degrees, so farmers inside one
+# 0.1 degree cell get the same forecast anyway.
+GRID_RESOLUTION = float(os.getenv("FORECAST_GRID_RESOLUTION", 0.1))
+# Model runs land every 6 hours; a cached forecast is stale once the next run is out.
+UPDATE_INTERVAL_HOURS = int(os.getenv("FORECAST_UPDATE_HOURS", 6))
+MAX_LOCATIONS_PER_REQUEST = 100  # keeps the comma-separated query string well under URL limits
+
+_cache = None
+
+
+def _forecast_cache():
+    global _cache
+    if _cache is None:
+        _cache = DiskCache("rainfall.sqlite")
+    return _cache
+
+
+def forecast_cell(lat, lon, resolution=GRID_RESOLUTION):
+    """Cache key and centre point of the forecast grid cell containing (lat, lon)"""
+    (row, col), centre = grid_cell(lat, lon, resolution)
+    key = f"{resolution:.4f}:{row}:{col}:{PAST_DAYS}:{FORECAST_DAYS}"
+    return key, (round(centre[0], 4), round(centre[1], 4))
+
+
+def forecast_expiry(now=None):
+    """
+    When a forecast fetched now stops being current: at the next model update, or at local
+    midnight when the past/forecast day window shifts by one, whichever comes first
+    """
+    now = time.time() if now is None else now
+    interval = UPDATE_INTERVAL_HOURS * 3600
+    next_update = (now // interval + 1) * interval
+    offset = UTC_OFFSET_HOURS * 3600
+    next_midnight = ((now + offset) // 86400 + 1) * 86400 - offset
+    return min(next_update, next_midnight)
+
+
+def _parse_forecast(data):
+    if "daily" in data and "precipitation_sum" in data["daily"]:
+        dates = data["daily"]["time"]
+        rainfall = data["daily"]["precipitation_sum"]
+        return [{ "date": dates[i], "rainfall_mm": rainfall[i] } for i in range(len(dates))]
+    return None
+
+
+def fetch_forecasts(cells):
+    """
+    Fetch the daily precipitation for many points with one Open-Meteo request.
+    Returns a list with a forecast (or None) per point, in order.
+    """
+    payload = {
+        'latitude': ",".join(str(lat) for lat, _ in cells),
+        'longitude': ",".join(str(lon) for _, lon in cells),
+        'daily': 'precipitation_sum', 'timezone': TIMEZONE,
+        'forecast_days': FORECAST_DAYS, 'past_days': PAST_DAYS,
+    }  # data is returned in localtime starting at 00.00 local time
+    data = get_json("open-meteo", OPEN_METEO_URL, payload)
+    if data is None:
+        return [None] * len(cells)
+
+    # A single location comes back as an object, several as a list in request order
+    results = data if isinstance(data, list) else [data]
+    if len(results) != len(cells):
+        print(f"Expected {len(cells)} forecasts from Open-Meteo, got {len(results)}")
+        return [None] * len(cells)
+    return [_parse_forecast(result) for result in results]
+
+
+@span("rainfall_forecast")
+def get_rainfall_forecasts(coordinates):
+    """
+    Get the past 5 days and next 10 days of rainfall for many (lat, lon) points.
+    Points are collapsed to forecast grid cells; cached cells are served locally and the rest
+    are fetched in bulk, so each cell costs at most one upstream location per model update.
+    """
+    cache = _forecast_cache()
+    cells = [forecast_cell(lat, lon) for lat, lon in coordinates]
+
+    forecasts = {}
+    missing = {}
+    for key, centre in cells:
+        if key in forecasts or key in missing:
+            continue
+        cached = cache.get(key)
+        if cached is not None:
+            forecasts[key] = cached
+        else:
+            missing[key] = centre
+
+    expires_at = forecast_expiry()
+    keys = list(missing)
+    for start in range(0, len(keys), MAX_LOCATIONS_PER_REQUEST):
+        chunk = keys[start:start + MAX_LOCATIONS_PER_REQUEST]
+        for key, forecast in zip(chunk, fetch_forecasts([missing[k] for k in chunk])):
+            forecasts[key] = forecast
+            if forecast is not None:
+                cache.set(key, forecast, expires_at=expires_at)
+
+    return [forecasts[key] for key, _ in cells]
@@ -0,0 +1,240 @@
+# rainfall_scheduler.py
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from geocoding import get_coordinates, normalize_location
+from metrics import increment, span
+from rainfall_climatology import get_climatology, local_today, render_outlook
+from rainfall_engine import ADVICE_TEXT, NO_DATA, analyze_matrix, rainfall_matrix, render_report
+from rainfall_forecast import MAX_LOCATIONS_PER_REQUEST, fetch_forecasts, forecast_cell
+from upstream import BATCH, priority
+
+SCHEDULE_PATH = os.getenv("RAINFALL_SCHEDULE_PATH", os.path.join("data", "rainfall_schedule.sqlite"))
+# "should be once in three days then another call once the three elapses"
+REFRESH_HOURS = float(os.getenv("RAINFALL_REFRESH_HOURS", 72))
+RETRY_MINUTES = 30  # how soon a cell whose fetch failed is tried again
+
+
+class RainfallStore:
+    """
+    Registry of farmer locations and the latest advice for each forecast grid cell they fall in.
+    Farmers map many-to-one onto cells, so a cell is fetched and analysed once for all of them.
+    """
+
+    def __init__(self, path=SCHEDULE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cells ("
+            " cell TEXT PRIMARY KEY, lat REAL NOT NULL, lon REAL NOT NULL, advice TEXT, code INTEGER,"
+            " summary TEXT, refreshed_at REAL, due_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS locations ("
+            " location TEXT PRIMARY KEY, lat REAL NOT NULL, lon REAL NOT NULL, cell TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cells_due ON cells (due_at)")
+
+    def add_cell(self, lat, lon):
+        """Schedule the cell containing (lat, lon) if it is not yet. Returns (cell key, centre)."""
+        cell, (cell_lat, cell_lon) = forecast_cell(lat, lon)
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO cells (cell, lat, lon, due_at) VALUES (?, ?, ?, 0)",
+                               (cell, cell_lat, cell_lon))
+        return cell, (cell_lat, cell_lon)
+
+    def register(self, location_key, lat, lon):
+        """Record a farmer location and make sure its cell is scheduled. Returns the cell key."""
+        cell, _ = self.add_cell(lat, lon)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO locations VALUES (?, ?, ?, ?)", (location_key, lat, lon, cell))
+        return cell
+
+    def point_for(self, location_key):
+        """(lat, lon) of a registered location, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT lat, lon FROM locations WHERE location = ?", (location_key,)).fetchone()
+        return tuple(row) if row else None
+
+    def due_cells(self, now, force=False):
+        """[(cell, lat, lon)] of the cells whose advice has to be recomputed"""
+        query = "SELECT cell, lat, lon FROM cells" + ("" if force else " WHERE due_at <= ?")
+        with self._lock:
+            return self._conn.execute(query, () if force else (now,)).fetchall()
+
+    def save(self, rows):
+        """Store (cell, advice, code, summary, refreshed_at, due_at) rows in one transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "UPDATE cells SET advice = ?, code = ?, summary = ?, refreshed_at = ?, due_at = ? WHERE cell = ?",
+                [(advice, code, summary, refreshed, due, cell) for cell, advice, code, summary, refreshed, due in rows],
+            )
+            self._conn.execute("COMMIT")
+
+    def postpone(self, cells, due_at):
+        with self._lock:
+            self._conn.executemany("UPDATE cells SET due_at = ? WHERE cell = ?", [(due_at, c) for c in cells])
+
+    def advice(self, cell):
+        """
+        (advice text, due_at) for a registered cell, or None for an unknown one. The text is None
+        until the cell's first successful refresh.
+        """
+        with self._lock:
+            return self._conn.execute("SELECT advice, due_at FROM cells WHERE cell = ?", (cell,)).fetchone()
+
+    def counts(self):
+        with self._lock:
+            locations = self._conn.execute("SELECT COUNT(*) FROM locations").fetchone()[0]
+            cells = self._conn.execute("SELECT COUNT(*) FROM cells").fetchone()[0]
+        return {"locations": locations, "cells": cells}
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = RainfallStore()
+    return _store
+
+
+@span("rainfall_refresh")
+def refresh(store=None, force=False, cells=None, now=None):
+    """
+    Recompute the advice of every due cell: fetch their forecasts in bulk (up to
+    MAX_LOCATIONS_PER_REQUEST cells per Open-Meteo call), analyse them as one matrix and store the
+    rendered advice. Cells that could not be fetched keep their old advice and are retried after
+    RETRY_MINUTES. Returns the number of cells refreshed and failed.
+    """
+    store = store or get_store()
+    now = time.time() if now is None else now
+    due = cells if cells is not None else store.due_cells(now, force)
+
+    fetched, failed = [], []
+    for start in range(0, len(due), MAX_LOCATIONS_PER_REQUEST):
+        chunk = due[start:start + MAX_LOCATIONS_PER_REQUEST]
+        for cell, forecast in zip(chunk, fetch_forecasts([(lat, lon) for _, lat, lon in chunk])):
+            (fetched if forecast is not None else failed).append((cell[0], forecast))
+
+    if fetched:
+        rain = rainfall_matrix([forecast for _, forecast in fetched])
+        result = analyze_matrix(rain)
+        # Where a climatology has been built, the 10-day forecast is put in the context of past years
+        climatology, today = get_climatology(), local_today(now)
+        outlook = climatology.outlook([cell for cell, _ in fetched], rain, today) if climatology else None
+        rows = []
+        for i, (cell, _) in enumerate(fetched):
+            summary = {"past_rain": float(result["past_rain"][i]), "ahead_rain": float(result["ahead_rain"][i]),
+                       "last_3_days_rain": float(result["last_3_days_rain"][i])}
+            report = render_report(result, i)
+            if outlook is not None and outlook["known"][i] and result["advice"][i] != NO_DATA:
+                summary["expected_post_sowing_rain"] = round(float(outlook["expected"][i]), 1)
+                report += "\n\n" + render_outlook(outlook, i, today).rstrip()
+            rows.append((cell, report, int(result["advice"][i]), json.dumps(summary),
+                         now, now + REFRESH_HOURS * 3600))
+        store.save(rows)
+    if failed:
+        store.postpone([cell for cell, _ in failed], now + RETRY_MINUTES * 60)
+
+    increment("rainfall_cells_refreshed_total", len(fetched))
+    increment("rainfall_cells_failed_total", len(failed))
+    return {"refreshed": len(fetched), "failed": len(failed)}
+
+
+def register_location(location, store=None):
+    """Geocode a farmer location and add it to the registry. Returns the cell key, or None."""
+    lat, lon = get_coordinates(location)
+    if lat is None or lon is None:
+        return None
+    return (store or get_store()).register(normalize_location(location), lat, lon)
+
+
+def advice_for_point(lat, lon, store=None):
+    """
+    Planting advice for a point, read from the store. A new cell, or one overdue because no
+    scheduler is running, is refreshed on the spot; otherwise this is a single indexed read.
+    A cell whose fetch failed is not tried again before its due_at (RETRY_MINUTES later): until
+    then it answers with its previous advice, or NO_DATA if it never had any.
+    """
+    store = store or get_store()
+    cell, _ = forecast_cell(lat, lon)
+    stored = store.advice(cell)
+    due = stored is None or stored[1] <= time.time()
+    hit = not due and stored[0] is not None
+    increment("cache_requests_total", cache="rainfall_advice", result="hit" if hit else "miss")
+    if due:
+        cell, (cell_lat, cell_lon) = store.add_cell(lat, lon)
+        refresh(store, cells=[(cell, cell_lat, cell_lon)])
+        stored = store.advice(cell)
+    return stored[0] if stored and stored[0] is not None else ADVICE_TEXT[NO_DATA]
+
+
+def get_advice(location, store=None):
+    """Planting advice for a farmer location, or None if the location cannot be found"""
+    store = store or get_store()
+    key = normalize_location(location)
+    point = store.point_for(key)
+    if point is None:
+        lat, lon = get_coordinates(location)
+        if lat is None or lon is None:
+            return None
+        store.register(key, lat, lon)
+        point = (lat, lon)
+    return advice_for_point(*point, store)
+
+
+def run_forever(store=None, interval_minutes=15):
+    """Check for due cells every `interval_minutes` and refresh them in bulk, until interrupted"""
+    store = store or get_store()
+    while True:
+        with priority(BATCH):
+            summary = refresh(store)
+        if summary["refreshed"] or summary["failed"]:
+            print(f"Refreshed {summary['refreshed']} cells, {summary['failed']} failed")
+        time.sleep(interval_minutes * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep per-grid-cell rainfall advice fresh for registered farmers")
+    sub = parser.add_subparsers(dest="command", required=True)
+    register = sub.add_parser("register", help="add farmer locations, one per line of a text file")
+    register.add_argument("path")
+    once = sub.add_parser("refresh", help="refresh every due cell once")
+    once.add_argument("--force", action="store_true", help="refresh every cell, due or not")
+    loop = sub.add_parser("run", help="keep refreshing due cells")
+    loop.add_argument("--interval-minutes", type=float, default=15)
+    advice = sub.add_parser("advice", help="print the stored advice for a location")
+    advice.add_argument("location")
+    args = parser.parse_args()
+
+    store = get_store()
+    if args.command == "register":
+        with open(args.path) as fh:
+            locations = [line.strip() for line in fh if line.strip()]
+        with priority(BATCH):
+            found = sum(register_location(location, store) is not None for location in locations)
+        print(f"Registered {found} of {len(locations)} locations; {json.dumps(store.counts())}")
+    elif args.command == "refresh":
+        with priority(BATCH):
+            print(json.dumps(refresh(store, force=args.force)))
+    elif args.command == "run":
+        try:
+            run_forever(store, args.interval_minutes)
+        except KeyboardInterrupt:
+            pass
+    else:
+        text = get_advice(args.location, store)
+        print(text if text is not None else "Invalid location. Please try again.")
+
+
+if __name__ == "__main__":
+    main()
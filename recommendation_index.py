@@ -0,0 +1,304 @@
+# recommendation_index.py
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from batch_prediction import FOREST_DIR, MODEL_FORMAT, MODEL_PATH, get_artifacts, recommend_batch
+from fertilizer_prediction import clean_and_validate, fetch_soil_data
+from geocoding import GAZETTEER_PATH, lookup_gazetteer, normalize_location
+from http_utils import POOL_SIZE
+from metrics import span
+from soil_cache import forget_soil_data
+from upstream import BATCH, priority
+
+INDEX_DIR = os.path.join("models", "recommendation_index")
+FORMAT_VERSION = 1
+
+# Everything fetch_soil_data returns is fixed per location; every other model input is a farmer answer
+SOIL_COLUMNS = ["ph", "nitrogen", "phosphorus", "potassium", "organic_carbon", "texture"]
+
+# Numeric farmer answers are indexed by bucket: (upper bucket edges, value scored for each bucket)
+NUMERIC_BUCKETS = {
+    "previous_yield": ([5, 10, 15, 20, 25, 30], [2.5, 7.5, 12.5, 17.5, 22.5, 27.5, 35.0]),  # bags per acre
+}
+MISSING = -1  # class code stored for units without usable soil data
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def model_fingerprint():
+    """Hash of the model files in use, so the index knows when a new model was pushed"""
+    if MODEL_FORMAT == "compact":
+        paths = [os.path.join(FOREST_DIR, name) for name in sorted(os.listdir(FOREST_DIR))]
+    else:
+        paths = [MODEL_PATH]
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def load_units(path=GAZETTEER_PATH):
+    """
+    Admin units of the gazetteer, one per distinct centroid (a county and the sub-county sharing
+    its centroid get the same soil, so they share a row)
+    """
+    units = {}
+    with open(path, newline="") as fh:
+        for row in csv.DictReader(fh):
+            coords = (float(row["latitude"]), float(row["longitude"]))
+            unit = units.setdefault(coords, {"lat": coords[0], "lon": coords[1], "county": row["county"], "names": []})
+            unit["names"].append(", ".join(filter(None, [row["county"], row["sub_county"]])))
+    return list(units.values())
+
+
+def answer_layout(preprocessor):
+    """
+    The farmer-answer dimensions of the index: every model input that does not come from the
+    soil lookup, with the values scored for it. Categorical answers use the model's categories,
+    numeric ones the NUMERIC_BUCKETS representatives.
+    """
+    layout = []
+    for col in preprocessor.columns:
+        if col in SOIL_COLUMNS:
+            continue
+        if col in preprocessor.categorical_columns:
+            layout.append({"name": col, "kind": "category", "values": list(preprocessor.categories[col])})
+        elif col in NUMERIC_BUCKETS:
+            edges, values = NUMERIC_BUCKETS[col]
+            layout.append({"name": col, "kind": "bucket", "edges": list(edges), "values": list(values)})
+        else:
+            raise ValueError(f"No buckets defined for numeric answer '{col}'")
+    return layout
+
+
+def _combinations(layout):
+    """DataFrame with one row per combination of answer values, in index column order"""
+    values = [dim["values"] for dim in layout]
+    return pd.DataFrame(list(itertools.product(*values)), columns=[dim["name"] for dim in layout])
+
+
+def _fetch_unit_soil(unit, refresh):
+    if refresh:
+        forget_soil_data(unit["lat"], unit["lon"])
+    with priority(BATCH):  # index builds must not hold up farmers waiting on the same provider
+        soil = fetch_soil_data(unit["lat"], unit["lon"])
+    soil = clean_and_validate(soil) if soil is not None else None
+    return {col: soil[col] for col in SOIL_COLUMNS} if soil is not None else None
+
+
+def _score_units(units, rows, artifacts, layout):
+    """Class code of every answer combination for the given unit rows, shape (len(rows), combos)"""
+    combos = _combinations(layout)
+    codes = np.full((len(rows), len(combos)), MISSING, dtype=np.int16)
+    scored = [i for i, row in enumerate(rows) if units[row]["soil"] is not None]
+    if not scored:
+        return codes
+    soil = pd.DataFrame([units[rows[i]]["soil"] for i in scored])
+    frame = pd.concat([soil.loc[soil.index.repeat(len(combos))].reset_index(drop=True),
+                       pd.concat([combos] * len(scored), ignore_index=True)], axis=1)
+    result = recommend_batch(frame, artifacts)
+    lookup = {name: code for code, name in enumerate(artifacts["preprocessor"].target_classes)}
+    predicted = result["recommended_fertilizer"].map(lambda name: lookup.get(name, MISSING)).to_numpy()
+    codes[scored] = predicted.reshape(len(scored), len(combos))
+    return codes
+
+
+def build_index(index_dir=INDEX_DIR, refresh_counties=(), refresh_all=False, workers=POOL_SIZE):
+    """
+    Precompute the recommendation for every admin unit x answer combination and save the index.
+    Incremental: soil is only fetched for units that have none stored yet (or whose county is
+    being refreshed), and only units whose soil changed are re-scored, unless the model,
+    preprocessing or answer layout changed, in which case every unit is re-scored from the
+    stored soil without any upstream calls. Returns a summary of the work done.
+    """
+    artifacts = get_artifacts()
+    preprocessor = artifacts["preprocessor"]
+    layout = answer_layout(preprocessor)
+    fingerprint = {"model": model_fingerprint(), "preprocessing": preprocessor.version, "layout": _digest(layout)}
+
+    previous = load_index(index_dir) if os.path.exists(os.path.join(index_dir, "meta.json")) else None
+    stored = {}
+    if previous is not None:
+        stored = {(u["lat"], u["lon"]): (u, previous.codes[i]) for i, u in enumerate(previous.units)}
+
+    units = load_units()
+    refresh = {c.lower() for c in refresh_counties}
+    to_fetch = []
+    for unit in units:
+        old = stored.get((unit["lat"], unit["lon"]))
+        unit["soil"] = old[0]["soil"] if old else None
+        unit["soil_hash"] = old[0]["soil_hash"] if old else None
+        if refresh_all or unit["soil"] is None or unit["county"].lower() in refresh:
+            to_fetch.append(unit)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        fetched = list(pool.map(lambda u: _fetch_unit_soil(u, refresh_all or u["county"].lower() in refresh),
+                                to_fetch))
+    for unit, soil in zip(to_fetch, fetched):
+        if soil is not None or unit["soil"] is None:
+            unit["soil"] = soil
+        unit["soil_hash"] = _digest(unit["soil"]) if unit["soil"] is not None else None
+
+    n_combos = len(_combinations(layout))
+    model_changed = previous is None or previous.fingerprint != fingerprint
+    codes = np.full((len(units), n_combos), MISSING, dtype=np.int16)
+    dirty = []
+    for row, unit in enumerate(units):
+        old = stored.get((unit["lat"], unit["lon"]))
+        if model_changed or old is None or old[0]["soil_hash"] != unit["soil_hash"]:
+            dirty.append(row)
+        else:
+            codes[row] = old[1]
+    if dirty:
+        codes[dirty] = _score_units(units, dirty, artifacts, layout)
+
+    save_index(index_dir, units, layout, codes, fingerprint, list(preprocessor.target_classes))
+    return {"units": len(units), "combinations": n_combos, "soil_fetched": len(to_fetch),
+            "rescored_units": len(dirty), "model_changed": model_changed,
+            "missing_soil": sum(u["soil"] is None for u in units)}
+
+
+def save_index(index_dir, units, layout, codes, fingerprint, target_classes):
+    """Write the code matrix and its metadata, replacing the previous index atomically per file"""
+    os.makedirs(index_dir, exist_ok=True)
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "fingerprint": fingerprint,
+        "layout": layout,
+        "target_classes": target_classes,
+        "units": units,
+    }
+    codes_tmp = os.path.join(index_dir, "codes.tmp.npy")
+    np.save(codes_tmp, codes)
+    os.replace(codes_tmp, os.path.join(index_dir, "codes.npy"))
+    meta_tmp = os.path.join(index_dir, "meta.json.tmp")
+    with open(meta_tmp, "w") as fh:
+        json.dump(meta, fh)
+    os.replace(meta_tmp, os.path.join(index_dir, "meta.json"))
+
+
+class RecommendationIndex:
+    """
+    Read side of the precomputed index. The code matrix is memory-mapped; a lookup is a
+    gazetteer match, one dict lookup per categorical answer and a bucket search per numeric one.
+    """
+
+    def __init__(self, meta, codes):
+        self.fingerprint = meta["fingerprint"]
+        self.layout = meta["layout"]
+        self.units = meta["units"]
+        self.codes = codes
+        self.target_classes = meta["target_classes"]
+        self._rows = {(u["lat"], u["lon"]): i for i, u in enumerate(self.units)}
+        self._positions = [{v: i for i, v in enumerate(dim["values"])} if dim["kind"] == "category" else None
+                           for dim in self.layout]
+        # Mixed-radix strides turn the per-answer positions into a column of the code matrix
+        sizes = [len(dim["values"]) for dim in self.layout]
+        self._strides = [int(np.prod(sizes[i + 1:])) for i in range(len(sizes))]
+
+    def unit_row(self, location):
+        coords = lookup_gazetteer(normalize_location(location))
+        return self._rows.get(coords) if coords is not None else None
+
+    def combination(self, answers):
+        """Column of the code matrix for a farmer's answers, or None if an answer is not indexed"""
+        column = 0
+        for dim, positions, stride in zip(self.layout, self._positions, self._strides):
+            value = answers.get(dim["name"])
+            if value is None:
+                return None
+            if positions is not None:
+                position = positions.get(str(value))
+                if position is None:
+                    return None
+            else:
+                try:
+                    position = int(np.searchsorted(dim["edges"], float(value), side="right"))
+                except (TypeError, ValueError):
+                    return None
+            column += position * stride
+        return column
+
+    def lookup(self, location, answers):
+        """Precomputed fertilizer for a gazetteer location and the farmer's answers, or None"""
+        row = self.unit_row(location)
+        column = self.combination(answers) if row is not None else None
+        if column is None:
+            return None
+        code = int(self.codes[row, column])
+        return self.target_classes[code] if code != MISSING else None
+
+
+def load_index(index_dir=INDEX_DIR):
+    with open(os.path.join(index_dir, "meta.json")) as fh:
+        meta = json.load(fh)
+    if meta["format_version"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported recommendation index format version {meta['format_version']}")
+    return RecommendationIndex(meta, np.load(os.path.join(index_dir, "codes.npy"), mmap_mode="r"))
+
+
+_index = None
+
+
+def get_index(index_dir=INDEX_DIR):
+    """
+    The index built for the model currently deployed, loaded once per process; None when there
+    is no index or it was built for a different model, so callers fall back to scoring live
+    """
+    global _index
+    if _index is None:
+        _index = False
+        if os.path.exists(os.path.join(index_dir, "meta.json")):
+            index = load_index(index_dir)
+            current = {"model": model_fingerprint(), "preprocessing": get_artifacts()["preprocessor"].version}
+            if all(index.fingerprint[k] == v for k, v in current.items()):
+                _index = index
+            else:
+                print("Recommendation index was built for another model; scoring live instead")
+    return _index or None
+
+
+@span("index_lookup")
+def lookup_recommendation(location, answers):
+    """Precomputed recommendation for a farmer, or None when they have to be scored live"""
+    index = get_index()
+    return index.lookup(location, answers) if index is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute fertilizer recommendations per admin unit")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="build or incrementally update the index")
+    build.add_argument("--out", default=INDEX_DIR)
+    build.add_argument("--refresh-county", action="append", default=[],
+                       help="refetch soil for this county (repeatable)")
+    build.add_argument("--refresh-all", action="store_true", help="refetch soil for every unit")
+    query = sub.add_parser("query", help="look up one farmer")
+    query.add_argument("location")
+    query.add_argument("answers", nargs="*", help="answer=value pairs, e.g. previous_crop=maize")
+    query.add_argument("--index", default=INDEX_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        summary = build_index(args.out, args.refresh_county, args.refresh_all)
+        print(json.dumps(summary, indent=2))
+    else:
+        answers = dict(pair.split("=", 1) for pair in args.answers)
+        recommendation = load_index(args.index).lookup(args.location, answers)
+        print(f"🌱 Recommended Fertilizer: {recommendation}" if recommendation else "Not in the index")
+
+
+if __name__ == "__main__":
+    main()
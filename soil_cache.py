@@ -0,0 +1,55 @@
+# soil_cache.py
+import os
+
+from cache_utils import DiskCache, grid_cell
+
+# iSDA soil rasters are 30 m; SoilGrids is 250 m. One arc-second (~31 m at the equator) keeps
+# every farm inside a single iSDA pixel, set SOIL_GRID_RESOLUTION=0.00225 for SoilGrids.
+GRID_RESOLUTION = float(os.getenv("SOIL_GRID_RESOLUTION", 1 / 3600))
+SOIL_CACHE_TTL = float(os.getenv("SOIL_CACHE_TTL", 365 * 24 * 3600))  # soil properties barely change
+SOIL_CACHE_MAX_ENTRIES = int(os.getenv("SOIL_CACHE_MAX_ENTRIES", 500000))
+
+_cache = None
+
+
+def _soil_cache():
+    global _cache
+    if _cache is None:
+        _cache = DiskCache("soil.sqlite", ttl=SOIL_CACHE_TTL, max_entries=SOIL_CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def soil_cell_key(lat, lon, provider, resolution=GRID_RESOLUTION):
+    """Cache key for the raster pixel containing (lat, lon)"""
+    (row, col), _ = grid_cell(lat, lon, resolution)
+    return f"{provider}:{resolution:.8f}:{row}:{col}"
+
+
+def _complete(soil_data):
+    # Providers answer errors and odd shapes with a dict of Nones; those must not be cached for a year
+    return bool(soil_data) and all(value is not None for value in soil_data.values())
+
+
+def cached_soil_data(lat, lon, fetch, provider="isda", resolution=GRID_RESOLUTION):
+    """
+    Return soil properties for the pixel containing (lat, lon), calling fetch(lat, lon) at the
+    pixel centre only when the pixel is not cached yet. Failed fetches (None) and incomplete
+    answers (any property None) are returned as they are but not cached, so the next lookup
+    tries again; an incomplete entry cached before this check is refetched the same way.
+    """
+    cache = _soil_cache()
+    key = soil_cell_key(lat, lon, provider, resolution)
+    soil_data = cache.get(key)
+    if _complete(soil_data):
+        return soil_data
+
+    _, (cell_lat, cell_lon) = grid_cell(lat, lon, resolution)
+    soil_data = fetch(round(cell_lat, 6), round(cell_lon, 6))
+    if _complete(soil_data):
+        cache.set(key, soil_data)
+    return soil_data
+
+
+def forget_soil_data(lat, lon, provider="isda", resolution=GRID_RESOLUTION):
+    """Drop the cached soil properties of the pixel containing (lat, lon) so the next lookup refetches them"""
+    _soil_cache().delete(soil_cell_key(lat, lon, provider, resolution))
@@ -0,0 +1,287 @@
+# soil_raster.py
+import argparse
+import itertools
+import json
+import os
+import time
+
+import numpy as np
+
+RASTER_DIR = os.getenv("SOIL_RASTER_DIR", os.path.join("data", "soil_raster"))
+FORMAT_VERSION = 1
+TILE_SIZE = 256  # pixels per tile side; one 256x256 int16 tile is 128 KiB, a handful of pages
+MAX_FILL_RADIUS = 5  # pixels searched around a nodata pixel for the nearest valid one
+ASCII_NODATA = -9999.0  # what an ESRI ASCII grid without a NODATA_value line uses
+
+# Layers in the same keys fetch_soil_data returns; texture is a class index into meta "classes"
+CONTINUOUS_LAYERS = ["ph", "nitrogen", "phosphorus", "potassium", "organic_carbon"]
+CATEGORICAL_LAYERS = ["texture"]
+USDA_TEXTURE_CLASSES = [
+    "clay", "silty clay", "sandy clay", "clay loam", "silty clay loam", "sandy clay loam",
+    "loam", "silt loam", "sandy loam", "silt", "loamy sand", "sand",
+]
+
+
+def read_ascii_grid(path):
+    """
+    Read an ESRI ASCII grid (what `gdal_translate -of AAIGrid` writes from any GeoTIFF).
+    The header is `key value` lines up to the first row of numbers; NODATA_value is optional
+    and defaults to ESRI's -9999. Returns (array, (west, north, resolution), nodata).
+    """
+    header = {}
+    with open(path) as fh:
+        for line in fh:
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0][0] in "+-.0123456789":
+                break  # first data row
+            header[fields[0].lower()] = float(fields[1])
+        data = np.loadtxt(itertools.chain([line], fh), dtype=np.float32, ndmin=2)
+    rows, res = int(header["nrows"]), header["cellsize"]
+    west = header.get("xllcorner", header.get("xllcenter", 0) - res / 2)
+    south = header.get("yllcorner", header.get("yllcenter", 0) - res / 2)
+    nodata = header.get("nodata_value", ASCII_NODATA)
+    return data.reshape(rows, int(header["ncols"])), (west, south + rows * res, res), nodata
+
+
+def read_geotiff(path):
+    """Read band 1 of a GeoTIFF with rasterio, if it is installed"""
+    try:
+        import rasterio
+    except ImportError:
+        print("Reading GeoTIFFs needs rasterio; convert with `gdal_translate -of AAIGrid` instead")
+        return None
+    with rasterio.open(path) as src:
+        t = src.transform
+        if abs(t.a) != abs(t.e) or t.b or t.d:
+            print(f"{path} is not on a square north-up grid; warp it to EPSG:4326 first")
+            return None
+        return src.read(1), (t.c, t.f, t.a), src.nodata
+
+
+def _tile(array, tile_size, nodata):
+    # (rows, cols) -> (tile rows, tile cols, tile, tile) so nearby pixels share pages on disk
+    rows, cols = array.shape
+    ty, tx = -(-rows // tile_size), -(-cols // tile_size)
+    padded = np.full((ty * tile_size, tx * tile_size), nodata, dtype=array.dtype)
+    padded[:rows, :cols] = array
+    return np.ascontiguousarray(padded.reshape(ty, tile_size, tx, tile_size).transpose(0, 2, 1, 3))
+
+
+def write_store(out_dir, grid, layers, tile_size=TILE_SIZE):
+    """
+    Write co-registered layers as tiled .npy files plus meta.json.
+    grid is (west, north, resolution) in degrees; layers maps a layer name to
+    (array, {"nodata": ..., "scale": ..., "offset": ..., "classes": [...]}) where stored values
+    decode as raw * scale + offset. Arrays keep their dtype, so scaled integer rasters stay small.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    shapes = {array.shape for array, _ in layers.values()}
+    if len(shapes) != 1:
+        raise ValueError(f"Layers must share one grid, got shapes {sorted(shapes)}")
+    meta = {"format_version": FORMAT_VERSION, "west": grid[0], "north": grid[1], "resolution": grid[2],
+            "height": shapes.pop()[0], "tile_size": tile_size, "layers": {}}
+    meta["width"] = next(iter(layers.values()))[0].shape[1]
+    for name, (array, info) in layers.items():
+        nodata = info.get("nodata")
+        if nodata is None:
+            nodata = np.nan if np.issubdtype(array.dtype, np.floating) else np.iinfo(array.dtype).min
+        np.save(os.path.join(out_dir, f"{name}.npy"), _tile(array, tile_size, nodata))
+        meta["layers"][name] = {
+            "dtype": str(array.dtype), "nodata": None if np.isnan(nodata) else float(nodata),
+            "scale": info.get("scale", 1.0), "offset": info.get("offset", 0.0), "classes": info.get("classes"),
+        }
+    with open(os.path.join(out_dir, "meta.json"), "w") as fh:
+        json.dump(meta, fh, indent=2)
+    return meta
+
+
+def import_rasters(out_dir, sources, scales=None, tile_size=TILE_SIZE):
+    """
+    Build the store from bulk-downloaded rasters, one file per layer ({"ph": "ph.asc", ...}).
+    .asc files are read directly, GeoTIFFs through rasterio. All must share one grid.
+    """
+    layers, grid = {}, None
+    for name, path in sources.items():
+        read = read_geotiff if path.lower().endswith((".tif", ".tiff")) else read_ascii_grid
+        loaded = read(path)
+        if loaded is None:
+            return None
+        array, layer_grid, nodata = loaded
+        if grid is not None and not np.allclose(grid, layer_grid):
+            raise ValueError(f"{path} is on a different grid than the other layers; resample it first")
+        grid = layer_grid
+        info = {"nodata": nodata, "scale": (scales or {}).get(name, 1.0)}
+        if name in CATEGORICAL_LAYERS:
+            info["classes"] = USDA_TEXTURE_CLASSES
+            array = np.where(array == nodata, -1, array).astype(np.int16) if nodata is not None else array.astype(np.int16)
+            info["nodata"] = -1
+        layers[name] = (array, info)
+    return write_store(out_dir, grid, layers, tile_size)
+
+
+class SoilRaster:
+    """
+    Memory-mapped tiled soil layers with vectorized sampling. Only the tiles that sampled
+    points fall in are ever read from disk.
+    """
+
+    def __init__(self, raster_dir=RASTER_DIR):
+        with open(os.path.join(raster_dir, "meta.json")) as fh:
+            meta = json.load(fh)
+        if meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported soil raster format version {meta['format_version']}")
+        self.meta = meta
+        self.west, self.north, self.res = meta["west"], meta["north"], meta["resolution"]
+        self.height, self.width, self.tile = meta["height"], meta["width"], meta["tile_size"]
+        self.layers = {name: np.load(os.path.join(raster_dir, f"{name}.npy"), mmap_mode="r")
+                       for name in meta["layers"]}
+        # Neighbour offsets within MAX_FILL_RADIUS, nearest first, for the nodata fallback
+        r = np.arange(-MAX_FILL_RADIUS, MAX_FILL_RADIUS + 1)
+        dy, dx = [a.ravel() for a in np.meshgrid(r, r, indexing="ij")]
+        order = np.argsort(dy ** 2 + dx ** 2, kind="stable")
+        self._offsets = [(int(y), int(x)) for y, x in zip(dy[order], dx[order]) if y or x]
+
+    def _read(self, name, rows, cols):
+        # Raw values at integer pixel positions; out-of-bounds pixels read as nodata
+        info = self.meta["layers"][name]
+        inside = (rows >= 0) & (rows < self.height) & (cols >= 0) & (cols < self.width)
+        r, c = np.where(inside, rows, 0), np.where(inside, cols, 0)
+        raw = self.layers[name][r // self.tile, c // self.tile, r % self.tile, c % self.tile]
+        valid = inside & (~np.isnan(raw) if info["nodata"] is None else raw != info["nodata"])
+        return raw, valid
+
+    def _nearest(self, name, rows, cols):
+        raw, valid = self._read(name, rows, cols)
+        raw = raw.astype(np.float64)
+        # Walk outwards ring by ring, nearest offsets first, only for the points still missing
+        missing = np.flatnonzero(~valid)
+        for dy, dx in self._offsets:
+            if not missing.size:
+                break
+            found_raw, found = self._read(name, rows[missing] + dy, cols[missing] + dx)
+            raw[missing[found]] = found_raw[found]
+            valid[missing[found]] = True
+            missing = missing[~found]
+        return raw, valid
+
+    def sample(self, name, lats, lons, method="bilinear"):
+        """
+        Decoded values of one layer at arrays of coordinates. Categorical layers and
+        method="nearest" take the containing pixel; bilinear interpolates the four surrounding
+        pixel centres, ignoring nodata neighbours. Points whose pixels are all nodata fall back to
+        the nearest valid pixel within MAX_FILL_RADIUS; beyond that they come back as NaN.
+        """
+        info = self.meta["layers"][name]
+        y = (self.north - np.asarray(lats, dtype=np.float64)) / self.res - 0.5
+        x = (np.asarray(lons, dtype=np.float64) - self.west) / self.res - 0.5
+
+        if method == "nearest" or info["classes"]:
+            values, valid = self._nearest(name, np.rint(y).astype(np.int64), np.rint(x).astype(np.int64))
+        else:
+            r0, c0 = np.floor(y).astype(np.int64), np.floor(x).astype(np.int64)
+            fy, fx = y - r0, x - c0
+            total = np.zeros(len(y))
+            weight = np.zeros(len(y))
+            for dr, dc, w in ((0, 0, (1 - fy) * (1 - fx)), (0, 1, (1 - fy) * fx),
+                              (1, 0, fy * (1 - fx)), (1, 1, fy * fx)):
+                raw, ok = self._read(name, r0 + dr, c0 + dc)
+                w = np.where(ok, w, 0.0)
+                total += np.where(ok, raw, 0.0) * w
+                weight += w
+            valid = weight > 0
+            values = np.divide(total, weight, out=np.zeros_like(total), where=valid)
+            if not valid.all():
+                fill = np.flatnonzero(~valid)
+                values[fill], valid[fill] = self._nearest(name, np.rint(y[fill]).astype(np.int64),
+                                                          np.rint(x[fill]).astype(np.int64))
+
+        if info["classes"]:
+            return values, valid
+        values = values * info["scale"] + info["offset"]
+        values[~valid] = np.nan
+        return values, valid
+
+    def soil(self, lats, lons, method="bilinear"):
+        """
+        Every layer for arrays of coordinates, as {layer: array}. Texture comes back as class
+        names (None where unknown).
+        """
+        result = {}
+        for name in self.meta["layers"]:
+            values, valid = self.sample(name, lats, lons, method)
+            classes = self.meta["layers"][name]["classes"]
+            if classes:
+                names = np.asarray(classes + [None], dtype=object)
+                codes = np.where(valid, values, len(classes)).astype(np.int64)
+                values = names[np.clip(codes, 0, len(classes))]
+            result[name] = values
+        return result
+
+
+_raster = None
+
+
+def get_raster():
+    global _raster
+    if _raster is None:
+        _raster = SoilRaster(RASTER_DIR)
+    return _raster
+
+
+def soil_at(lat, lon):
+    """
+    Soil properties for one point from the local raster store, in the same shape as
+    fetch_isda_soil_data returns, or None outside the rasters' coverage
+    """
+    soil = get_raster().soil([lat], [lon])
+    values = {name: array[0] for name, array in soil.items()}
+    if any(v is None or (isinstance(v, float) and np.isnan(v)) for v in values.values()):
+        return None
+    return {name: (round(float(v), 4) if name in CONTINUOUS_LAYERS else v) for name, v in values.items()}
+
+
+def benchmark(points=1000000, seed=0, method="bilinear"):
+    """Time soil lookups for `points` random coordinates inside the store's bounds"""
+    raster = get_raster()
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(raster.north - raster.height * raster.res, raster.north, points)
+    lons = rng.uniform(raster.west, raster.west + raster.width * raster.res, points)
+    start = time.perf_counter()
+    soil = raster.soil(lats, lons, method)
+    elapsed = time.perf_counter() - start
+    return {"points": points, "method": method, "seconds": round(elapsed, 3),
+            "points_per_s": round(points / elapsed), "missing": int(np.isnan(soil[CONTINUOUS_LAYERS[0]]).sum())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local memory-mapped soil raster store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="build the store from one raster file per layer")
+    imp.add_argument("layers", nargs="+", help="layer=path pairs, e.g. ph=ph.asc texture=texture.tif")
+    imp.add_argument("--scale", action="append", default=[], help="layer=factor for scaled integer rasters")
+    imp.add_argument("--out", default=RASTER_DIR)
+    imp.add_argument("--tile-size", type=int, default=TILE_SIZE)
+    sample = sub.add_parser("sample", help="print the soil at one point")
+    sample.add_argument("lat", type=float)
+    sample.add_argument("lon", type=float)
+    bench = sub.add_parser("bench", help="time lookups for many random points")
+    bench.add_argument("--points", type=int, default=1000000)
+    bench.add_argument("--method", choices=["bilinear", "nearest"], default="bilinear")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        sources = dict(pair.split("=", 1) for pair in args.layers)
+        scales = {k: float(v) for k, v in (pair.split("=", 1) for pair in args.scale)}
+        meta = import_rasters(args.out, sources, scales, args.tile_size)
+        if meta:
+            print(f"✅ Imported {len(meta['layers'])} layers ({meta['height']}x{meta['width']} px) to {args.out}")
+    elif args.command == "sample":
+        print(soil_at(args.lat, args.lon))
+    else:
+        print(json.dumps(benchmark(args.points, method=args.method), indent=2))
+
+
+if __name__ == "__main__":
+    main()
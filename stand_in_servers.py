@@ -0,0 +1,166 @@
+# stand_in_servers.py
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from synthetic_data import KENYA_BOUNDS, TEXTURES
+
+# Path on the stand-in server for each upstream, and the environment variable that points the app at it
+ROUTES = {
+    "/geocode/v1/json": ("opencage", "OPENCAGE_URL"),
+    "/soilproperty": ("isda", "ISDA_SOIL_URL"),
+    "/v1/layers": ("isda", "ISDA_LAYERS_URL"),
+    "/v1/forecast": ("open-meteo", "OPEN_METEO_URL"),
+}
+
+
+def _unit(*parts):
+    """Deterministic number in [0, 1) from the request contents, so repeat lookups agree"""
+    digest = hashlib.sha256(":".join(str(p) for p in parts).encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Local replacement for OpenCage, iSDA and Open-Meteo. Every response waits `latency_ms`
+    (± `jitter_ms`) and a share `error_rate` of requests fail with 503, per provider.
+    Responses are deterministic functions of the query so caches behave as they would upstream.
+    """
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address=("127.0.0.1", 0), latency_ms=None, jitter_ms=0, error_rate=None,
+                 textures=TEXTURES[:6], seed=0):
+        super().__init__(address, StandInHandler)
+        self.latency_ms = latency_ms or {}
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate or {}
+        self.textures = list(textures)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {provider: {"requests": 0, "errors": 0} for provider, _ in ROUTES.values()}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environment(self):
+        """Environment variables that send the app's upstream calls to this server"""
+        return {env: self.base_url + path for path, (_, env) in ROUTES.items()}
+
+    def delay_and_fail(self, provider):
+        with self.lock:
+            self.counts[provider]["requests"] += 1
+            jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+            fail = self.rng.random() < self.error_rate.get(provider, 0.0)
+            if fail:
+                self.counts[provider]["errors"] += 1
+        time.sleep(max(0.0, self.latency_ms.get(provider, 0.0) + jitter) / 1000)
+        return fail
+
+
+def geocode_response(query):
+    if "nowhere" in query.lower():
+        return {"results": []}
+    (lat_min, lat_max), (lon_min, lon_max) = KENYA_BOUNDS
+    lat = lat_min + (lat_max - lat_min) * _unit("lat", query)
+    lon = lon_min + (lon_max - lon_min) * _unit("lon", query)
+    return {"results": [{"geometry": {"lat": round(lat, 6), "lng": round(lon, 6)}}]}
+
+
+def soil_response(lat, lon, textures):
+    def value(name, low, high):
+        return round(low + (high - low) * _unit(name, lat, lon), 3)
+
+    return {
+        "ph": value("ph", 4.5, 7.5),
+        "nitrogen_total": value("nitrogen", 0.03, 0.3),
+        "phosphorous_extractable": value("phosphorus", 2.0, 40.0),
+        "potassium_extractable": value("potassium", 60.0, 400.0),
+        "carbon_organic": value("carbon", 0.3, 3.0),
+        "texture_class": textures[int(_unit("texture", lat, lon) * len(textures))],
+    }
+
+
+def forecast_response(lat, lon, past_days, forecast_days):
+    start = date.today() - timedelta(days=past_days)
+    days = [start + timedelta(days=i) for i in range(past_days + forecast_days)]
+    rain = [round(max(0.0, 30 * _unit("rain", lat, lon, d) - 12), 1) for d in days]
+    return {"latitude": lat, "longitude": lon,
+            "daily": {"time": [d.isoformat() for d in days], "precipitation_sum": rain}}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        route = ROUTES.get(url.path)
+        if route is None:
+            return self._send(404, {"error": "unknown path"})
+        provider = route[0]
+        if self.server.delay_and_fail(provider):
+            return self._send(503, {"error": "stand-in failure"})
+
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == "/geocode/v1/json":
+            body = geocode_response(query.get("q", ""))
+        elif url.path == "/v1/layers":
+            body = {"layers": []}
+        elif url.path == "/soilproperty":
+            body = soil_response(query.get("lat"), query.get("lon"), self.server.textures)
+        else:
+            lats = query.get("latitude", "0").split(",")
+            lons = query.get("longitude", "0").split(",")
+            past, ahead = int(query.get("past_days", 5)), int(query.get("forecast_days", 10))
+            body = [forecast_response(float(a), float(o), past, ahead) for a, o in zip(lats, lons)]
+            body = body[0] if len(body) == 1 else body
+        self._send(200, body)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_ins(latency_ms=None, jitter_ms=0, error_rate=None, textures=TEXTURES[:6], port=0, seed=0):
+    """Start the stand-in server on a background thread and return it; call shutdown() when done"""
+    server = StandInServer(("127.0.0.1", port), latency_ms, jitter_ms, error_rate, textures, seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve local stand-ins for OpenCage, iSDA and Open-Meteo")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=50, help="delay added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    args = parser.parse_args()
+
+    providers = {provider for provider, _ in ROUTES.values()}
+    server = StandInServer(("127.0.0.1", args.port), {p: args.latency_ms for p in providers}, args.jitter_ms,
+                           {p: args.error_rate for p in providers})
+    for env, url in server.environment().items():
+        print(f"export {env}={url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
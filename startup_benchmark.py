@@ -0,0 +1,97 @@
+# startup_benchmark.py
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MODULES = [
+    "fertilizer_prediction",
+    "fertilizer_data",
+    "rainfall_engine",
+    "batch_prediction",
+    "prediction_service",
+    "advisory_pipeline",
+]
+HEAVY_PACKAGES = ["numpy", "pandas", "sklearn", "joblib", "pyarrow", "requests"]
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"import_s": elapsed, "loaded": [p for p in {heavy!r} if p in sys.modules]}}))
+"""
+
+_FIRST_REQUEST_SCRIPT = """
+import json, time
+timings = {{}}
+start = time.perf_counter()
+import batch_prediction
+timings["import_s"] = time.perf_counter() - start
+if {warm}:
+    start = time.perf_counter()
+    batch_prediction.warm_up()
+    timings["warm_up_s"] = time.perf_counter() - start
+preprocessor = None
+for name in ("first_request_s", "second_request_s"):
+    start = time.perf_counter()
+    artifacts = batch_prediction.get_artifacts()
+    preprocessor = artifacts["preprocessor"]
+    record = {{col: preprocessor.categories[col][0] for col in preprocessor.categorical_columns}}
+    record.update({{col: 0.0 for col in preprocessor.numerical_columns}})
+    batch_prediction.recommend_batch([record], artifacts)
+    timings[name] = time.perf_counter() - start
+print(json.dumps(timings))
+"""
+
+
+def _run(script, cwd=None):
+    # Every measurement gets a fresh interpreter, which is what a cold start is
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                                      os.environ.get("PYTHONPATH")])))
+    out = subprocess.run([sys.executable, "-c", script], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure_imports(modules=MODULES, repeat=5):
+    """Median wall-clock import time of each module in a fresh process, and the heavy packages it drags in"""
+    results = []
+    for module in modules:
+        runs = [_run(_IMPORT_SCRIPT.format(module=module, heavy=HEAVY_PACKAGES)) for _ in range(repeat)]
+        results.append({
+            "module": module,
+            "import_ms": round(statistics.median(r["import_s"] for r in runs) * 1000, 1),
+            "heavy_imports": runs[0]["loaded"],
+        })
+    return results
+
+
+def measure_first_request(repeat=5, cwd=None):
+    """
+    Median time to import the prediction code and serve the first and second recommendation
+    in a fresh process, without and with the explicit warm-up hook. Needs trained artifacts in cwd.
+    """
+    results = {}
+    for mode, warm in (("cold", False), ("warmed", True)):
+        runs = [_run(_FIRST_REQUEST_SCRIPT.format(warm=warm), cwd=cwd) for _ in range(repeat)]
+        results[mode] = {key.replace("_s", "_ms"): round(statistics.median(r[key] for r in runs) * 1000, 1)
+                         for key in runs[0]}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure module import time and first-request latency")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument("--skip-request", action="store_true", help="only measure imports (no model needed)")
+    args = parser.parse_args()
+
+    report = {"imports": measure_imports(repeat=args.repeat)}
+    if not args.skip_request:
+        report["first_request"] = measure_first_request(repeat=args.repeat)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
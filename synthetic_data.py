@@ -0,0 +1,116 @@
+# synthetic_data.py
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_ingestion import CATEGORICAL_COLUMNS, DATA_PATH, NUMERICAL_COLUMNS, TARGET_COLUMN
+
+TEXTURES = ["clay", "clay loam", "loam", "sandy loam", "sandy clay", "silt loam", "silty clay", "sand"]
+CROPS = ["maize", "beans", "sorghum", "cassava", "millet", "groundnuts", "potatoes", "wheat"]
+FERTILIZERS = ["DAP", "CAN", "Urea", "NPK 17:17:17", "NPK 23:23:0", "Compost", "Manure", "MAP"]
+
+# (mean, standard deviation, minimum, maximum) of each soil measurement, roughly Kenyan topsoil
+SOIL_RANGES = {
+    "ph": (5.9, 0.7, 3.5, 9.0),
+    "nitrogen": (0.14, 0.06, 0.01, 0.6),
+    "phosphorus": (14.0, 7.0, 0.5, 80.0),
+    "potassium": (170.0, 60.0, 20.0, 600.0),
+    "organic_carbon": (1.3, 0.5, 0.1, 5.0),
+}
+KENYA_BOUNDS = ((-4.7, 5.0), (33.9, 41.9))  # (lat range, lon range) trial sites are drawn from
+
+
+def _vocabulary(base, size, prefix):
+    # Real names first, then numbered extras for cardinalities beyond the built-in lists
+    return list(base[:size]) + [f"{prefix} {i}" for i in range(len(base), size)]
+
+
+def generate_soil(rows, rng):
+    """Draw plausible soil measurements as float32 columns"""
+    return {
+        col: np.clip(rng.normal(mean, std, rows), low, high).round(3).astype(np.float32)
+        for col, (mean, std, low, high) in SOIL_RANGES.items()
+    }
+
+
+def generate_ofra(rows=100000, n_textures=6, n_crops=6, n_fertilizers=6, n_sites=500, noise=0.1, seed=0):
+    """
+    Build an OFRA-like trial table with the columns training reads. The fertilizer is a
+    deterministic function of the soil (low pH, low phosphorus, low nitrogen, ...) plus a share of
+    `noise` random labels, so the model has something real but imperfect to learn.
+    """
+    rng = np.random.default_rng(seed)
+    textures = _vocabulary(TEXTURES, n_textures, "texture")
+    crops = _vocabulary(CROPS, n_crops, "crop")
+    fertilizers = _vocabulary(FERTILIZERS, n_fertilizers, "fertilizer")
+
+    data = {"site": rng.integers(0, n_sites, rows)}
+    data[CATEGORICAL_COLUMNS[0]] = rng.choice(textures, rows)
+    data[CATEGORICAL_COLUMNS[1]] = rng.choice(crops, rows)
+    data.update(generate_soil(rows, rng))
+
+    # Score each rule and pick the strongest, shifted by the crop so categories matter too
+    scores = np.stack([
+        6.0 - data["ph"],
+        (15.0 - data["phosphorus"]) / 5.0,
+        (0.15 - data["nitrogen"]) * 20.0,
+        (170.0 - data["potassium"]) / 50.0,
+        (1.3 - data["organic_carbon"]) * 2.0,
+    ], axis=1)
+    crop_shift = pd.Index(crops).get_indexer(data[CATEGORICAL_COLUMNS[1]])
+    label = (np.argmax(scores, axis=1) + crop_shift) % len(fertilizers)
+    noisy = rng.random(rows) < noise
+    label[noisy] = rng.integers(0, len(fertilizers), noisy.sum())
+    data[TARGET_COLUMN] = np.asarray(fertilizers, dtype=object)[label]
+
+    # Each site sits at one point, so its plots share coordinates the way real trial plots do
+    (lat_min, lat_max), (lon_min, lon_max) = KENYA_BOUNDS
+    data["latitude"] = rng.uniform(lat_min, lat_max, n_sites).round(5)[data["site"]]
+    data["longitude"] = rng.uniform(lon_min, lon_max, n_sites).round(5)[data["site"]]
+
+    columns = ["site", "latitude", "longitude"] + CATEGORICAL_COLUMNS + NUMERICAL_COLUMNS + [TARGET_COLUMN]
+    return pd.DataFrame(data, columns=columns)
+
+
+def generate_farmers(rows, categories=None, seed=1):
+    """
+    Farmer records for inference: categories and soil values like the training data, without
+    the label. Pass the model's own categories so every row is scoreable.
+    """
+    rng = np.random.default_rng(seed)
+    if categories is None:
+        categories = dict(zip(CATEGORICAL_COLUMNS, (TEXTURES[:6], CROPS[:6])))
+    farmers = {col: rng.choice(np.asarray(categories[col], dtype=object), rows) for col in CATEGORICAL_COLUMNS}
+    farmers.update(generate_soil(rows, rng))
+    return pd.DataFrame(farmers)
+
+
+def write_ofra(path=DATA_PATH, **kwargs):
+    """Generate a synthetic OFRA table and save it as CSV where ingestion expects it"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    frame = generate_ofra(**kwargs)
+    frame.to_csv(path, index=False)
+    return len(frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic OFRA-like training dataset")
+    parser.add_argument("--out", default=DATA_PATH)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--textures", type=int, default=6)
+    parser.add_argument("--crops", type=int, default=6)
+    parser.add_argument("--fertilizers", type=int, default=6)
+    parser.add_argument("--sites", type=int, default=500, help="distinct trial-site locations")
+    parser.add_argument("--noise", type=float, default=0.1, help="share of rows with a random label")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = write_ofra(args.out, rows=args.rows, n_textures=args.textures, n_crops=args.crops,
+                      n_fertilizers=args.fertilizers, n_sites=args.sites, noise=args.noise, seed=args.seed)
+    print(f"✅ Wrote {rows} synthetic OFRA rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
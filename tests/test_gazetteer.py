@@ -0,0 +1,31 @@
+# tests/test_gazetteer.py
+import pytest
+
+from geocoding import load_gazetteer, lookup_gazetteer, normalize_location
+
+
+def resolve(location):
+    return lookup_gazetteer(normalize_location(location))
+
+
+def row(county, sub_county):
+    return load_gazetteer()[normalize_location(f"{county}, {sub_county}")]
+
+
+@pytest.mark.parametrize("location, county, sub_county", [
+    ("Nakuru, Bahatii", "Nakuru", "Bahati"),
+    ("Nyeri, Othya", "Nyeri", "Othaya"),
+    ("Kakamega, Mumis East", "Kakamega", "Mumias East"),
+])
+def test_misspelling_resolves(location, county, sub_county):
+    assert resolve(location) == row(county, sub_county)
+
+
+@pytest.mark.parametrize("location", [
+    "Laikipia Central",              # no such sub-county; Laikipia West is one letter-run away
+    "Elgeyo Marakwet, Keiyo",        # Keiyo North and Keiyo South are both candidates
+    "Kakamega, Mumias Central",
+    "Nakuru, Nakuru Town",
+])
+def test_differing_qualifier_falls_through(location):
+    assert resolve(location) is None
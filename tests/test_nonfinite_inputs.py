@@ -0,0 +1,54 @@
+# tests/test_nonfinite_inputs.py
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from batch_prediction import ERROR_COLUMN, RESULT_COLUMN, recommend_batch
+from prediction_service import MicroBatcher
+from preprocessing import Preprocessor, build_preprocessing
+
+CATEGORIES = {"texture": ["clay", "loam"], "previous_crop": ["beans", "maize"]}
+NUMERICAL = ["ph", "nitrogen", "phosphorus", "potassium", "organic_carbon"]
+VALID = {"texture": "loam", "previous_crop": "maize", "ph": 6.1, "nitrogen": 0.12,
+         "phosphorus": 14.0, "potassium": 170.0, "organic_carbon": 1.3}
+
+
+@pytest.fixture(scope="module")
+def artifacts():
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.integers(0, 2, (200, 2)), rng.normal(size=(200, 5))]).astype(np.float32)
+    y = (X[:, 2] > 0).astype(int)
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y)
+    artifact = build_preprocessing(CATEGORIES, NUMERICAL, np.zeros(5), np.ones(5), ["CAN", "DAP"])
+    return {"model": model, "preprocessor": Preprocessor(artifact)}
+
+
+@pytest.mark.parametrize("value", [float("inf"), float("-inf"), 1e39, "1e999"])
+def test_transform_flags_non_finite_rows(artifacts, value):
+    frame = pd.DataFrame([VALID, dict(VALID, ph=value)])
+    _, unknown, invalid = artifacts["preprocessor"].transform(frame)
+    assert invalid.tolist() == [False, True]
+    assert not unknown.any()
+
+
+def test_batch_file_with_inf_row_scores_the_others(artifacts):
+    csv = "texture,previous_crop,ph,nitrogen,phosphorus,potassium,organic_carbon\n" \
+          "loam,maize,6.1,0.12,14,170,1.3\n" \
+          "clay,beans,inf,0.12,14,170,1.3\n" \
+          "clay,maize,5.2,0.1,9,120,0.8\n"
+    result = recommend_batch(pd.read_csv(io.StringIO(csv)), artifacts)
+    assert result[RESULT_COLUMN].notna().tolist() == [True, False, True]
+    assert result[ERROR_COLUMN].iloc[1] == "Missing or invalid numeric input"
+
+
+def test_micro_batch_with_overflowing_request_answers_both(artifacts):
+    batcher = MicroBatcher(artifacts, window_ms=200)
+    bad = batcher.submit([dict(VALID, ph=1e999)])
+    good = batcher.submit([VALID])
+    (bad_rows, _), (good_rows, _) = bad.result(timeout=10), good.result(timeout=10)
+    assert bad_rows[0][RESULT_COLUMN] is None
+    assert bad_rows[0][ERROR_COLUMN] == "Missing or invalid numeric input"
+    assert good_rows[0][RESULT_COLUMN] in ("CAN", "DAP")
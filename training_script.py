@@ -1,65 +1,227 @@
-import pandas as pd
 import numpy as np
+import pandas as pd
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder, StandardScaler
+from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import RandomForestClassifier
+import argparse
 import joblib
 import os
+import time
+
+from data_ingestion import (
+    CATEGORICAL_COLUMNS, DATA_PATH, FEATURE_STORE_PATH, NUMERICAL_COLUMNS, TARGET_COLUMN,
+    category_codes, ingest_csv, load_feature_store, store_is_fresh,
+)
+from farmer_log import get_log, training_rows
+from model_search import CV_FOLDS, grow_with_early_stopping, peak_rss_mb, print_report, save_report, search
+from model_versions import current_version, publish, register_version, set_current, version_paths
+from preprocessing import PREPROCESSING_PATH, Preprocessor, build_preprocessing, load_preprocessing, save_preprocessing
 
 # Paths
-DATA_PATH = "data/ofra_dataset.csv"
 MODEL_DIR = "models"
 MODEL_PATH = os.path.join(MODEL_DIR, "fertilizer_model.joblib")
-SCALER_PATH = os.path.join(MODEL_DIR, "scaler.joblib")
-TARGET_ENCODER_PATH = os.path.join(MODEL_DIR, "target_encoder.joblib")
-ENCODERS_PATH = os.path.join(MODEL_DIR, "encoders.joblib")
 
-# Ensure model directory exists
-os.makedirs(MODEL_DIR, exist_ok=True)
+# Incremental updates: trees grown per update, and rows of the original training data replayed
+# per new farmer row so the new trees still see every fertilizer class
+NEW_TREES = 10
+REPLAY_FACTOR = 1
 
-# Load dataset
-df = pd.read_csv(DATA_PATH)
+# Held-out split of every full retrain, recorded in the version manifest with the data it was cut from
+TEST_SIZE = 0.2
+SPLIT_SEED = 42
 
 # Define columns
-categorical_cols = ['texture', 'previous_crop']
-numerical_cols = ['ph', 'nitrogen', 'phosphorus', 'potassium', 'organic_carbon']
-target_col = 'fertilizer_used'
+categorical_cols = CATEGORICAL_COLUMNS
+numerical_cols = NUMERICAL_COLUMNS
+target_col = TARGET_COLUMN
+
+
+def load_training_table(store_path=None):
+    """
+    Memory-map the Parquet feature store, rebuilding it first if the CSV has changed since.
+    A prebuilt store such as the ofra_enrichment output is read as it is.
+    """
+    if store_path:
+        return load_feature_store(store_path, categorical_cols + numerical_cols + [target_col])
+    if not store_is_fresh(DATA_PATH, FEATURE_STORE_PATH):
+        ingest_csv(DATA_PATH, FEATURE_STORE_PATH)
+    return load_feature_store(FEATURE_STORE_PATH, categorical_cols + numerical_cols + [target_col])
+
+
+def build_training_matrix(table):
+    """
+    Fill one preallocated float32 feature matrix straight from the Arrow columns:
+    label-encoded categories first, then standardized numbers. RandomForest works in
+    float32 internally, so this is also the only copy of the features it needs.
+    Returns the matrix, the encoded target and the Preprocessor that inference must use.
+    """
+    X = np.empty((table.num_rows, len(categorical_cols) + len(numerical_cols)), dtype=np.float32)
+
+    # Encode categorical features
+    categories = {}
+    for i, col in enumerate(categorical_cols):
+        X[:, i], categories[col] = category_codes(table.column(col))
+
+    # Encode target
+    y, target_classes = category_codes(table.column(target_col))
+
+    # Normalize numerical features in place, with the same code inference runs
+    offset = len(categorical_cols)
+    for i, col in enumerate(numerical_cols):
+        X[:, offset + i] = table.column(col).to_numpy()
+    scaler = StandardScaler().fit(X[:, offset:])
+    preprocessor = Preprocessor(build_preprocessing(categories, numerical_cols, scaler.mean_, scaler.scale_, target_classes))
+    preprocessor.scale_numeric(X[:, offset:], out=X[:, offset:])
+
+    return X, y, preprocessor
+
+
+def training_data(store_path, n_rows):
+    """Manifest entry naming the table a full retrain used and how it was split"""
+    return {"features": os.path.abspath(store_path) if store_path else None, "rows": n_rows,
+            "test_size": TEST_SIZE, "random_state": SPLIT_SEED}
+
+
+def replay_sample(preprocessor, classes, rows, seed=None, store_path=None):
+    """
+    Encode a sample of the training rows (the OFRA store, or `store_path`) with the served model's
+    preprocessing: at least one row of every class in `classes` plus `rows` random ones. Returns (X, y).
+    """
+    table = load_training_table(store_path)
+    target = pd.Series(table.column(target_col).to_pandas(), dtype=str)
+    y_all = pd.Index(preprocessor.target_classes).get_indexer(target)
+    first = pd.Series(y_all).drop_duplicates()
+    indices = np.union1d(first[first.isin(classes)].index,
+                         np.random.default_rng(seed).integers(0, len(target), rows))
+    X, unknown, missing = preprocessor.transform(table.take(indices).to_pandas())
+    keep = ~unknown & ~missing
+    return X[keep], y_all[indices][keep]
+
+
+def incremental_update(new_trees=NEW_TREES, replay_factor=REPLAY_FACTOR, n_jobs=-1):
+    """
+    Fold the farmer log records added since the served version into its model by growing
+    `new_trees` extra trees with warm_start on the new rows plus a small replay sample, then
+    store and publish the result as a new version. Returns its manifest, or None if nothing changed.
+    """
+    base = current_version()
+    if base is None:  # first update: adopt the model on disk as the base version
+        base = register_version(MODEL_PATH, PREPROCESSING_PATH, mode="full")
+        set_current(base["version"])
+
+    records, cursor = get_log().read_since(base["cursor"])
+    rows = training_rows(records)
+    if not rows:
+        print(f"No new farmer data since version {base['version']}")
+        return None
+
+    model_path, preprocessing_path = version_paths(base["version"])
+    clf = joblib.load(model_path)
+    preprocessor = load_preprocessing(preprocessing_path)
+
+    # Categories or fertilizers the served model has never seen need a full retrain
+    frame = pd.DataFrame.from_records(rows).reindex(columns=preprocessor.columns + [target_col])
+    X_new, unknown, missing = preprocessor.transform(frame)
+    y_new = pd.Index(preprocessor.target_classes).get_indexer(frame[target_col].astype(str))
+    usable = ~unknown & ~missing & np.isin(y_new, clf.classes_)
+    skipped = int((~usable).sum())
+    if not usable.any():
+        print(f"None of the {len(rows)} new rows fit the served model's categories; run a full retrain")
+        return None
+
+    data = base.get("training_data") or {}
+    X_replay, y_replay = replay_sample(preprocessor, clf.classes_, int(usable.sum()) * replay_factor,
+                                       store_path=data.get("features"))
+    X = np.concatenate([X_new[usable], X_replay])
+    y = np.concatenate([y_new[usable], y_replay])
+    if not np.array_equal(np.unique(y), clf.classes_):
+        print("The replay sample does not cover every fertilizer class; run a full retrain")
+        return None
+
+    start = time.perf_counter()
+    clf.set_params(warm_start=True, n_estimators=clf.n_estimators + new_trees, n_jobs=n_jobs)
+    clf.fit(X, y)
+    clf.set_params(warm_start=False, n_jobs=None)  # served one request at a time; never fan out per call
+    elapsed = time.perf_counter() - start
+
+    tmp_path = MODEL_PATH + ".incremental"
+    joblib.dump(clf, tmp_path)
+    manifest = register_version(tmp_path, preprocessing_path, mode="incremental", parent=base["version"],
+                                cursor=cursor, rows_added=int(usable.sum()), rows_skipped=skipped,
+                                n_estimators=clf.n_estimators, training_data=base.get("training_data"))
+    os.remove(tmp_path)
+    publish(manifest["version"])
+    print(f"Grew {new_trees} trees on {int(usable.sum())} new rows ({skipped} skipped) in {elapsed:.1f}s")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the fertilizer recommendation model")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="cores used to build trees (-1 for all)")
+    parser.add_argument("--search", action="store_true",
+                        help="cross-validated search over n_estimators/max_depth/min_samples_leaf before training")
+    parser.add_argument("--cv", type=int, default=CV_FOLDS, help="folds per configuration in --search")
+    parser.add_argument("--workers", type=int, default=None, help="processes for --search (default: all cores)")
+    parser.add_argument("--early-stopping", action="store_true",
+                        help="grow trees with warm_start until the out-of-bag accuracy stops improving")
+    parser.add_argument("--report", help="write the search report as JSON to this path")
+    parser.add_argument("--incremental", action="store_true",
+                        help="fold new farmer log records into the served model instead of retraining")
+    parser.add_argument("--new-trees", type=int, default=NEW_TREES, help="trees grown by --incremental")
+    parser.add_argument("--features", help="train on this Parquet feature store (e.g. from ofra_enrichment.py) "
+                                           "instead of the one built from the OFRA CSV")
+    args = parser.parse_args()
 
-# Split features and target
-X_cat = df[categorical_cols].copy()
-X_num = df[numerical_cols].copy()
-y = df[target_col].copy()
+    if args.incremental:
+        manifest = incremental_update(args.new_trees, n_jobs=args.n_jobs)
+        if manifest:
+            print(f"✅ Version {manifest['version']} ({manifest['n_estimators']} trees) published.")
+        return
 
-# Encode categorical features
-encoders = {}
-for col in categorical_cols:
-    le = LabelEncoder()
-    X_cat[col] = le.fit_transform(X_cat[col])
-    encoders[col] = le
+    # Ensure model directory exists
+    os.makedirs(MODEL_DIR, exist_ok=True)
 
-# Normalize numerical features
-scaler = StandardScaler()
-X_num_scaled = scaler.fit_transform(X_num)
+    X, y, preprocessor = build_training_matrix(load_training_table(args.features))
 
-# Encode target
-target_encoder = LabelEncoder()
-y_encoded = target_encoder.fit_transform(y)
+    # Train/test split
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=SPLIT_SEED)
 
-# Combine features
-X_combined = np.hstack([X_cat.values, X_num_scaled])
+    params = {}
+    if args.search:
+        reports = search(X_train, y_train, cv=args.cv, max_workers=args.workers)
+        print_report(reports)
+        if args.report:
+            save_report(reports, args.report)
+        params = reports[0]["params"]
+        print(f"Best configuration: {params}")
 
-# Train/test split
-X_train, X_test, y_train, y_test = train_test_split(X_combined, y_encoded, test_size=0.2, random_state=42)
+    # Train model
+    start = time.perf_counter()
+    if args.early_stopping:
+        clf, history = grow_with_early_stopping(X_train, y_train, params, n_jobs=args.n_jobs)
+        print(f"Stopped at {clf.n_estimators} trees (out-of-bag accuracy {history[-1][1]:.4f})")
+    else:
+        clf = RandomForestClassifier(n_jobs=args.n_jobs, **params)
+        clf.fit(X_train, y_train)
+    elapsed = time.perf_counter() - start
+    print(f"Trained in {elapsed:.1f}s, test accuracy {clf.score(X_test, y_test):.4f}, peak memory {peak_rss_mb():.0f} MB")
 
-# Train model
-clf = RandomForestClassifier()
-clf.fit(X_train, y_train)
+    # Store the model and the preprocessing it was trained with as a version, then serve it through
+    # publish so the compact export is refreshed along with the joblib model. n_jobs was only for
+    # training; a pickled n_jobs=-1 would start a worker per core on every prediction call
+    clf.set_params(n_jobs=None)
+    tmp_model_path, tmp_preprocessing_path = MODEL_PATH + ".full", PREPROCESSING_PATH + ".full"
+    joblib.dump(clf, tmp_model_path)
+    save_preprocessing(preprocessor.artifact, tmp_preprocessing_path)
+    # A full retrain only covers the OFRA data, so its cursor starts the farmer log from the beginning
+    manifest = register_version(tmp_model_path, tmp_preprocessing_path, mode="full", n_estimators=clf.n_estimators,
+                                training_data=training_data(args.features, len(y)))
+    os.remove(tmp_model_path)
+    os.remove(tmp_preprocessing_path)
+    publish(manifest["version"])
 
-# Save model and encoders
-joblib.dump(clf, MODEL_PATH)
-joblib.dump(scaler, SCALER_PATH)
-joblib.dump(target_encoder, TARGET_ENCODER_PATH)
-joblib.dump(encoders, ENCODERS_PATH)
+    print(f"✅ Model and preprocessing (version {preprocessor.version}) trained and saved as {manifest['version']}.")
 
-print("✅ Model and encoders trained and saved.")
 
+if __name__ == "__main__":
+    main()
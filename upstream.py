@@ -0,0 +1,164 @@
+# upstream.py
+import contextvars
+import copy
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import increment, observe
+
+# Requests per second and burst size per provider; a rate of 0 disables limiting. OpenCage's free
+# tier allows 1 request/s, Open-Meteo 600/min, SoilGrids asks for at most 5/min.
+RATE_LIMITS = {
+    "opencage": (float(os.getenv("OPENCAGE_RATE", 1)), 1),
+    "open-meteo": (float(os.getenv("OPEN_METEO_RATE", 10)), 10),
+    "isda": (float(os.getenv("ISDA_RATE", 5)), 5),
+    "soilgrids": (float(os.getenv("SOILGRIDS_RATE", 5 / 60)), 1),
+}
+
+# Lower goes first: a farmer waiting on an answer is served before background refreshes
+INTERACTIVE = 0
+BATCH = 1
+
+_priority = contextvars.ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level):
+    """
+    Run a block's upstream calls at `level`, e.g. `with priority(BATCH): refresh()`. Carried into
+    asyncio.to_thread; code handing work to its own thread pools has to set it in the worker.
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """
+    Token bucket shared by every thread of the process. Callers queue by (priority, arrival),
+    so when tokens are scarce the interactive ones get them first.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.waiting = []
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, level=INTERACTIVE):
+        """Block until a token is free and this caller is first in line. Returns the seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        start = time.monotonic()
+        entry = (level, next(self._seq))
+        with self._cond:
+            heapq.heappush(self.waiting, entry)
+            try:
+                while True:
+                    self._refill()
+                    first = self.waiting[0] == entry
+                    if first and self.tokens >= 1:
+                        self.tokens -= 1
+                        return time.monotonic() - start
+                    self._cond.wait((1 - self.tokens) / self.rate if first else None)
+            finally:
+                self.waiting.remove(entry)
+                heapq.heapify(self.waiting)
+                self._cond.notify_all()
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls: the first caller for a key runs the function, the others
+    wait for it and get (a copy of) the same result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> [event, result]
+
+    def do(self, key, fn):
+        """fn() for the first caller with this key in flight; (result, shared) for everyone"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = [threading.Event(), None]
+        if not leader:
+            call[0].wait()
+            return copy.deepcopy(call[1]), True
+        try:
+            call[1] = fn()
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call[0].set()
+        return call[1], False
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+_flights = SingleFlight()
+_rate_share = 1.0
+
+
+def get_bucket(provider):
+    with _buckets_lock:
+        bucket = _buckets.get(provider)
+        if bucket is None:
+            rate, burst = RATE_LIMITS.get(provider, (0, 1))
+            bucket = _buckets[provider] = TokenBucket(rate * _rate_share, max(1, burst * _rate_share))
+    return bucket
+
+
+def set_rate_share(share):
+    """
+    Limit this process to `share` of every provider's rate, for when several processes (e.g.
+    forked workers) call the same providers with the same key
+    """
+    global _rate_share
+    with _buckets_lock:
+        _rate_share = share
+        _buckets.clear()
+
+
+def throttle(provider):
+    """Wait for the provider's rate limit at the caller's priority"""
+    level = _priority.get()
+    waited = get_bucket(provider).acquire(level)
+    if waited > 0.001:
+        observe("upstream_throttle_seconds", waited, provider=provider, priority="interactive" if level == INTERACTIVE else "batch")
+
+
+def _freeze(params):
+    if isinstance(params, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in params.items()))
+    if isinstance(params, (list, tuple)):
+        return tuple(_freeze(v) for v in params)
+    return params
+
+
+def coalesce(provider, url, params, fn):
+    """
+    Run fn() once for identical (provider, url, params) calls in flight at the same time. Only
+    calls at the same priority share: an interactive caller joining a batch call would otherwise
+    wait behind the whole batch backlog in the provider's token bucket.
+    """
+    result, shared = _flights.do((provider, url, _freeze(params), _priority.get()), fn)
+    if shared:
+        increment("upstream_coalesced_total", provider=provider)
+    return result
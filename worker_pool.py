@@ -0,0 +1,296 @@
+# worker_pool.py
+import argparse
+import asyncio
+import gc
+import json
+import mmap
+import os
+import shutil
+import signal
+import socket
+import struct
+import tempfile
+import time
+
+SOCKET_PATH = os.getenv("WORKER_SOCKET", os.path.join(tempfile.gettempdir(), "fertilizer-workers.sock"))
+WORKERS = int(os.getenv("WORKERS", os.cpu_count() or 1))
+REQUEST_TIMEOUT = 30    # a worker busy on one request for longer is killed and replaced
+IDLE_TIMEOUT = 60       # a connection that sends nothing for this long is closed, freeing its worker
+MAX_REQUESTS = 10000    # workers are replaced after this many requests to bound memory growth
+CHECK_INTERVAL = 1.0    # seconds between health checks
+
+SLOT = struct.Struct("d")  # per-worker busy-since timestamp in shared memory, 0 when idle
+
+
+def preload():
+    """
+    Everything the workers share, loaded once in the parent before forking: the heavy imports,
+    the model and preprocessing (warmed up with one prediction) and the recommendation index.
+    With MODEL_FORMAT=compact the model is memory-mapped and its pages are shared outright;
+    a joblib model is shared copy-on-write.
+    """
+    import advisory_pipeline  # noqa: F401  (imported for its side effect of loading every module)
+    from batch_prediction import warm_up
+    from recommendation_index import get_index
+
+    warm_up()
+    get_index()
+    # Keep the garbage collector from touching (and so copying) every preloaded object in each worker
+    gc.freeze()
+
+
+def save_metrics(metrics_dir, slot):
+    """Write this worker's metrics where the others can read them, replacing its previous snapshot"""
+    from metrics import snapshot
+
+    path = os.path.join(metrics_dir, f"{slot}.json")
+    with open(path + ".tmp", "w") as fh:
+        json.dump(snapshot(), fh)
+    os.replace(path + ".tmp", path)
+
+
+def collect_metrics(metrics_dir):
+    """Prometheus text for the whole pool: the sum of every worker's latest snapshot"""
+    from metrics import render_prometheus
+
+    snapshots = []
+    for name in sorted(os.listdir(metrics_dir)):
+        if name.endswith(".json"):
+            with open(os.path.join(metrics_dir, name)) as fh:
+                snapshots.append(json.load(fh))
+    return render_prometheus(snapshots)
+
+
+def handle(message, loop, metrics_dir=None):
+    """
+    Answer one protocol message:
+      {"op": "ping"}
+      {"op": "metrics"}  (Prometheus text for the whole pool, for Node to expose on /metrics)
+      {"op": "recommend", "records": [{soil values and answers}, ...]}
+      {"op": "advise", "location": "...", "answers": {...}}
+    """
+    op = message.get("op")
+    if op == "ping":
+        return {"pid": os.getpid()}
+    if op == "metrics":
+        return collect_metrics(metrics_dir)
+    if op == "recommend":
+        from batch_prediction import ERROR_COLUMN, RESULT_COLUMN, get_artifacts, recommend_batch
+
+        result = recommend_batch(message["records"], get_artifacts())[[RESULT_COLUMN, ERROR_COLUMN]].astype(object)
+        return result.where(result.notna(), None).to_dict(orient="records")
+    if op == "advise":
+        from advisory_pipeline import advise
+
+        return loop.run_until_complete(advise(message["location"], message.get("answers"), message.get("profile")))
+    raise ValueError(f"Unknown op {op!r}")
+
+
+class WorkerPool:
+    """
+    Prefork pool serving the JSON-lines protocol on a Unix socket. Every worker accepts
+    connections on the socket the parent bound; each line in is one request and each line out
+    its response, tagged with the request's "id":
+
+        {"id": 1, "op": "advise", "location": "Nakuru, Bahati", "answers": {...}}
+        {"id": 1, "ok": true, "result": {...}}
+
+    The parent restarts workers that die, are stuck on one request for longer than
+    request_timeout, or have served max_requests. Each worker saves its metrics to
+    <socket>.metrics/<slot>.json after every request, and a replacement carries on from its
+    slot's totals, so the pool's counters only go up.
+    """
+
+    def __init__(self, socket_path=SOCKET_PATH, workers=WORKERS, request_timeout=REQUEST_TIMEOUT,
+                 max_requests=MAX_REQUESTS, idle_timeout=IDLE_TIMEOUT):
+        self.socket_path = socket_path
+        self.metrics_dir = socket_path + ".metrics"
+        self.workers = workers
+        self.request_timeout = request_timeout
+        self.max_requests = max_requests
+        self.idle_timeout = idle_timeout
+        self.pids = {}  # pid -> slot
+        self.restarts = 0
+        self._busy = mmap.mmap(-1, SLOT.size * workers)  # anonymous and shared with forked children
+        self._listener = None
+        self._stopping = False
+
+    def _busy_since(self, slot):
+        return SLOT.unpack_from(self._busy, slot * SLOT.size)[0]
+
+    def _set_busy(self, slot, since):
+        SLOT.pack_into(self._busy, slot * SLOT.size, since)
+
+    def start(self):
+        preload()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.socket_path)
+        self._listener.listen(128)
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        for name in os.listdir(self.metrics_dir):
+            os.remove(os.path.join(self.metrics_dir, name))
+        for slot in range(self.workers):
+            self._spawn(slot)
+
+    def _spawn(self, slot):
+        self._set_busy(slot, 0)
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._work(slot)
+            except BaseException as err:
+                print(f"Worker {os.getpid()} crashed: {err}")
+                code = 1
+            finally:
+                os._exit(code)
+        self.pids[pid] = slot
+
+    def _work(self, slot):
+        import metrics
+        from upstream import set_rate_share
+
+        stopping = []
+
+        def on_term(signum, frame):
+            if not self._busy_since(slot):
+                os._exit(0)
+            stopping.append(True)  # finish the request in hand first
+
+        signal.signal(signal.SIGTERM, on_term)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        set_rate_share(1 / self.workers)  # the providers see one client, however many workers
+        loop = asyncio.new_event_loop()
+
+        # Start from this slot's totals rather than the parent's preload or zero
+        metrics.reset()
+        previous = os.path.join(self.metrics_dir, f"{slot}.json")
+        if os.path.exists(previous):
+            with open(previous) as fh:
+                metrics.merge(json.load(fh))
+
+        served = 0
+        while served < self.max_requests and not stopping:
+            conn, _ = self._listener.accept()
+            conn.settimeout(self.idle_timeout)
+            with conn, conn.makefile("rwb") as stream:
+                try:
+                    for line in stream:
+                        self._set_busy(slot, time.time())
+                        response = self._respond(line, loop)
+                        save_metrics(self.metrics_dir, slot)
+                        self._set_busy(slot, 0)
+                        stream.write(response)
+                        stream.flush()
+                        served += 1
+                        if stopping or served >= self.max_requests:
+                            break
+                except OSError:
+                    pass  # idle timeout or the client went away
+                finally:
+                    self._set_busy(slot, 0)
+
+    def _respond(self, line, loop):
+        message = {}
+        try:
+            message = json.loads(line)
+            response = {"id": message.get("id"), "ok": True, "result": handle(message, loop, self.metrics_dir)}
+        except Exception as err:
+            response = {"id": message.get("id") if isinstance(message, dict) else None, "ok": False, "error": str(err)}
+        return json.dumps(response, default=str).encode() + b"\n"
+
+    def check(self):
+        """Reap and replace dead workers and kill the ones stuck on a request"""
+        now = time.time()
+        for pid, slot in list(self.pids.items()):
+            since = self._busy_since(slot)
+            if since and now - since > self.request_timeout:
+                print(f"Worker {pid} stuck for {now - since:.0f}s on one request; replacing it")
+                os.kill(pid, signal.SIGKILL)
+                self._set_busy(slot, 0)
+        while self.pids:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            slot = self.pids.pop(pid, None)
+            if slot is not None and not self._stopping:
+                self.restarts += 1
+                self._spawn(slot)
+
+    def serve_forever(self):
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        try:
+            while not self._stopping:
+                self.check()
+                time.sleep(CHECK_INTERVAL)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self, timeout=REQUEST_TIMEOUT):
+        """Let workers finish the request in hand, then remove the socket"""
+        self._stopping = True
+        for pid in self.pids:
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.time() + timeout
+        while self.pids and time.time() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                self.pids.pop(pid, None)
+            else:
+                time.sleep(0.05)
+        for pid in self.pids:
+            os.kill(pid, signal.SIGKILL)
+        if self._listener is not None:
+            self._listener.close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+
+
+def request(message, socket_path=SOCKET_PATH, timeout=REQUEST_TIMEOUT):
+    """Send one message to a running pool and return its response (the way Node would)"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(timeout)
+        conn.connect(socket_path)
+        with conn.makefile("rwb") as stream:
+            stream.write(json.dumps(message).encode() + b"\n")
+            stream.flush()
+            line = stream.readline()
+    if not line:
+        raise ConnectionError("The worker closed the connection without answering")
+    return json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefork worker pool serving recommendations over a Unix socket")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="load the model once and fork the workers")
+    serve.add_argument("--socket", default=SOCKET_PATH)
+    serve.add_argument("--workers", type=int, default=WORKERS)
+    serve.add_argument("--request-timeout", type=float, default=REQUEST_TIMEOUT)
+    serve.add_argument("--max-requests", type=int, default=MAX_REQUESTS)
+    ping = sub.add_parser("ping", help="check that a pool answers")
+    ping.add_argument("--socket", default=SOCKET_PATH)
+    metrics_cmd = sub.add_parser("metrics", help="print the pool's metrics in the Prometheus text format")
+    metrics_cmd.add_argument("--socket", default=SOCKET_PATH)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        pool = WorkerPool(args.socket, args.workers, args.request_timeout, args.max_requests)
+        pool.start()
+        print(f"🌱 {args.workers} workers serving on {args.socket}")
+        pool.serve_forever()
+    elif args.command == "metrics":
+        response = request({"id": 0, "op": "metrics"}, args.socket)
+        if response["ok"]:
+            print(response["result"], end="")
+        else:
+            print(response["error"])
+    else:
+        print(json.dumps(request({"id": 0, "op": "ping"}, args.socket)))
+
+
+if __name__ == "__main__":
+    main()